@@ -2,12 +2,14 @@
 后端 API 服务
 提供统一的接口供前端调用 Agent 工具
 """
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory
 from flask_cors import CORS
-from src.agents.agent import build_agent
+from src.agents.agent import build_agent, get_tool_registry
+from src.utils.helper.tool_batch import run_tool_batch, validate_calls
 from langgraph.checkpoint.memory import MemorySaver
 import logging
 import os
+import time
 
 # 配置日志
 logging.basicConfig(
@@ -32,8 +34,9 @@ DEBUG_MODE = os.getenv('DEBUG', 'False').lower() == 'true'
 # 构建 Agent（全局单例）
 logger.info("🔧 正在构建 Agent...")
 agent = build_agent()
+tool_registry = get_tool_registry()
 checkpointer = MemorySaver()
-logger.info("✅ Agent 构建成功")
+logger.info(f"✅ Agent 构建成功 | 工具数: {len(tool_registry)}")
 
 
 @app.route('/')
@@ -50,6 +53,7 @@ def index():
             <li><a href="{API_BASE_URL}/api/health">GET /api/health</a> - 健康检查</li>
             <li><a href="{API_BASE_URL}/api/tools">GET /api/tools</a> - 获取工具列表</li>
             <li>POST {API_BASE_URL}/api/agent/chat - Agent 聊天</li>
+            <li>POST {API_BASE_URL}/api/agent/batch - 批量调用工具</li>
         </ul>
         <h2>测试接口：</h2>
         <pre>
@@ -77,6 +81,11 @@ def health_check():
     })
 
 
+def _find_tool(tool_name):
+    """从启动时构建的工具注册表获取工具，不存在时返回 None"""
+    return tool_registry.get(tool_name)
+
+
 @app.route('/api/agent/chat', methods=['POST'])
 def agent_chat():
     """
@@ -114,13 +123,7 @@ def agent_chat():
         if tool_name:
             logger.info(f"🔧 直接调用工具: {tool_name} | user_id: {user_id}")
 
-            # 找到对应的工具（从 agent.nodes['tools'].bound.tools_by_name 获取）
-            tool = None
-            tools_node = agent.nodes.get('tools')
-            if tools_node and hasattr(tools_node, 'bound'):
-                bound = tools_node.bound
-                if hasattr(bound, 'tools_by_name'):
-                    tool = bound.tools_by_name.get(tool_name)
+            tool = _find_tool(tool_name)
 
             if not tool:
                 return jsonify({
@@ -192,37 +195,74 @@ def agent_chat():
         }), 500
 
 
-@app.route('/api/tools', methods=['GET'])
-def list_tools():
-    """获取所有可用工具列表"""
+@app.route('/api/agent/batch', methods=['POST'])
+def agent_batch():
+    """
+    批量直接调用工具：并发执行，按提交顺序返回结果及每个调用的耗时
+
+    请求格式：
+    {
+        "user_id": "用户ID",
+        "calls": [
+            {"tool_name": "get_user_info", "tool_params": {}},
+            {"tool_name": "get_daily_fortune_and_outfit", "tool_params": {"report_date": "2025-01-01"}},
+            {"tool_name": "get_life_interpretation", "tool_params": {}, "depends_on": [0]}
+        ]
+    }
+    """
     try:
-        tools = []
-        # 从 agent.nodes['tools'].bound.tools_by_name 获取
-        tools_node = agent.nodes.get('tools')
-        if tools_node and hasattr(tools_node, 'bound'):
-            bound = tools_node.bound
-            if hasattr(bound, 'tools_by_name'):
-                for name, tool in bound.tools_by_name.items():
-                    tools.append({
-                        'name': name,
-                        'description': tool.description,
-                        'parameters': tool.args_schema.schema() if tool.args_schema else {}
-                    })
+        data = request.json or {}
+        user_id = data.get('user_id')
+        calls = data.get('calls')
+
+        if not user_id:
+            return jsonify({
+                'status': 'failed',
+                'error_code': 'MISSING_REQUIRED_PARAM',
+                'error_message': '缺少必需参数: user_id'
+            }), 400
+
+        error = validate_calls(calls)
+        if error:
+            return jsonify({
+                'status': 'failed',
+                'error_code': 'INVALID_INPUT',
+                'error_message': error
+            }), 400
+
+        logger.info(f"🔧 批量调用工具: {[call['tool_name'] for call in calls]} | user_id: {user_id}")
+        start = time.perf_counter()
+        results = run_tool_batch(calls, _find_tool, user_id)
+        elapsed_ms = round((time.perf_counter() - start) * 1000, 1)
+        succeeded = sum(1 for result in results if result['status'] == 'success')
+        logger.info(f"✅ 批量调用完成 | 成功: {succeeded}/{len(results)} | 耗时: {elapsed_ms}ms")
 
         return jsonify({
             'status': 'success',
-            'total': len(tools),
-            'tools': tools
+            'total': len(results),
+            'succeeded': succeeded,
+            'elapsed_ms': elapsed_ms,
+            'results': results
         })
 
     except Exception as e:
-        logger.error(f"❌ 获取工具列表失败: {e}")
+        logger.error(f"❌ 批量调用处理失败: {e}")
         return jsonify({
             'status': 'failed',
+            'error_code': 'INTERNAL_ERROR',
             'error_message': str(e)
         }), 500
 
 
+@app.route('/api/tools', methods=['GET'])
+def list_tools():
+    """获取所有可用工具列表（启动时预序列化，支持 ETag 协商缓存）"""
+    headers = {'ETag': tool_registry.etag, 'Cache-Control': 'no-cache'}
+    if tool_registry.etag_matches(request.headers.get('If-None-Match')):
+        return Response(status=304, headers=headers)
+    return Response(tool_registry.listing_body, mimetype='application/json', headers=headers)
+
+
 if __name__ == '__main__':
     app.config['START_TIME'] = os.getenv('START_TIME', '')
 
@@ -233,6 +273,7 @@ if __name__ == '__main__':
     print(f"🌐 监听主机: {API_HOST}:{API_PORT}")
     print(f"📊 健康检查: {API_BASE_URL}/api/health")
     print(f"🔧 Agent 聊天: {API_BASE_URL}/api/agent/chat")
+    print(f"📦 批量调用: {API_BASE_URL}/api/agent/batch")
     print(f"🛠️ 工具列表: {API_BASE_URL}/api/tools")
     print(f"🐛 调试模式: {DEBUG_MODE}")
     print("=" * 60)
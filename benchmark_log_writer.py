@@ -0,0 +1,112 @@
+"""
+节点日志写入基准测试：对比旧的逐条 open + fsync 写入与后台批量写入（组提交）的吞吐
+
+用法（默认写入临时目录，结束后自动清理）：
+    python benchmark_log_writer.py
+    python benchmark_log_writer.py --entries 5000 --threads 1 4 8 --dir /app/work/logs
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from utils.log.log_sink import BatchedLogWriter
+
+
+def _entry(i: int) -> str:
+    """模拟一条节点日志（字段与 create_log_entry 一致）"""
+    return json.dumps({
+        "level": "info",
+        "message": "Node 'model' started",
+        "timestamp": int(time.time() * 1000),
+        "log_id": f"bench-{i}",
+        "latency": 0,
+        "input": json.dumps({"messages": [{"role": "user", "content": "今天适合穿什么颜色？" * 5}]}, ensure_ascii=False),
+        "output": "",
+        "node_id": "model",
+        "execute_mode": "test_run",
+        "type": "node_start",
+        "execute_id": f"run-{i // 10}",
+        "node_name": "model",
+        "method": "stream_run",
+    }, ensure_ascii=False)
+
+
+def _legacy_write(path: str, line: str):
+    """旧实现：每条日志 open + write + flush + fsync + close"""
+    with open(path, "a", encoding="utf-8", buffering=1) as f:
+        f.write(line + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _run_threads(threads: int, entries: int, write):
+    """threads 个线程共写入 entries 条，返回 (总耗时秒, 单条提交耗时的 p99 毫秒, 实际写入条数)"""
+    per_thread = entries // threads
+    lines = [_entry(i) for i in range(per_thread)]
+    samples = []
+    lock = threading.Lock()
+
+    def worker():
+        local = []
+        for line in lines:
+            start = time.perf_counter()
+            write(line)
+            local.append((time.perf_counter() - start) * 1000)
+        with lock:
+            samples.extend(local)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - start
+    samples.sort()
+    return elapsed, samples[int(len(samples) * 0.99) - 1], per_thread * threads
+
+
+def main():
+    parser = argparse.ArgumentParser(description="节点日志写入基准测试")
+    parser.add_argument("--entries", type=int, default=2000, help="每轮写入的日志条数")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4], help="并发写入线程数")
+    parser.add_argument("--dir", default="", help="日志目录（默认临时目录，建议指定与线上相同的磁盘）")
+    args = parser.parse_args()
+
+    base_dir = args.dir or tempfile.mkdtemp(prefix="bench-log-")
+    print(f"{'线程数':>6} | {'实现':<10} | {'条/秒':>10} | {'提交p99(ms)':>11} | fsync次数 | 丢弃")
+    print("-" * 68)
+    try:
+        for threads in args.threads:
+            legacy_path = os.path.join(base_dir, f"bench-legacy-{threads}.log")
+            elapsed, p99, total = _run_threads(threads, args.entries, lambda line: _legacy_write(legacy_path, line))
+            print(f"{threads:>6} | {'逐条fsync':<10} | {total / elapsed:>10.0f} | {p99:>11.3f} | {total:>9} | 0")
+
+            sink_path = os.path.join(base_dir, f"bench-sink-{threads}.log")
+            writer = BatchedLogWriter(sink_path)
+            elapsed, p99, total = _run_threads(threads, args.entries, writer.submit)
+            # 吞吐按全部落盘完成计算
+            start = time.perf_counter()
+            writer.close()
+            elapsed += time.perf_counter() - start
+            stats = writer.stats()
+            print(f"{threads:>6} | {'后台批量':<10} | {total / elapsed:>10.0f} | {p99:>11.3f} | "
+                  f"{stats['fsyncs']:>9} | {stats['dropped']}")
+    finally:
+        if not args.dir:
+            shutil.rmtree(base_dir, ignore_errors=True)
+        else:
+            for name in os.listdir(base_dir):
+                if name.startswith("bench-") and name.endswith(".log"):
+                    os.remove(os.path.join(base_dir, name))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+花名册搜索基准测试：对比旧的 ILIKE 全表扫描与 pg_trgm 索引搜索在不同表规模下的延迟
+
+用法（需已执行 init_db 迁移，会向 user_profile 写入 bench- 前缀的测试数据，结束后自动清理）：
+    python benchmark_roster_search.py
+    python benchmark_roster_search.py --sizes 1000 10000 100000 --roster 100 --repeat 20
+"""
+import argparse
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from sqlalchemy import insert, text
+
+from storage.database.db import get_session
+from storage.database.shared.model import UserProfile, RelationshipType, ROSTER_SEARCH_DOCUMENT
+from tools.roster_tool import _search_roster
+
+logging.basicConfig(level=logging.WARNING)
+
+BENCH_PREFIX = "bench-"
+TARGET_USER = f"{BENCH_PREFIX}target"
+SURNAMES = "赵钱孙李周吴郑王冯陈褚卫蒋沈韩杨朱秦尤许何吕施张孔曹严华金魏陶姜"
+GIVEN = "伟芳娜敏静丽强磊军洋勇艳杰娟涛明超秀霞平刚桂英华玉兰"
+MBTIS = ["INTJ", "INTP", "ENTJ", "ENTP", "INFJ", "INFP", "ENFJ", "ENFP",
+         "ISTJ", "ISFJ", "ESTJ", "ESFJ", "ISTP", "ISFP", "ESTP", "ESFP"]
+NOTES = ["项目组同事，擅长数据分析", "产品经理，沟通能力强", "老同学，周末常一起打球",
+         "直属领导，要求严格", "新入职的实习生", "隔壁部门的合作伙伴", ""]
+KEYWORDS = ["张伟", "INTJ", "数据分析", "领导", "不存在的关键词"]
+
+
+def _rows(user_id: str, count: int):
+    for _ in range(count):
+        yield {
+            "user_id": user_id,
+            "name": random.choice(SURNAMES) + "".join(random.choices(GIVEN, k=random.randint(1, 2))),
+            "gender": random.choice(["男", "女"]),
+            "relationship_type": RelationshipType.COLLEAGUE,
+            "mbti": random.choice(MBTIS),
+            "current_location": "北京",
+            "notes": random.choice(NOTES) or None,
+        }
+
+
+def _seed(total: int, existing: int, roster_size: int):
+    """补齐到 total 行：目标用户固定 roster_size 条，其余分散在其他用户（每人 50 条）"""
+    with get_session() as session:
+        if existing == 0:
+            session.execute(insert(UserProfile), list(_rows(TARGET_USER, roster_size)))
+            existing = roster_size
+        batch = []
+        for i in range(existing, total):
+            batch.extend(_rows(f"{BENCH_PREFIX}{i // 50}", 1))
+            if len(batch) >= 5000:
+                session.execute(insert(UserProfile), batch)
+                batch = []
+        if batch:
+            session.execute(insert(UserProfile), batch)
+        session.commit()
+        session.execute(text("ANALYZE user_profile"))
+
+
+def _legacy_search(session, keyword: str):
+    """旧实现：三个字段 ILIKE '%关键词%'，返回全部结果"""
+    return session.query(UserProfile).filter(
+        UserProfile.user_id == TARGET_USER,
+        (UserProfile.name.ilike(f"%{keyword}%") |
+         UserProfile.mbti.ilike(f"%{keyword}%") |
+         UserProfile.notes.ilike(f"%{keyword}%"))
+    ).order_by(UserProfile.created_at.desc()).all()
+
+
+def _time(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def _cleanup():
+    with get_session() as session:
+        session.execute(text("DELETE FROM user_profile WHERE user_id LIKE :prefix"), {"prefix": f"{BENCH_PREFIX}%"})
+        session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="花名册搜索基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="表规模（行数）")
+    parser.add_argument("--roster", type=int, default=100, help="目标用户的花名册条数")
+    parser.add_argument("--repeat", type=int, default=20, help="每个关键词的重复次数（取中位数）")
+    args = parser.parse_args()
+
+    random.seed(42)
+    _cleanup()
+    print(f"{'表规模':>10} | {'关键词':<12} | {'旧实现(ms)':>10} | {'索引搜索(ms)':>12} | 命中数")
+    print("-" * 64)
+
+    existing = 0
+    try:
+        for size in sorted(args.sizes):
+            _seed(size, existing, args.roster)
+            existing = size
+            with get_session() as session:
+                for keyword in KEYWORDS:
+                    legacy_ms = _time(lambda: _legacy_search(session, keyword), args.repeat)
+                    search_ms = _time(lambda: _search_roster(session, TARGET_USER, keyword, 10, 0), args.repeat)
+                    total, _ = _search_roster(session, TARGET_USER, keyword, 10, 0)
+                    print(f"{size:>10} | {keyword:<12} | {legacy_ms:>10.2f} | {search_ms:>12.2f} | {total}")
+
+        with get_session() as session:
+            plan = session.execute(text(
+                "EXPLAIN ANALYZE SELECT id FROM user_profile "
+                f"WHERE user_id = :user_id AND {ROSTER_SEARCH_DOCUMENT} ILIKE :pattern"
+            ), {"user_id": TARGET_USER, "pattern": "%数据分析%"}).scalars().all()
+            print("\n执行计划（索引搜索）：")
+            print("\n".join(plan))
+    finally:
+        _cleanup()
+
+
+if __name__ == "__main__":
+    main()
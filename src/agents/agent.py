@@ -1,22 +1,28 @@
 import os
 import json
-from typing import Annotated
+import hashlib
+import threading
+import time
+from typing import Annotated, Dict, Tuple
 from langchain.agents import create_agent
-from langchain.agents.middleware import wrap_tool_call
+from langchain.agents.middleware import AgentMiddleware
 from langchain_openai import ChatOpenAI
 from langgraph.graph import MessagesState
 from langgraph.graph.message import add_messages
 from langchain_core.messages import AnyMessage, ToolMessage, AIMessage
 from coze_coding_utils.runtime_ctx.context import default_headers
 from storage.memory.memory_saver import get_memory_saver
+from utils.helper.tool_registry import ToolRegistry
+from utils.log.metrics import TOOL_DURATION
 
 # 导入工具
 from tools.numerology_tool import numerology_analysis, career_advice
 from tools.weather_tool import get_weather, dressing_advice
 from tools.external_api_tool import bazi_api_analysis, ziwei_analysis
 from tools.mbti_tool import mbti_analysis, validate_mbti_with_info
-from tools.chart_tool import generate_luck_chart, predict_monthly_luck, generate_combined_chart
+from tools.chart_tool import generate_luck_chart, predict_monthly_luck, generate_combined_chart, predict_team_monthly_luck
 from tools.relationship_tool import relationship_advice, conflict_resolution
+from tools.compatibility_tool import get_team_compatibility
 from tools.career_transition_tool import career_transition_advice, skill_gap_analysis
 from tools.roster_tool import (
     add_roster_entry,
@@ -35,6 +41,7 @@ from tools.roster_tool import (
     save_user_photo,
     check_user_info_exists
 )
+from tools.roster_bulk_tool import import_roster_entries, export_roster_entries
 from tools.quick_report_tool import (
     generate_quick_report,
     format_life_report_section,
@@ -89,10 +96,11 @@ def _windowed_messages(old, new):
 class AgentState(MessagesState):
     messages: Annotated[list[AnyMessage], _windowed_messages]
 
-@wrap_tool_call
-def handle_tool_errors(request, handler):
+class ToolErrorMiddleware(AgentMiddleware):
     """
-    统一处理工具执行错误，返回标准化的错误格式。
+    统一处理工具执行错误，返回标准化的错误格式，并按工具名和结果记录调用耗时（agent_tool_duration_seconds）。
+
+    同时实现同步与异步钩子，保证 graph.stream 与 graph.astream 两种执行路径行为一致。
     
     错误格式：
     {
@@ -102,9 +110,9 @@ def handle_tool_errors(request, handler):
         "tool_name": "工具名称"
     }
     """
-    try:
-        return handler(request)
-    except Exception as e:
+
+    @staticmethod
+    def _error_message(request, e: Exception) -> ToolMessage:
         tool_name = request.tool_call.get("name", "unknown")
         error_msg = str(e)
         
@@ -121,33 +129,97 @@ def handle_tool_errors(request, handler):
             tool_call_id=request.tool_call["id"]
         )
 
-def build_agent(ctx=None):
+    def wrap_tool_call(self, request, handler):
+        start = time.perf_counter()
+        status = "success"
+        try:
+            return handler(request)
+        except Exception as e:
+            status = "error"
+            return self._error_message(request, e)
+        finally:
+            TOOL_DURATION.observe(time.perf_counter() - start,
+                                  tool=request.tool_call.get("name", "unknown"), status=status)
+
+    async def awrap_tool_call(self, request, handler):
+        start = time.perf_counter()
+        status = "success"
+        try:
+            return await handler(request)
+        except Exception as e:
+            status = "error"
+            return self._error_message(request, e)
+        finally:
+            TOOL_DURATION.observe(time.perf_counter() - start,
+                                  tool=request.tool_call.get("name", "unknown"), status=status)
+
+
+handle_tool_errors = ToolErrorMiddleware()
+
+class RequestHeadersMiddleware(AgentMiddleware):
+    """
+    按请求注入 LLM 请求头。
+
+    编译后的 Agent 在进程内复用，请求头不再写死在 ChatOpenAI 上，
+    而是在每次模型调用时从 runtime.context（即 GraphService 传入的 ctx）
+    生成 default_headers，并通过 model_settings 的 extra_headers 透传。
+    """
+
+    @staticmethod
+    def _with_headers(request):
+        ctx = getattr(request.runtime, "context", None)
+        if ctx is None or isinstance(ctx, type):
+            return request
+        headers = default_headers(ctx)
+        if not headers:
+            return request
+        model_settings = dict(request.model_settings or {})
+        extra_headers = dict(model_settings.get("extra_headers") or {})
+        extra_headers.update(headers)
+        model_settings["extra_headers"] = extra_headers
+        if hasattr(request, "override"):
+            return request.override(model_settings=model_settings)
+        request.model_settings = model_settings
+        return request
+
+    def wrap_model_call(self, request, handler):
+        return handler(self._with_headers(request))
+
+    async def awrap_model_call(self, request, handler):
+        return await handler(self._with_headers(request))
+
+
+def _get_config_path() -> str:
     workspace_path = os.getenv("COZE_WORKSPACE_PATH", "/workspace/projects")
-    config_path = os.path.join(workspace_path, LLM_CONFIG)
-    
-    with open(config_path, 'r', encoding='utf-8') as f:
-        cfg = json.load(f)
-    
-    api_key = os.getenv("COZE_WORKLOAD_IDENTITY_API_KEY")
-    base_url = os.getenv("COZE_INTEGRATION_MODEL_BASE_URL")
-    
-    llm = ChatOpenAI(
-        model=cfg['config'].get("model"),
-        api_key=api_key,
-        base_url=base_url,
-        temperature=cfg['config'].get('temperature', 0.7),
-        streaming=True,
-        timeout=cfg['config'].get('timeout', 600),
-        extra_body={
-            "thinking": {
-                "type": cfg['config'].get('thinking', 'disabled')
-            }
-        },
-        default_headers=default_headers(ctx) if ctx and not isinstance(ctx, type) else {}
-    )
-    
-    # 注册所有工具
-    tools = [
+    return os.path.join(workspace_path, LLM_CONFIG)
+
+
+# 配置文件指纹缓存：path -> ((mtime_ns, size), sha256)
+_config_digests: Dict[str, Tuple[Tuple[int, int], str]] = {}
+
+
+def get_config_version() -> str:
+    """
+    返回 LLM 配置文件的版本指纹，用于 graph_helper 判断是否需要重建 Agent。
+
+    先比较 mtime/size，只有发生变化时才重新读取文件计算 sha256，
+    这样仅 touch 文件而内容不变时也不会触发重建。
+    """
+    config_path = _get_config_path()
+    st = os.stat(config_path)
+    stat_key = (st.st_mtime_ns, st.st_size)
+    cached = _config_digests.get(config_path)
+    if cached is not None and cached[0] == stat_key:
+        return cached[1]
+    with open(config_path, 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    _config_digests[config_path] = (stat_key, digest)
+    return digest
+
+
+def get_agent_tools() -> list:
+    """Agent 注册的全部工具（build_agent 与工具注册表共用同一份列表）"""
+    return [
         # 命理分析工具
         bazi_api_analysis,  # 八字分析（支持外部API和降级）
         ziwei_analysis,     # 紫微斗数分析（支持外部API和降级）
@@ -167,10 +239,12 @@ def build_agent(ctx=None):
         generate_luck_chart,       # 运势趋势图
         predict_monthly_luck,     # 预测月度运势
         generate_combined_chart,  # 综合趋势图
+        predict_team_monthly_luck,  # 批量预测团队月度运势
 
         # 人际关系工具
         relationship_advice,      # 人际关系建议
         conflict_resolution,      # 冲突解决建议
+        get_team_compatibility,   # 团队配合度总览
 
         # 职业转型工具
         career_transition_advice, # 职业转型建议
@@ -192,6 +266,8 @@ def build_agent(ctx=None):
         get_daily_report,        # 获取每日报告
         save_user_photo,         # 保存用户照片
         check_user_info_exists,  # 检查用户是否已录入信息
+        import_roster_entries,   # 批量导入花名册
+        export_roster_entries,   # 导出花名册
 
         # 快速报告工具
         generate_quick_report,   # 快速生成人生报告
@@ -232,12 +308,56 @@ def build_agent(ctx=None):
         # generate_outfit_image,   # 生成穿搭图片（已禁用，高消耗）
         # generate_complete_daily_report,  # 生成完整每日报告（已禁用，封装工具）
     ]
+
+
+_tool_registry = None
+_tool_registry_lock = threading.Lock()
+
+
+def get_tool_registry() -> ToolRegistry:
+    """进程内共享的工具注册表（首次调用时构建，之后直接复用）"""
+    global _tool_registry
+    if _tool_registry is None:
+        with _tool_registry_lock:
+            if _tool_registry is None:
+                _tool_registry = ToolRegistry(get_agent_tools())
+    return _tool_registry
+
+
+def build_agent(ctx=None):
+    """
+    构建 Agent。
+
+    ctx 仅为兼容旧调用方保留：请求头由 RequestHeadersMiddleware 在运行时
+    根据 context 注入，构建结果不依赖具体请求，可以被 graph_helper 缓存复用。
+    """
+    config_path = _get_config_path()
+    
+    with open(config_path, 'r', encoding='utf-8') as f:
+        cfg = json.load(f)
+    
+    api_key = os.getenv("COZE_WORKLOAD_IDENTITY_API_KEY")
+    base_url = os.getenv("COZE_INTEGRATION_MODEL_BASE_URL")
+    
+    llm = ChatOpenAI(
+        model=cfg['config'].get("model"),
+        api_key=api_key,
+        base_url=base_url,
+        temperature=cfg['config'].get('temperature', 0.7),
+        streaming=True,
+        timeout=cfg['config'].get('timeout', 600),
+        extra_body={
+            "thinking": {
+                "type": cfg['config'].get('thinking', 'disabled')
+            }
+        },
+    )
     
     return create_agent(
         model=llm,
         system_prompt=cfg.get("sp"),
-        tools=tools,
+        tools=get_agent_tools(),
         checkpointer=get_memory_saver(),
         state_schema=AgentState,
-        middleware=[handle_tool_errors],
+        middleware=[RequestHeadersMiddleware(), handle_tool_errors],
     )
@@ -0,0 +1,99 @@
+"""
+命理分析夜间预计算任务
+为所有"本人"档案提前计算次日的八字/紫微分析结果并写入结果存储，早高峰生成每日报告时直接读取；
+同时清理过期的命理结果和搜索结果缓存
+
+用法（建议每晚 crontab 执行一次）：
+    cd src && python -m jobs.precompute_fortune                 # 预计算明天
+    cd src && python -m jobs.precompute_fortune --date 2025-01-01 --workers 8
+"""
+import argparse
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, timedelta
+from typing import List, Tuple
+
+from coze_coding_utils.runtime_ctx.context import new_context
+
+from storage.cache.fortune_store import fortune_store
+from storage.cache.search_cache import search_cache
+from storage.database.db import get_session
+from storage.database.shared.model import UserProfile, RelationshipType
+from tools.external_api_tool import get_bazi_analysis, get_ziwei_analysis, parse_birth_date
+
+logger = logging.getLogger(__name__)
+
+# 默认并发数（受外部API/搜索接口限流约束，不宜过大）
+DEFAULT_WORKERS = 4
+# 结果存储保留天数
+RESULT_RETENTION_DAYS = 7
+
+
+def _load_birth_infos() -> List[Tuple[str, str, str, str, str]]:
+    """读取所有本人档案的出生信息并去重，返回 (年, 月, 日, 时, 性别) 列表"""
+    with get_session() as session:
+        rows = session.query(UserProfile.birth_date, UserProfile.gender).filter(
+            UserProfile.relationship_type == RelationshipType.SELF,
+            UserProfile.birth_date.isnot(None)
+        ).all()
+
+    birth_infos = set()
+    for birth_date, gender in rows:
+        birth = parse_birth_date(birth_date)
+        if birth:
+            birth_infos.add((*birth, gender))
+    return sorted(birth_infos)
+
+
+def precompute(query_date: str, workers: int = DEFAULT_WORKERS, include_ziwei: bool = True) -> dict:
+    """预计算指定日期的命理分析结果，已存在的结果会直接跳过"""
+    ctx = new_context(method="precompute_fortune")
+    birth_infos = _load_birth_infos()
+    logger.info(f"🔮 开始预计算 {query_date} 的命理分析 | 出生信息: {len(birth_infos)} 组")
+
+    tasks = [(get_bazi_analysis, info) for info in birth_infos]
+    if include_ziwei:
+        tasks += [(get_ziwei_analysis, info) for info in birth_infos]
+
+    stats = {"total": len(tasks), "success": 0, "failed": 0}
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="precompute-fortune") as executor:
+        futures = {
+            executor.submit(func, ctx, *info, query_date): (func.__name__, info)
+            for func, info in tasks
+        }
+        for future in as_completed(futures):
+            name, info = futures[future]
+            try:
+                future.result()
+                stats["success"] += 1
+            except Exception as e:
+                stats["failed"] += 1
+                logger.warning(f"⚠️ 预计算失败 | {name} | {info}: {e}")
+
+    purge_before = (date.fromisoformat(query_date) - timedelta(days=RESULT_RETENTION_DAYS)).isoformat()
+    stats["purged"] = fortune_store.purge_before(purge_before)
+    # 搜索结果缓存只在读取时判断过期，过期行在这里统一删除
+    try:
+        stats["search_cache_purged"] = search_cache.purge_expired()
+    except Exception as e:
+        stats["search_cache_purged"] = 0
+        logger.warning(f"⚠️ 清理过期搜索缓存失败: {e}")
+
+    logger.info(f"✅ 预计算完成 | {query_date} | {stats}")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="预计算次日命理分析结果")
+    parser.add_argument("--date", type=str, default="", help="查询日期（YYYY-MM-DD），默认明天")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="并发数")
+    parser.add_argument("--no-ziwei", action="store_true", help="只预计算八字")
+    args = parser.parse_args()
+
+    query_date = args.date or (date.today() + timedelta(days=1)).isoformat()
+    precompute(query_date, workers=args.workers, include_ziwei=not args.no_ziwei)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
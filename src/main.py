@@ -1,16 +1,20 @@
 import argparse
 import asyncio
+import concurrent.futures
 import json
+import os
 import traceback
 import logging
+from contextlib import aclosing
 from typing import Any, Dict, Iterable, AsyncIterable, AsyncGenerator, Optional
 import threading
 import contextvars
+import hmac
 import cozeloop
 import uvicorn
 import time
-from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import StreamingResponse, JSONResponse, HTMLResponse
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse, JSONResponse, HTMLResponse, Response, FileResponse
 from fastapi.staticfiles import StaticFiles
 from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph, END
@@ -19,8 +23,11 @@ from langgraph.graph.state import CompiledStateGraph
 from coze_coding_utils.runtime_ctx.context import new_context, Context
 from utils.helper import graph_helper
 from utils.log.node_log import LOG_FILE
-from utils.log.write_log import setup_logging, request_context
+from utils.log.write_log import setup_logging, request_context, get_logging_stats
 from utils.log.config import LOG_LEVEL
+from utils.log.metrics import metrics_registry, TURN_DURATION, SSE_WRITE_DURATION
+from utils.log.profiler import slow_run_profiler
+from utils.log.config import PROFILER_ADMIN_TOKEN
 from utils.messages.server import (
     create_message_end_dict,
     create_message_error_dict,
@@ -41,6 +48,7 @@ from utils.helper.agent_helper import (
     to_stream_input,
     to_client_message,
     agent_iter_server_messages,
+    agent_aiter_server_messages,
 )
 from utils.log.parser import LangGraphParser
 from utils.log.err_trace import extract_core_stack
@@ -50,6 +58,13 @@ from utils.log.loop_trace import init_run_config, init_agent_config
 # 超时配置常量
 TIMEOUT_SECONDS = 900  # 15分钟
 
+# 流式执行模式：async 在事件循环内直接迭代 graph.astream；thread 为旧版后台线程驱动 graph.stream
+STREAM_RUNNER = os.getenv("AGENT_STREAM_RUNNER", "async")
+# thread 模式下的队列容量，队列满时阻塞生产线程，形成背压
+STREAM_QUEUE_MAXSIZE = int(os.getenv("AGENT_STREAM_QUEUE_MAXSIZE", "256"))
+# thread 模式下生产线程等待队列空位的轮询间隔（秒），用于及时感知消费端退出
+STREAM_PUT_POLL_SECONDS = 0.5
+
 class GraphService:
     def __init__(self):
         if not graph_helper.is_agent_proj():
@@ -123,6 +138,9 @@ class GraphService:
 
         run_id = ctx.run_id
         logger.info(f"Starting run with run_id: {run_id}")
+        turn_start = time.perf_counter()
+        status = "success"
+        slow_run_profiler.start(run_id, ctx.logid, ctx.method)
 
         try:
             graph = self._get_graph(ctx)
@@ -135,14 +153,18 @@ class GraphService:
             return await graph.ainvoke(payload, config=run_config, context=ctx)
 
         except asyncio.CancelledError:
+            status = "cancelled"
             logger.info(f"Run {run_id} was cancelled")
             return {"status": "cancelled", "run_id": run_id, "message": "Execution was cancelled"}
         except Exception as e:
+            status = "error"
             # 记录详细的错误信息和堆栈跟踪
             logger.error(f"Error in GraphService.run: {str(e)}\nTraceback:\n{extract_core_stack()}")
             # 重新抛出异常，让上层捕获并处理
             raise
         finally:
+            TURN_DURATION.observe(time.perf_counter() - turn_start, method=ctx.method or "run", status=status)
+            slow_run_profiler.finish(run_id)
             # 清理任务记录
             self.running_tasks.pop(run_id, None)
 
@@ -159,10 +181,25 @@ class GraphService:
         else:
             run_config = init_run_config(graph, ctx)  # vibeflow
 
+        turn_start = time.perf_counter()
+        status = "success"
+        slow_run_profiler.start(run_id, ctx.logid, ctx.method)
         try:
             async for chunk in self.astream(payload, graph, run_config=run_config, ctx=ctx):
-                yield self._sse_event(chunk)
+                event = self._sse_event(chunk)
+                # yield 返回前包含了写出到客户端的时间（客户端读得慢时即为背压等待）
+                write_start = time.perf_counter()
+                yield event
+                SSE_WRITE_DURATION.observe(time.perf_counter() - write_start, method=ctx.method or "stream_sse")
+        except (asyncio.CancelledError, GeneratorExit):
+            status = "cancelled"
+            raise
+        except Exception:
+            status = "error"
+            raise
         finally:
+            TURN_DURATION.observe(time.perf_counter() - turn_start, method=ctx.method or "stream_sse", status=status)
+            slow_run_profiler.finish(run_id)
             # 清理任务记录
             self.running_tasks.pop(run_id, None)
             cozeloop.flush()
@@ -236,33 +273,39 @@ class GraphService:
         return {"input_schema": _graph_input.model_json_schema(), "output_schema": _graph_output.model_json_schema()}
 
     async def astream(self, payload: Dict[str, Any], graph: CompiledStateGraph, run_config: RunnableConfig, ctx=Context) -> AsyncIterable[Any]:
+        if STREAM_RUNNER == "thread":
+            stream = self._astream_thread(payload, graph, run_config, ctx)
+        else:
+            stream = self._astream_native(payload, graph, run_config, ctx)
+        async with aclosing(stream):
+            async for item in stream:
+                yield item
+
+    # 原生异步模式：直接在事件循环上迭代 graph.astream，不占用额外线程
+    async def _astream_native(self, payload: Dict[str, Any], graph: CompiledStateGraph, run_config: RunnableConfig, ctx=Context) -> AsyncIterable[Any]:
         client_msg, session_id = to_client_message(payload)
         run_config["recursion_limit"] = 100
         run_config["configurable"] = {"thread_id": session_id}
         stream_input = to_stream_input(client_msg)
 
-        # 使用后台线程拉取同步流，并通过事件循环安全地推送到异步队列
-        loop = asyncio.get_running_loop()
-        q: asyncio.Queue = asyncio.Queue()
-        context = contextvars.copy_context()
         start_time = time.time()
-        def producer():
-            try:
-                items = graph.stream(stream_input, stream_mode="messages", config=run_config, context=ctx)
-                server_msgs_iter = agent_iter_server_messages(
-                    items,
-                    session_id=client_msg.session_id,
-                    query_msg_id=client_msg.local_msg_id,
-                    local_msg_id=client_msg.local_msg_id,
-                    run_id=ctx.run_id,
-                    log_id=ctx.logid,
-                )
-                last_seq = 0
-                for sm in server_msgs_iter:
+        last_seq = 0
+        try:
+            items = graph.astream(stream_input, stream_mode="messages", config=run_config, context=ctx)
+            server_msgs_iter = agent_aiter_server_messages(
+                items,
+                session_id=client_msg.session_id,
+                query_msg_id=client_msg.local_msg_id,
+                local_msg_id=client_msg.local_msg_id,
+                run_id=ctx.run_id,
+                log_id=ctx.logid,
+            )
+            async with aclosing(server_msgs_iter):
+                async for sm in server_msgs_iter:
                     # 主动检查执行时间，及时中断
                     if time.time() - start_time > TIMEOUT_SECONDS:
                         logger.error(f"Agent execution timeout after {TIMEOUT_SECONDS}s for run_id: {ctx.run_id}")
-                        timeout_msg = create_message_end_dict(
+                        yield create_message_end_dict(
                             code="TIMEOUT",
                             message=f"Execution timeout: exceeded {TIMEOUT_SECONDS} seconds",
                             session_id=client_msg.session_id,
@@ -272,10 +315,96 @@ class GraphService:
                             reply_id=getattr(sm, 'reply_id', ''),
                             sequence_id=last_seq + 1,
                         )
-                        loop.call_soon_threadsafe(q.put_nowait, timeout_msg)
                         return
-                    loop.call_soon_threadsafe(q.put_nowait, sm.dict())
+                    yield sm.dict()
                     last_seq = sm.sequence_id
+        except asyncio.CancelledError:
+            logger.info(f"Stream cancelled for run_id: {ctx.run_id}")
+            raise
+        except Exception as ex:
+            yield create_message_end_dict(
+                code="exception",
+                message=str(ex),
+                session_id=client_msg.session_id,
+                query_msg_id=client_msg.local_msg_id,
+                log_id=ctx.logid,
+                time_cost_ms=int((time.time() - start_time) * 1000),
+                reply_id="",
+                sequence_id=last_seq + 1,
+            )
+
+    # 兼容模式：后台线程驱动同步 graph.stream，通过有界队列推送到事件循环
+    async def _astream_thread(self, payload: Dict[str, Any], graph: CompiledStateGraph, run_config: RunnableConfig, ctx=Context) -> AsyncIterable[Any]:
+        client_msg, session_id = to_client_message(payload)
+        run_config["recursion_limit"] = 100
+        run_config["configurable"] = {"thread_id": session_id}
+        stream_input = to_stream_input(client_msg)
+
+        # 使用后台线程拉取同步流，并通过事件循环安全地推送到有界异步队列
+        loop = asyncio.get_running_loop()
+        q: asyncio.Queue = asyncio.Queue(maxsize=STREAM_QUEUE_MAXSIZE)
+        # 消费端退出（完成/取消/客户端断开）时置位，通知生产线程停止拉取
+        stopped = threading.Event()
+        context = contextvars.copy_context()
+        start_time = time.time()
+
+        def put(item) -> bool:
+            """阻塞式入队：队列满时等待消费端读取（背压），消费端退出时返回 False"""
+            if stopped.is_set():
+                return False
+            try:
+                fut = asyncio.run_coroutine_threadsafe(q.put(item), loop)
+            except RuntimeError:
+                # 事件循环已关闭
+                return False
+            while True:
+                try:
+                    fut.result(timeout=STREAM_PUT_POLL_SECONDS)
+                    return True
+                except concurrent.futures.TimeoutError:
+                    if stopped.is_set():
+                        fut.cancel()
+                        return False
+                except concurrent.futures.CancelledError:
+                    return False
+
+        def producer():
+            slow_run_profiler.add_thread(ctx.run_id)
+            last_seq = 0
+            try:
+                items = graph.stream(stream_input, stream_mode="messages", config=run_config, context=ctx)
+                server_msgs_iter = agent_iter_server_messages(
+                    items,
+                    session_id=client_msg.session_id,
+                    query_msg_id=client_msg.local_msg_id,
+                    local_msg_id=client_msg.local_msg_id,
+                    run_id=ctx.run_id,
+                    log_id=ctx.logid,
+                )
+                try:
+                    for sm in server_msgs_iter:
+                        # 主动检查执行时间，及时中断
+                        if time.time() - start_time > TIMEOUT_SECONDS:
+                            logger.error(f"Agent execution timeout after {TIMEOUT_SECONDS}s for run_id: {ctx.run_id}")
+                            timeout_msg = create_message_end_dict(
+                                code="TIMEOUT",
+                                message=f"Execution timeout: exceeded {TIMEOUT_SECONDS} seconds",
+                                session_id=client_msg.session_id,
+                                query_msg_id=client_msg.local_msg_id,
+                                log_id=ctx.logid,
+                                time_cost_ms=int((time.time() - start_time) * 1000),
+                                reply_id=getattr(sm, 'reply_id', ''),
+                                sequence_id=last_seq + 1,
+                            )
+                            put(timeout_msg)
+                            return
+                        if not put(sm.dict()):
+                            logger.info(f"Stream consumer gone, stop producing for run_id: {ctx.run_id}")
+                            return
+                        last_seq = sm.sequence_id
+                finally:
+                    # 关闭生成器，使 graph.stream 及时停止执行
+                    server_msgs_iter.close()
             except Exception as ex:
                 end_msg = create_message_end_dict(
                     code="exception",
@@ -287,9 +416,9 @@ class GraphService:
                     reply_id="",
                     sequence_id=last_seq + 1,
                 )
-                loop.call_soon_threadsafe(q.put_nowait, end_msg)
+                put(end_msg)
             finally:
-                loop.call_soon_threadsafe(q.put_nowait, None)
+                put(None)
 
         threading.Thread(target=lambda: context.run(producer), daemon=True).start()
 
@@ -302,13 +431,14 @@ class GraphService:
         except asyncio.CancelledError:
             logger.info(f"Stream cancelled for run_id: {ctx.run_id}")
             raise
+        finally:
+            stopped.set()
 
 
 service = GraphService()
 app = FastAPI()
 
 # 挂载静态文件服务
-import os
 static_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
 if os.path.exists(static_dir):
     app.mount("/static", StaticFiles(directory=static_dir), name="static")
@@ -528,6 +658,7 @@ async def health_check():
         return {
             "status": "ok",
             "message": "Service is running",
+            "logging": get_logging_stats(),
         }
     except Exception as e:
         raise HTTPException(status_code=503, detail=str(e))
@@ -538,6 +669,83 @@ async def http_graph_inout_parameter(request: Request):
     return service.graph_inout_schema()
 
 
+def _pipeline_metrics():
+    """日志管道、节点日志写入和搜索缓存的统计，转换为 Prometheus gauge/counter"""
+    from utils.log.log_sink import get_log_writer
+    from storage.cache.search_cache import search_cache
+
+    logging_stats = get_logging_stats()
+    sink_stats = get_log_writer(LOG_FILE).stats()
+    cache_stats = search_cache.stats()
+    return [
+        ("app_log_queue_depth", "gauge", "应用日志队列当前长度", [({}, logging_stats["queue_depth"])]),
+        ("app_log_dropped_total", "counter", "应用日志因队列满丢弃的条数", [({}, logging_stats["dropped"])]),
+        ("app_log_debug_sampled_out_total", "counter", "被采样丢弃的 DEBUG 日志条数",
+         [({}, logging_stats["debug_sampled_out"])]),
+        ("node_log_queue_depth", "gauge", "节点日志写入队列当前长度", [({}, sink_stats["queue_depth"])]),
+        ("node_log_written_total", "counter", "已写入的节点日志条数", [({}, sink_stats["written"])]),
+        ("node_log_dropped_total", "counter", "丢弃的节点日志条数", [({}, sink_stats["dropped"])]),
+        ("node_log_fsync_total", "counter", "节点日志 fsync 次数", [({}, sink_stats["fsyncs"])]),
+        ("search_cache_size", "gauge", "搜索缓存内存条目数", [({}, cache_stats["size"])]),
+        ("search_cache_lookups_total", "counter", "搜索缓存查询次数", [
+            ({"result": "memory_hit"}, cache_stats["memory_hits"]),
+            ({"result": "persistent_hit"}, cache_stats["persistent_hits"]),
+            ({"result": "miss"}, cache_stats["misses"]),
+        ]),
+    ]
+
+
+metrics_registry.register_collector(_pipeline_metrics)
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus 指标（各阶段耗时直方图 + 日志/缓存统计）"""
+    return Response(content=metrics_registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def _check_admin_token(request: Request):
+    if not PROFILER_ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="PROFILER_ADMIN_TOKEN 未配置，管理接口不可用")
+    # 定长比较，避免按响应耗时逐字节猜出令牌
+    token = request.headers.get("x-admin-token", "")
+    if not hmac.compare_digest(token.encode("utf-8"), PROFILER_ADMIN_TOKEN.encode("utf-8")):
+        raise HTTPException(status_code=401, detail="管理令牌无效")
+
+
+@app.get("/admin/profiles")
+async def list_profiles(request: Request):
+    """慢请求采样分析列表（最新的在前）"""
+    _check_admin_token(request)
+    return {
+        "enabled": slow_run_profiler.enabled,
+        "threshold_ms": int(slow_run_profiler.threshold * 1000),
+        "profiles": slow_run_profiler.list_profiles(),
+    }
+
+
+@app.get("/admin/profiles/{run_id}")
+async def get_profile(run_id: str, request: Request, fmt: str = Query("speedscope", alias="format")):
+    """下载指定 run_id 的采样分析文件（format: speedscope / collapsed）"""
+    _check_admin_token(request)
+    path = slow_run_profiler.get_profile_path(run_id, fmt)
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"未找到 run_id={run_id} 的 {fmt} 分析文件")
+    media_type = "application/json" if fmt == "speedscope" else "text/plain; charset=utf-8"
+    return FileResponse(path, media_type=media_type, filename=path.name)
+
+
+@app.get("/api/tools")
+async def list_tools(request: Request):
+    """获取所有可用工具列表（与 Flask 后端共用工具注册表，支持 ETag 协商缓存）"""
+    from agents.agent import get_tool_registry
+    registry = get_tool_registry()
+    headers = {"ETag": registry.etag, "Cache-Control": "no-cache"}
+    if registry.etag_matches(request.headers.get("if-none-match")):
+        return Response(status_code=304, headers=headers)
+    return Response(content=registry.listing_body, media_type="application/json", headers=headers)
+
+
 # 花名册管理API接口
 
 from pydantic import BaseModel
@@ -574,18 +782,18 @@ async def add_roster(entry: RosterEntryCreate):
     """添加花名册条目"""
     from tools.roster_tool import add_roster_entry
     try:
-        result = add_roster_entry(
-            user_id=entry.user_id,
-            name=entry.name,
-            gender=entry.gender,
-            relationship_type=entry.relationship_type,
-            current_location=entry.current_location,
-            birth_date=entry.birth_date or "",
-            mbti=entry.mbti or "",
-            birth_place=entry.birth_place or "",
-            relationship_level=entry.relationship_level or "",
-            notes=entry.notes or ""
-        )
+        result = await add_roster_entry.ainvoke({
+            "user_id": entry.user_id,
+            "name": entry.name,
+            "gender": entry.gender,
+            "relationship_type": entry.relationship_type,
+            "current_location": entry.current_location,
+            "birth_date": entry.birth_date or "",
+            "mbti": entry.mbti or "",
+            "birth_place": entry.birth_place or "",
+            "relationship_level": entry.relationship_level or "",
+            "notes": entry.notes or ""
+        })
         return {"success": True, "message": result}
     except Exception as e:
         logger.error(f"Error adding roster entry: {e}")
@@ -593,23 +801,76 @@ async def add_roster(entry: RosterEntryCreate):
 
 
 @app.get("/api/roster")
-async def get_roster(user_id: str, relationship_type: str = ""):
-    """获取花名册列表"""
-    from tools.roster_tool import get_roster_entries
+async def get_roster(user_id: str, relationship_type: str = "", limit: int = 0, cursor: str = ""):
+    """获取花名册列表（不传 limit/cursor 时返回全部；分页时 next_cursor 为下一页游标）"""
+    from storage.database.db import run_in_async_session
+    from tools.roster_tool import list_roster_entries
     try:
-        result = get_roster_entries(user_id=user_id, relationship_type=relationship_type)
-        return {"success": True, "message": result}
+        result, next_cursor = await run_in_async_session(
+            list_roster_entries, user_id, relationship_type, limit, cursor
+        )
+        return {"success": True, "message": result, "has_more": next_cursor is not None, "next_cursor": next_cursor}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error getting roster: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+class RosterImportRequest(BaseModel):
+    user_id: str
+    content: str
+    file_format: Optional[str] = "auto"
+    skip_existing: Optional[bool] = True
+
+
+@app.post("/api/roster/import")
+async def import_roster_bulk(request: RosterImportRequest):
+    """批量导入花名册（CSV/JSONL），一次事务写入，返回逐行错误"""
+    from storage.database.db import run_in_async_session
+    from tools.roster_bulk_tool import parse_roster_rows, import_roster
+    try:
+        rows = parse_roster_rows(request.content, request.file_format or "auto")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        report = await run_in_async_session(
+            import_roster, request.user_id, rows, skip_existing=request.skip_existing is not False
+        )
+        return {"success": True, **report}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error importing roster: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/roster/export")
+async def export_roster_bulk(user_id: str, file_format: str = "csv", relationship_type: str = ""):
+    """导出花名册（CSV/JSONL），格式与批量导入一致"""
+    from storage.database.db import run_in_async_session
+    from tools.roster_bulk_tool import export_roster
+    if file_format not in ("csv", "jsonl"):
+        raise HTTPException(status_code=400, detail=f"不支持的导出格式: {file_format}")
+    try:
+        content = await run_in_async_session(export_roster, user_id, file_format, relationship_type)
+        media_type = "text/csv" if file_format == "csv" else "application/x-ndjson"
+        return Response(
+            content=content,
+            media_type=f"{media_type}; charset=utf-8",
+            headers={"Content-Disposition": f'attachment; filename="roster.{file_format}"'}
+        )
+    except Exception as e:
+        logger.error(f"Error exporting roster: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.get("/api/roster/{entry_id}")
 async def get_roster_detail(entry_id: int):
     """获取花名册条目详情"""
     from tools.roster_tool import get_roster_entry_by_id
     try:
-        result = get_roster_entry_by_id(entry_id=entry_id)
+        result = await get_roster_entry_by_id.ainvoke({"entry_id": entry_id})
         return {"success": True, "message": result}
     except Exception as e:
         logger.error(f"Error getting roster entry: {e}")
@@ -621,18 +882,18 @@ async def update_roster(entry_id: int, entry: RosterEntryUpdate):
     """更新花名册条目"""
     from tools.roster_tool import update_roster_entry
     try:
-        result = update_roster_entry(
-            entry_id=entry_id,
-            name=entry.name or "",
-            gender=entry.gender or "",
-            current_location=entry.current_location or "",
-            birth_date=entry.birth_date or "",
-            mbti=entry.mbti or "",
-            birth_place=entry.birth_place or "",
-            relationship_type=entry.relationship_type or "",
-            relationship_level=entry.relationship_level or "",
-            notes=entry.notes or ""
-        )
+        result = await update_roster_entry.ainvoke({
+            "entry_id": entry_id,
+            "name": entry.name or "",
+            "gender": entry.gender or "",
+            "current_location": entry.current_location or "",
+            "birth_date": entry.birth_date or "",
+            "mbti": entry.mbti or "",
+            "birth_place": entry.birth_place or "",
+            "relationship_type": entry.relationship_type or "",
+            "relationship_level": entry.relationship_level or "",
+            "notes": entry.notes or ""
+        })
         return {"success": True, "message": result}
     except Exception as e:
         logger.error(f"Error updating roster entry: {e}")
@@ -644,7 +905,7 @@ async def delete_roster(entry_id: int):
     """删除花名册条目"""
     from tools.roster_tool import delete_roster_entry
     try:
-        result = delete_roster_entry(entry_id=entry_id)
+        result = await delete_roster_entry.ainvoke({"entry_id": entry_id})
         return {"success": True, "message": result}
     except Exception as e:
         logger.error(f"Error deleting roster entry: {e}")
@@ -656,7 +917,7 @@ async def search_roster(user_id: str, keyword: str):
     """搜索花名册条目"""
     from tools.roster_tool import search_roster_entries
     try:
-        result = search_roster_entries(user_id=user_id, keyword=keyword)
+        result = await search_roster_entries.ainvoke({"user_id": user_id, "keyword": keyword})
         return {"success": True, "message": result}
     except Exception as e:
         logger.error(f"Error searching roster: {e}")
@@ -664,11 +925,11 @@ async def search_roster(user_id: str, keyword: str):
 
 
 @app.post("/api/roster/bazi")
-async def update_bazi(user_id: str, bazi: str):
+async def update_bazi(user_id: str, bazi: str = ""):
     """为用户添加八字信息"""
     from tools.roster_tool import add_user_bazi
     try:
-        result = add_user_bazi(user_id=user_id, bazi=bazi)
+        result = await add_user_bazi.ainvoke({"user_id": user_id, "bazi": bazi})
         return {"success": True, "message": result}
     except Exception as e:
         logger.error(f"Error updating bazi: {e}")
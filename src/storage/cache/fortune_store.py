@@ -0,0 +1,91 @@
+"""
+命理分析结果存储
+八字/紫微分析结果是 (出生年月日时, 性别, 查询日期) 的纯函数，计算一次后持久化复用，
+夜间预计算任务（jobs.precompute_fortune）提前写入次日结果，早高峰直接读取。
+"""
+import hashlib
+import logging
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import delete
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from storage.database.db import get_session
+from storage.database.shared.model import FortuneResult
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize_number(value: str) -> str:
+    value = str(value or "").strip()
+    return f"{int(value):02d}" if value.isdigit() else value
+
+
+def normalize_birth_info(birth_year: str, birth_month: str, birth_day: str,
+                         birth_hour: str, gender: str) -> str:
+    """出生信息归一化：数字补零，"1"/"0" 性别代码转为 男/女"""
+    gender = str(gender or "").strip()
+    gender = {"1": "男", "0": "女"}.get(gender, gender)
+    return "-".join([
+        str(birth_year or "").strip(),
+        _normalize_number(birth_month),
+        _normalize_number(birth_day),
+        _normalize_number(birth_hour),
+        gender,
+    ])
+
+
+def make_fortune_key(kind: str, birth_info: str, query_date: str) -> str:
+    return hashlib.sha256(f"{kind}|{birth_info}|{query_date}".encode("utf-8")).hexdigest()
+
+
+class FortuneResultStore:
+    """命理分析结果持久化存储"""
+
+    def get(self, kind: str, birth_info: str, query_date: str) -> Optional[str]:
+        try:
+            with get_session() as session:
+                row = session.get(FortuneResult, make_fortune_key(kind, birth_info, query_date))
+                return row.result if row is not None else None
+        except Exception as e:
+            logger.warning(f"⚠️ 读取命理分析结果失败: {e}")
+            return None
+
+    def put(self, kind: str, birth_info: str, query_date: str, result: str, source: str):
+        try:
+            with get_session() as session:
+                stmt = pg_insert(FortuneResult).values(
+                    cache_key=make_fortune_key(kind, birth_info, query_date),
+                    kind=kind,
+                    birth_info=birth_info,
+                    query_date=query_date,
+                    result=result,
+                    source=source,
+                    created_at=datetime.utcnow()
+                )
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[FortuneResult.cache_key],
+                    set_={
+                        "result": stmt.excluded.result,
+                        "source": stmt.excluded.source,
+                        "created_at": stmt.excluded.created_at,
+                    }
+                )
+                session.execute(stmt)
+                session.commit()
+        except Exception as e:
+            logger.warning(f"⚠️ 保存命理分析结果失败: {e}")
+
+    def purge_before(self, query_date: str) -> int:
+        """删除查询日期早于 query_date 的结果，返回删除行数"""
+        with get_session() as session:
+            deleted = session.execute(
+                delete(FortuneResult).where(FortuneResult.query_date < query_date)
+            ).rowcount
+            session.commit()
+        return deleted
+
+
+# 全局单例
+fortune_store = FortuneResultStore()
@@ -0,0 +1,159 @@
+"""
+报告缓存
+为人生解读、职场大势、每日报告提供分层缓存：进程内 LRU + 可选本地磁盘层
+
+缓存内容是格式化后的报告文本及其生成时间，条目有效期与各报告的 check_expired 语义一致
+（人生解读/职场大势 90 天、每日报告 1 天），保存报告时由 save_* 工具显式失效。
+invalidate 只能清掉当前进程的内存层，其他进程（Flask 后端 / FastAPI）的内存层无法感知，
+因此内存层条目最多保留 REPORT_MEMORY_TTL_SECONDS 秒，跨进程的陈旧窗口不超过该值；
+共享磁盘目录时磁盘层由 invalidate 删除文件，对所有进程立即生效。
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 报告类型
+LIFE_INTERPRETATION = "life_interpretation"
+CAREER_TREND = "career_trend"
+DAILY_REPORT = "daily_report"
+
+# 各报告有效期，与 roster_tool 中 check_expired 的判断保持一致
+REPORT_TTLS: Dict[str, timedelta] = {
+    LIFE_INTERPRETATION: timedelta(days=90),
+    CAREER_TREND: timedelta(days=90),
+    DAILY_REPORT: timedelta(days=1),
+}
+
+# 进程内 LRU 容量
+REPORT_CACHE_SIZE = int(os.getenv("REPORT_CACHE_SIZE", "2048"))
+# 内存层条目的最长保留时间（秒），限制多进程部署下其他进程读到旧报告的时间
+REPORT_MEMORY_TTL_SECONDS = int(os.getenv("REPORT_MEMORY_TTL_SECONDS", "60"))
+# 本地磁盘缓存目录，不配置则不启用磁盘层
+REPORT_CACHE_DIR = os.getenv("REPORT_CACHE_DIR", "")
+
+
+class ReportCache:
+    """报告分层缓存：短期内存 LRU 在前，磁盘层在后（多进程部署时可共享同一目录）"""
+
+    def __init__(self, max_size: int = REPORT_CACHE_SIZE, cache_dir: str = REPORT_CACHE_DIR):
+        self._max_size = max_size
+        self._cache_dir = cache_dir
+        self._entries: "OrderedDict[Tuple[str, ...], Tuple[datetime, datetime, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _disk_path(self, key: Tuple[str, ...]) -> str:
+        digest = hashlib.sha1("\x1f".join(key).encode("utf-8")).hexdigest()
+        return os.path.join(self._cache_dir, f"{key[0]}-{digest}.json")
+
+    def _put_memory(self, key: Tuple[str, ...], entry: Tuple[datetime, datetime, str]):
+        # 内存层过期时间不超过 REPORT_MEMORY_TTL_SECONDS，到期后回源磁盘层/数据库重新确认
+        memory_expires_at = datetime.utcnow() + timedelta(seconds=REPORT_MEMORY_TTL_SECONDS)
+        entry = (min(entry[0], memory_expires_at), entry[1], entry[2])
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+    def get(self, kind: str, *key_parts: str) -> Optional[Tuple[datetime, str]]:
+        """
+        读取缓存
+
+        返回：(报告生成时间, 格式化后的报告文本)，未命中或已过期返回 None
+        """
+        key = (kind, *key_parts)
+        now = datetime.utcnow()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    return entry[1], entry[2]
+                del self._entries[key]
+
+        if not self._cache_dir:
+            return None
+
+        path = self._disk_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            entry = (
+                datetime.fromisoformat(data["expires_at"]),
+                datetime.fromisoformat(data["generated_at"]),
+                data["text"],
+            )
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"⚠️ 读取报告磁盘缓存失败: {e}")
+            return None
+
+        if entry[0] <= now:
+            self._remove_disk(path)
+            return None
+
+        self._put_memory(key, entry)
+        return entry[1], entry[2]
+
+    def set(self, kind: str, *key_parts: str, generated_at: datetime, text: str):
+        """写入缓存，有效期从报告生成时间起算"""
+        key = (kind, *key_parts)
+        expires_at = generated_at + REPORT_TTLS[kind]
+        if expires_at <= datetime.utcnow():
+            return
+
+        entry = (expires_at, generated_at, text)
+        self._put_memory(key, entry)
+
+        if not self._cache_dir:
+            return
+
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({
+                    "expires_at": expires_at.isoformat(),
+                    "generated_at": generated_at.isoformat(),
+                    "text": text,
+                }, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"⚠️ 写入报告磁盘缓存失败: {e}")
+            self._remove_disk(tmp_path)
+
+    def invalidate(self, kind: str, *key_parts: str):
+        """报告被重新生成/保存后调用"""
+        key = (kind, *key_parts)
+        with self._lock:
+            self._entries.pop(key, None)
+        if self._cache_dir:
+            self._remove_disk(self._disk_path(key))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    @staticmethod
+    def _remove_disk(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"⚠️ 删除报告磁盘缓存失败: {e}")
+
+
+# 全局单例
+report_cache = ReportCache()
@@ -0,0 +1,173 @@
+"""
+联网搜索结果缓存
+以归一化后的 (query, search_type, count, need_summary, ...) 为键，进程内 LRU 在前，Postgres 持久层在后
+
+很多工具的搜索语句由低基数的输入拼出（如"{行业}行业 核心技能 职位要求"），
+同样的查询在大量用户之间重复出现，缓存后可省去绝大部分重复搜索。
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import delete
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from storage.database.db import get_session
+from storage.database.shared.model import SearchResultCache
+
+logger = logging.getLogger(__name__)
+
+# 是否启用搜索缓存 / 是否启用持久层
+SEARCH_CACHE_ENABLED = os.getenv("SEARCH_CACHE_ENABLED", "1") == "1"
+SEARCH_CACHE_PERSISTENT = os.getenv("SEARCH_CACHE_PERSISTENT", "1") == "1"
+# 进程内 LRU 容量
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "4096"))
+
+# 各搜索类型的缓存有效期（秒）
+SEARCH_TYPE_TTLS: Dict[str, int] = {
+    "web": 6 * 3600,
+    "web_summary": 6 * 3600,
+}
+DEFAULT_SEARCH_TTL = 3600
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """查询归一化：全角转半角（NFKC）、小写、合并空白"""
+    query = unicodedata.normalize("NFKC", query or "")
+    return _WHITESPACE_RE.sub(" ", query).strip().lower()
+
+
+def make_cache_key(query: str, search_type: str, count: Any, need_summary: Any, **extra: Any) -> str:
+    """由归一化查询和会影响结果的参数生成缓存键"""
+    parts = {
+        "query": normalize_query(query),
+        "search_type": search_type,
+        "count": count,
+        "need_summary": bool(need_summary),
+    }
+    # 其余过滤参数（sites/block_hosts/time_range 等）只在非默认值时参与计算
+    parts.update({k: v for k, v in extra.items() if v})
+    raw = json.dumps(parts, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class SearchCache:
+    """搜索结果分层缓存"""
+
+    def __init__(self, max_size: int = SEARCH_CACHE_SIZE, persistent: bool = SEARCH_CACHE_PERSISTENT):
+        self._max_size = max_size
+        self._persistent = persistent
+        self._entries: "OrderedDict[str, Tuple[datetime, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            "memory_hits": 0,
+            "persistent_hits": 0,
+            "misses": 0,
+            "errors": 0,
+        }
+
+    def _incr(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _put_memory(self, key: str, expires_at: datetime, value: Any):
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Any]:
+        now = datetime.utcnow()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return entry[1]
+                del self._entries[key]
+
+        if self._persistent:
+            try:
+                with get_session() as session:
+                    row = session.get(SearchResultCache, key)
+                    if row is not None and row.expires_at > now:
+                        expires_at, payload = row.expires_at, row.payload
+                        self._put_memory(key, expires_at, payload)
+                        self._incr("persistent_hits")
+                        return payload
+            except Exception as e:
+                self._incr("errors")
+                logger.warning(f"⚠️ 读取搜索缓存失败: {e}")
+
+        self._incr("misses")
+        return None
+
+    def set(self, key: str, query: str, search_type: str, value: Any, ttl: int):
+        expires_at = datetime.utcnow() + timedelta(seconds=ttl)
+        self._put_memory(key, expires_at, value)
+
+        if not self._persistent:
+            return
+        try:
+            with get_session() as session:
+                stmt = pg_insert(SearchResultCache).values(
+                    cache_key=key,
+                    query=normalize_query(query),
+                    search_type=search_type,
+                    payload=value,
+                    expires_at=expires_at,
+                    created_at=datetime.utcnow()
+                )
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[SearchResultCache.cache_key],
+                    set_={
+                        "payload": stmt.excluded.payload,
+                        "expires_at": stmt.excluded.expires_at,
+                        "created_at": stmt.excluded.created_at,
+                    }
+                )
+                session.execute(stmt)
+                session.commit()
+        except Exception as e:
+            self._incr("errors")
+            logger.warning(f"⚠️ 写入搜索缓存失败: {e}")
+
+    def purge_expired(self) -> int:
+        """清理持久层中已过期的缓存，返回删除行数"""
+        with self._lock:
+            now = datetime.utcnow()
+            for key in [k for k, (expires_at, _) in self._entries.items() if expires_at <= now]:
+                del self._entries[key]
+        if not self._persistent:
+            return 0
+        with get_session() as session:
+            deleted = session.execute(
+                delete(SearchResultCache).where(SearchResultCache.expires_at <= datetime.utcnow())
+            ).rowcount
+            session.commit()
+        return deleted
+
+    def stats(self) -> Dict[str, Any]:
+        """命中/未命中统计"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+        lookups = stats["memory_hits"] + stats["persistent_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["persistent_hits"]) / lookups if lookups else 0.0
+        return stats
+
+
+# 全局单例
+search_cache = SearchCache()
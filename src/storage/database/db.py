@@ -1,9 +1,16 @@
 import os
 import time
-from sqlalchemy import create_engine, text
-from sqlalchemy.orm import sessionmaker
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Callable, Optional
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import Session, sessionmaker
 from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 import logging
+
+from utils.log.metrics import DB_DURATION, statement_kind
+
 logger = logging.getLogger(__name__)
 
 MAX_RETRY_TIME = 20  # 连接最大重试时间（秒）
@@ -37,6 +44,26 @@ def get_db_url() -> str:
     return url
 _engine = None
 _SessionLocal = None
+_async_engine: Optional[AsyncEngine] = None
+_AsyncSessionLocal: Optional[async_sessionmaker] = None
+
+# run_in_async_session 执行期间绑定的同步 Session（AsyncSession.sync_session）
+_bound_session: ContextVar[Optional[Session]] = ContextVar("_bound_session", default=None)
+
+def _instrument_engine(engine):
+    """记录每条 SQL 语句的耗时（db_statement_duration_seconds，按语句类型区分）"""
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._statement_start = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, "_statement_start", None)
+        if start is not None:
+            DB_DURATION.observe(time.perf_counter() - start, statement=statement_kind(statement))
+
+    return engine
+
 
 def _create_engine_with_retry():
     url = get_db_url()
@@ -55,6 +82,7 @@ def _create_engine_with_retry():
         pool_recycle=recycle,
         pool_timeout=timeout,
     )
+    _instrument_engine(engine)
     # 验证连接，带重试
     start_time = time.time()
     last_error = None
@@ -83,12 +111,103 @@ def get_sessionmaker():
         _SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=get_engine())
     return _SessionLocal
 
+class _BoundSession:
+    """复用已绑定的 Session，退出 with 块时不关闭，由外层 AsyncSession 负责生命周期"""
+
+    def __init__(self, session: Session):
+        self._session = session
+
+    def __enter__(self) -> Session:
+        return self._session
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
 def get_session():
+    bound = _bound_session.get()
+    if bound is not None:
+        return _BoundSession(bound)
     return get_sessionmaker()()
 
+
+def _to_async_url(url: str) -> str:
+    """将同步连接串转换为 psycopg(3) 异步驱动连接串"""
+    for prefix in ("postgresql+psycopg2://", "postgresql+psycopg://", "postgresql://", "postgres://"):
+        if url.startswith(prefix):
+            return "postgresql+psycopg://" + url[len(prefix):]
+    return url
+
+
+def get_async_engine() -> AsyncEngine:
+    global _async_engine
+    if _async_engine is None:
+        url = get_db_url()
+        if url is None or url == "":
+            logger.error("PGDATABASE_URL is not set")
+            raise ValueError("PGDATABASE_URL is not set")
+        _async_engine = create_async_engine(
+            _to_async_url(url),
+            pool_size=100,
+            max_overflow=100,
+            pool_pre_ping=True,
+            pool_recycle=1800,
+            pool_timeout=30,
+        )
+        _instrument_engine(_async_engine.sync_engine)
+    return _async_engine
+
+
+def get_async_sessionmaker() -> async_sessionmaker:
+    global _AsyncSessionLocal
+    if _AsyncSessionLocal is None:
+        _AsyncSessionLocal = async_sessionmaker(
+            bind=get_async_engine(),
+            autoflush=False,
+            expire_on_commit=False,
+        )
+    return _AsyncSessionLocal
+
+
+@asynccontextmanager
+async def get_async_session() -> AsyncIterator[AsyncSession]:
+    """
+    获取异步 Session，用法：
+
+        async with get_async_session() as session:
+            result = await session.execute(select(UserAccount))
+    """
+    async with get_async_sessionmaker()() as session:
+        yield session
+
+
+def _call_with_bound_session(sync_session: Session, func: Callable[..., Any], args, kwargs) -> Any:
+    token = _bound_session.set(sync_session)
+    try:
+        return func(*args, **kwargs)
+    finally:
+        _bound_session.reset(token)
+
+
+async def run_in_async_session(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    在 AsyncEngine 上执行基于 get_session() 的同步 ORM 代码。
+
+    func 内部的 `with get_session() as session` 会拿到 AsyncSession 的同步视图，
+    SQL 通过异步驱动执行，等待 I/O 时让出事件循环，无需额外线程。
+    注意 func 内不应包含其他阻塞 I/O（如网络请求）。
+    """
+    async with get_async_session() as session:
+        return await session.run_sync(_call_with_bound_session, func, args, kwargs)
+
+
 __all__ = [
     "get_db_url",
     "get_engine",
     "get_sessionmaker",
     "get_session",
+    "get_async_engine",
+    "get_async_sessionmaker",
+    "get_async_session",
+    "run_in_async_session",
 ]
@@ -5,11 +5,13 @@
 import logging
 import hashlib
 from datetime import datetime
+from sqlalchemy import text
 from storage.database.shared.model import (
-    Base, UserProfile, UserConversationMemory, DailyReport,
-    UserAccount, UserDailyUsage, GlobalDailyUsage
+    Base, UserProfile, UserConversationMemory, DailyReport, ProfileReport,
+    UserAccount, UserDailyUsage, GlobalDailyUsage, ROSTER_SEARCH_DOCUMENT
 )
 from storage.database.db import get_engine, get_session
+from storage.database.report_store import encode_payload, ENCODING_ZLIB
 
 logger = logging.getLogger(__name__)
 
@@ -36,6 +38,220 @@ def init_database():
         raise
 
 
+def migrate_usage_unique_constraint():
+    """
+    迁移：为 user_daily_usage 补充 (user_id, date) 唯一约束
+
+    旧版本以"先查后写"方式记录消耗，并发下可能产生同一用户同一天的重复行。
+    加约束前先把重复行的消耗合并到 id 最小的一行，再删除其余行。
+    """
+    try:
+        engine = get_engine()
+        with engine.begin() as conn:
+            exists = conn.execute(
+                text("SELECT 1 FROM pg_constraint WHERE conname = 'uq_user_daily_usage_user_date'")
+            ).first()
+            if exists:
+                logger.info("⚠️ user_daily_usage 唯一约束已存在，跳过迁移")
+                return True
+
+            # 1. 合并重复行的消耗
+            merged = conn.execute(text("""
+                UPDATE user_daily_usage AS u
+                SET usage = d.total_usage
+                FROM (
+                    SELECT MIN(id) AS keep_id, SUM(usage) AS total_usage
+                    FROM user_daily_usage
+                    GROUP BY user_id, date
+                    HAVING COUNT(*) > 1
+                ) AS d
+                WHERE u.id = d.keep_id
+            """)).rowcount
+
+            # 2. 删除多余的重复行
+            deleted = conn.execute(text("""
+                DELETE FROM user_daily_usage AS u
+                USING user_daily_usage AS k
+                WHERE u.user_id = k.user_id AND u.date = k.date AND u.id > k.id
+            """)).rowcount
+
+            # 3. 添加唯一约束
+            conn.execute(text(
+                "ALTER TABLE user_daily_usage "
+                "ADD CONSTRAINT uq_user_daily_usage_user_date UNIQUE (user_id, date)"
+            ))
+
+        logger.info(f"✅ user_daily_usage 唯一约束迁移完成 | 合并: {merged} 组 | 删除重复行: {deleted}")
+        return True
+    except Exception as e:
+        logger.error(f"❌ user_daily_usage 唯一约束迁移失败: {e}")
+        raise
+
+
+def migrate_daily_report_unique_constraint():
+    """
+    迁移：为 daily_report 补充 (user_id, report_date) 唯一约束
+
+    旧版本并发生成每日报告时可能插入重复行，加约束前只保留每组中 id 最大（最新生成）的一行。
+    """
+    try:
+        engine = get_engine()
+        with engine.begin() as conn:
+            exists = conn.execute(
+                text("SELECT 1 FROM pg_constraint WHERE conname = 'uq_daily_report_user_date'")
+            ).first()
+            if exists:
+                logger.info("⚠️ daily_report 唯一约束已存在，跳过迁移")
+                return True
+
+            # 1. 删除旧的重复行
+            deleted = conn.execute(text("""
+                DELETE FROM daily_report AS r
+                USING daily_report AS k
+                WHERE r.user_id = k.user_id AND r.report_date = k.report_date AND r.id < k.id
+            """)).rowcount
+
+            # 2. 添加唯一约束
+            conn.execute(text(
+                "ALTER TABLE daily_report "
+                "ADD CONSTRAINT uq_daily_report_user_date UNIQUE (user_id, report_date)"
+            ))
+
+        logger.info(f"✅ daily_report 唯一约束迁移完成 | 删除重复行: {deleted}")
+        return True
+    except Exception as e:
+        logger.error(f"❌ daily_report 唯一约束迁移失败: {e}")
+        raise
+
+
+def migrate_roster_search_index():
+    """
+    迁移：为花名册搜索创建 pg_trgm GIN 表达式索引
+
+    search_roster_entries 按 姓名/MBTI/备注 做包含匹配（ILIKE '%关键词%'），前置通配符无法使用 B-tree，
+    三元组索引可支持任意位置的子串匹配（中文需数据库使用 UTF-8 非 C 的 locale）。
+    索引表达式必须与 ROSTER_SEARCH_DOCUMENT 完全一致。
+    """
+    try:
+        engine = get_engine()
+        with engine.begin() as conn:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS idx_user_profile_search_trgm "
+                f"ON user_profile USING gin ({ROSTER_SEARCH_DOCUMENT} gin_trgm_ops)"
+            ))
+            conn.execute(text("ANALYZE user_profile"))
+
+        logger.info("✅ 花名册搜索索引迁移完成")
+        return True
+    except Exception as e:
+        logger.error(f"❌ 花名册搜索索引迁移失败: {e}")
+        raise
+
+
+def migrate_roster_keyset_index():
+    """迁移：为花名册键集分页补充 (user_id, created_at, id) 复合索引（新建表时由模型自动创建）"""
+    try:
+        engine = get_engine()
+        with engine.begin() as conn:
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS idx_user_profile_user_created "
+                "ON user_profile (user_id, created_at, id)"
+            ))
+
+        logger.info("✅ 花名册分页索引迁移完成")
+        return True
+    except Exception as e:
+        logger.error(f"❌ 花名册分页索引迁移失败: {e}")
+        raise
+
+
+def migrate_profile_reports():
+    """
+    迁移：把 user_profile 中内联的人生解读/职场大势 JSON 移到 profile_report 表
+
+    1. user_profile 新增版本指针列 life_interpretation_version / career_trend_version
+    2. 分批读取旧 JSON，压缩后写入 profile_report（版本号从 1 开始），并回填指针
+    3. 删除旧的 life_interpretation / career_trend 列
+
+    整个迁移在一个事务中完成，失败时全部回滚；旧列不存在时视为已迁移。
+    """
+    batch_size = 500
+    kinds = (
+        ("life_interpretation", "life_interpretation_version", "life_interpretation_generated_at"),
+        ("career_trend", "career_trend_version", "career_trend_generated_at"),
+    )
+    try:
+        engine = get_engine()
+        with engine.begin() as conn:
+            conn.execute(text(
+                "ALTER TABLE user_profile "
+                "ADD COLUMN IF NOT EXISTS life_interpretation_version INTEGER, "
+                "ADD COLUMN IF NOT EXISTS career_trend_version INTEGER"
+            ))
+
+            legacy = conn.execute(text("""
+                SELECT 1 FROM information_schema.columns
+                WHERE table_name = 'user_profile' AND column_name = 'life_interpretation'
+            """)).first()
+            if not legacy:
+                logger.info("⚠️ 档案报告已迁移，跳过")
+                return True
+
+            moved = 0
+            last_id = 0
+            versions = {}
+            while True:
+                rows = conn.execute(text("""
+                    SELECT id, user_id, life_interpretation, life_interpretation_generated_at,
+                           career_trend, career_trend_generated_at
+                    FROM user_profile
+                    WHERE id > :last_id AND (life_interpretation IS NOT NULL OR career_trend IS NOT NULL)
+                    ORDER BY id
+                    LIMIT :batch_size
+                """), {"last_id": last_id, "batch_size": batch_size}).mappings().all()
+                if not rows:
+                    break
+
+                for row in rows:
+                    for kind, version_col, generated_col in kinds:
+                        data = row[kind]
+                        if data is None:
+                            continue
+                        key = (row["user_id"], kind)
+                        versions[key] = versions.get(key, 0) + 1
+                        payload, raw_size = encode_payload(data)
+                        conn.execute(text("""
+                            INSERT INTO profile_report
+                                (user_id, report_kind, version, encoding, payload, raw_size, created_at)
+                            VALUES (:user_id, :kind, :version, :encoding, :payload, :raw_size, :created_at)
+                        """), {
+                            "user_id": row["user_id"],
+                            "kind": kind,
+                            "version": versions[key],
+                            "encoding": ENCODING_ZLIB,
+                            "payload": payload,
+                            "raw_size": raw_size,
+                            "created_at": row[generated_col] or datetime.utcnow(),
+                        })
+                        conn.execute(
+                            text(f"UPDATE user_profile SET {version_col} = :version WHERE id = :id"),
+                            {"version": versions[key], "id": row["id"]}
+                        )
+                        moved += 1
+                last_id = rows[-1]["id"]
+
+            conn.execute(text(
+                "ALTER TABLE user_profile DROP COLUMN life_interpretation, DROP COLUMN career_trend"
+            ))
+
+        logger.info(f"✅ 档案报告迁移完成 | 迁移报告: {moved} 份")
+        return True
+    except Exception as e:
+        logger.error(f"❌ 档案报告迁移失败: {e}")
+        raise
+
+
 def init_default_data():
     """初始化默认数据：管理员账户和默认邀请码"""
     try:
@@ -94,6 +310,11 @@ if __name__ == "__main__":
     logger.info("开始初始化数据库...")
     logger.info("=" * 50)
     init_database()
+    migrate_usage_unique_constraint()
+    migrate_daily_report_unique_constraint()
+    migrate_roster_search_index()
+    migrate_roster_keyset_index()
+    migrate_profile_reports()
     init_default_data()
     logger.info("=" * 50)
     logger.info("数据库初始化完成！")
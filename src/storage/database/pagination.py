@@ -0,0 +1,54 @@
+"""
+键集分页（keyset pagination）
+按 (created_at, id) 倒序翻页：游标记录上一页最后一行的排序键，下一页用行值比较代替 OFFSET，
+翻到第几页都只扫描一页的数据，且翻页期间插入新行不会导致重复或遗漏。
+"""
+import base64
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Query
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    """把排序键编码为不透明的游标字符串"""
+    raw = f"{created_at.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """解析游标，格式错误时抛出 ValueError"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8").split("|")
+        return datetime.fromisoformat(created_at), int(row_id)
+    except Exception:
+        raise ValueError(f"无效的分页游标: {cursor}")
+
+
+def keyset_page(query: Query, created_col: Any, id_col: Any,
+                cursor: str, limit: int) -> Tuple[List[Any], Optional[str]]:
+    """
+    对查询应用 (created_at, id) 倒序的键集分页
+
+    参数：
+    - query: 已设置好过滤条件的查询
+    - created_col / id_col: 排序列（需有 (..., created_at, id) 复合索引）
+    - cursor: 上一页返回的游标，首页传空字符串
+    - limit: 每页条数
+
+    返回：(当前页结果, 下一页游标)，没有下一页时游标为 None
+    """
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        query = query.filter(tuple_(created_col, id_col) < tuple_(created_at, row_id))
+
+    # 多取一行用于判断是否还有下一页
+    rows = query.order_by(created_col.desc(), id_col.desc()).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, created_col.key), getattr(last, id_col.key))
@@ -0,0 +1,109 @@
+"""
+档案报告存储
+人生解读、职场大势报告正文按 (user_id, report_kind, version) 压缩保存在 profile_report 表，
+user_profile 只保留当前版本号和生成时间，花名册读取不再携带报告大字段，报告按需单独加载。
+"""
+import json
+import logging
+import os
+import zlib
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import delete, func
+
+from storage.cache.report_cache import LIFE_INTERPRETATION, CAREER_TREND
+from storage.database.shared.model import ProfileReport, UserProfile
+
+logger = logging.getLogger(__name__)
+
+ENCODING_ZLIB = "zlib"
+
+# 每个用户每类报告保留的历史版本数
+REPORT_KEEP_VERSIONS = int(os.getenv("REPORT_KEEP_VERSIONS", "3"))
+
+# 报告类型 -> user_profile 上的 (版本指针, 生成时间) 字段
+_PROFILE_POINTERS: Dict[str, Tuple[str, str]] = {
+    LIFE_INTERPRETATION: ("life_interpretation_version", "life_interpretation_generated_at"),
+    CAREER_TREND: ("career_trend_version", "career_trend_generated_at"),
+}
+
+
+def encode_payload(data: dict) -> Tuple[bytes, int]:
+    """报告字典 -> (压缩后的正文, 压缩前字节数)"""
+    raw = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return zlib.compress(raw, 6), len(raw)
+
+
+def decode_payload(encoding: str, payload: bytes) -> dict:
+    if encoding != ENCODING_ZLIB:
+        raise ValueError(f"不支持的报告编码: {encoding}")
+    return json.loads(zlib.decompress(payload).decode("utf-8"))
+
+
+class ProfileReportStore:
+    """版本化报告存储，读写都在调用方的 session 中进行，与档案指针更新同一事务提交"""
+
+    def save(self, session, profile: UserProfile, kind: str, data: dict) -> int:
+        """
+        保存新版本报告并把档案指针指向该版本（不提交，由调用方 commit）
+
+        返回：新版本号
+        """
+        version_attr, generated_attr = _PROFILE_POINTERS[kind]
+        # 先锁定档案行再取最大版本号：并发保存同一用户同类报告时串行分配版本，
+        # 否则两边拿到同一个版本号，后提交的一方违反唯一约束，刚生成的报告随之丢失
+        session.query(UserProfile.id).filter(UserProfile.id == profile.id).with_for_update().one()
+        latest = session.query(func.max(ProfileReport.version)).filter(
+            ProfileReport.user_id == profile.user_id,
+            ProfileReport.report_kind == kind
+        ).scalar()
+        version = (latest or 0) + 1
+
+        payload, raw_size = encode_payload(data)
+        now = datetime.utcnow()
+        session.add(ProfileReport(
+            user_id=profile.user_id,
+            report_kind=kind,
+            version=version,
+            encoding=ENCODING_ZLIB,
+            payload=payload,
+            raw_size=raw_size,
+            created_at=now,
+        ))
+        setattr(profile, version_attr, version)
+        setattr(profile, generated_attr, now)
+
+        # 清理过旧的历史版本
+        if REPORT_KEEP_VERSIONS > 0:
+            session.execute(delete(ProfileReport).where(
+                ProfileReport.user_id == profile.user_id,
+                ProfileReport.report_kind == kind,
+                ProfileReport.version <= version - REPORT_KEEP_VERSIONS
+            ))
+
+        logger.info(f"报告已保存 | user_id: {profile.user_id} | 类型: {kind} | 版本: {version} | "
+                    f"大小: {raw_size} -> {len(payload)} 字节")
+        return version
+
+    def load(self, session, user_id: str, kind: str, version: Optional[int]) -> Optional[dict]:
+        """读取指定版本的报告正文，版本为空或不存在时返回 None"""
+        if not version:
+            return None
+        row = session.query(ProfileReport.encoding, ProfileReport.payload).filter(
+            ProfileReport.user_id == user_id,
+            ProfileReport.report_kind == kind,
+            ProfileReport.version == version
+        ).first()
+        if row is None:
+            logger.warning(f"报告版本不存在 | user_id: {user_id} | 类型: {kind} | 版本: {version}")
+            return None
+        return decode_payload(row.encoding, row.payload)
+
+    def load_current(self, session, profile: UserProfile, kind: str) -> Optional[dict]:
+        """读取档案指针指向的当前版本"""
+        version_attr, _ = _PROFILE_POINTERS[kind]
+        return self.load(session, profile.user_id, kind, getattr(profile, version_attr))
+
+
+profile_report_store = ProfileReportStore()
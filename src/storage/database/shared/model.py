@@ -1,4 +1,4 @@
-from sqlalchemy import BigInteger, DateTime, Identity, Index, Integer, JSON, Text, String, Enum as SQLEnum
+from sqlalchemy import BigInteger, DateTime, Identity, Index, Integer, JSON, LargeBinary, Text, String, UniqueConstraint, Enum as SQLEnum
 from typing import Optional
 import datetime
 from enum import Enum
@@ -36,6 +36,10 @@ class ConversationType(str, Enum):
     OTHER = "other"  # 其他
 
 
+# 花名册搜索文档表达式：与 init_db 中的 pg_trgm GIN 表达式索引保持完全一致，查询才能命中索引
+ROSTER_SEARCH_DOCUMENT = "(coalesce(name, '') || ' ' || coalesce(mbti, '') || ' ' || coalesce(notes, ''))"
+
+
 # 用户信息表（花名册）
 class UserProfile(Base):
     """用户个人信息表，存储用户及其社交关系的信息"""
@@ -67,12 +71,12 @@ class UserProfile(Base):
     job_title: Mapped[Optional[str]] = mapped_column(String(100), nullable=True, comment="职位类型（如：产品经理、工程师、运营等）")
     job_level: Mapped[Optional[str]] = mapped_column(String(50), nullable=True, comment="职级（如：P6、P7、高级、经理等）")
 
-    # 人生解读报告（生成后保存，后续直接读取）
-    life_interpretation: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True, comment="人生解读报告（JSON格式，包含八字排盘、五行分析、性格特点、命盘特点等）")
+    # 人生解读报告（正文按版本压缩存放在 profile_report 表，此处只保留当前版本号）
+    life_interpretation_version: Mapped[Optional[int]] = mapped_column(Integer, nullable=True, comment="人生解读报告当前版本（指向 profile_report.version）")
     life_interpretation_generated_at: Mapped[Optional[datetime.datetime]] = mapped_column(DateTime, nullable=True, comment="人生解读报告生成时间")
 
-    # 职场大势报告（生成后保存，后续直接读取）
-    career_trend: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True, comment="职场大势报告（JSON格式，包含事业方向、财富上限、关键转折点、下一个转运点、职场运势走势图等）")
+    # 职场大势报告（正文按版本压缩存放在 profile_report 表，此处只保留当前版本号）
+    career_trend_version: Mapped[Optional[int]] = mapped_column(Integer, nullable=True, comment="职场大势报告当前版本（指向 profile_report.version）")
     career_trend_generated_at: Mapped[Optional[datetime.datetime]] = mapped_column(DateTime, nullable=True, comment="职场大势报告生成时间")
 
     # 用户照片（用于穿搭建议）
@@ -96,9 +100,33 @@ class UserProfile(Base):
     __table_args__ = (
         Index("idx_user_id_name", "user_id", "name"),
         Index("idx_user_id_relationship", "user_id", "relationship_type"),
+        Index("idx_user_profile_user_created", "user_id", "created_at", "id"),
     )
 
 
+# 列表查询的列投影：排除人生解读/职场大势等大字段 JSON，配合 load_only 使用
+USER_PROFILE_LIST_COLUMNS = (
+    UserProfile.id,
+    UserProfile.user_id,
+    UserProfile.name,
+    UserProfile.gender,
+    UserProfile.relationship_type,
+    UserProfile.relationship_level,
+    UserProfile.birth_date,
+    UserProfile.bazi,
+    UserProfile.mbti,
+    UserProfile.birth_place,
+    UserProfile.current_location,
+    UserProfile.company_name,
+    UserProfile.company_type,
+    UserProfile.job_title,
+    UserProfile.job_level,
+    UserProfile.notes,
+    UserProfile.created_at,
+    UserProfile.updated_at,
+)
+
+
 # 用户沟通记忆表
 class UserConversationMemory(Base):
     """用户与Agent沟通记忆表，存储重要对话信息"""
@@ -141,6 +169,30 @@ class UserConversationMemory(Base):
     )
 
 
+# 档案报告表（人生解读、职场大势的版本化存储）
+class ProfileReport(Base):
+    """档案报告表，按 (user_id, report_kind, version) 保存压缩后的报告正文，user_profile 只保留版本指针"""
+    __tablename__ = "profile_report"
+
+    id: Mapped[int] = mapped_column(BigInteger, Identity(always=True), primary_key=True)
+    user_id: Mapped[str] = mapped_column(String(255), nullable=False, comment="用户ID")
+    report_kind: Mapped[str] = mapped_column(String(32), nullable=False, comment="报告类型：life_interpretation/career_trend")
+    version: Mapped[int] = mapped_column(Integer, nullable=False, comment="报告版本号（同一用户同一类型递增）")
+    encoding: Mapped[str] = mapped_column(String(16), nullable=False, comment="正文编码：zlib（压缩后的UTF-8 JSON）")
+    payload: Mapped[bytes] = mapped_column(LargeBinary, nullable=False, comment="压缩后的报告正文")
+    raw_size: Mapped[int] = mapped_column(Integer, nullable=False, comment="压缩前字节数")
+    created_at: Mapped[datetime.datetime] = mapped_column(
+        DateTime,
+        default=datetime.datetime.utcnow,
+        nullable=False,
+        comment="生成时间"
+    )
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "report_kind", "version", name="uq_profile_report_user_kind_version"),
+    )
+
+
 # 每日报告表（每日运势和穿搭建议）
 class DailyReport(Base):
     """用户每日报告表，存储每日运势和穿搭建议"""
@@ -180,6 +232,8 @@ class DailyReport(Base):
 
     __table_args__ = (
         Index("idx_daily_report_user_id_date", "user_id", "report_date"),
+        # 每日报告按 (user_id, report_date) upsert，依赖该唯一约束
+        UniqueConstraint("user_id", "report_date", name="uq_daily_report_user_date"),
     )
 
 
@@ -225,6 +279,8 @@ class UserDailyUsage(Base):
 
     __table_args__ = (
         Index("idx_user_id_date", "user_id", "date"),
+        # 计数通过 INSERT ... ON CONFLICT (user_id, date) 原子累加，依赖该唯一约束
+        UniqueConstraint("user_id", "date", name="uq_user_daily_usage_user_date"),
     )
 
 
@@ -246,4 +302,48 @@ class GlobalDailyUsage(Base):
 
     __table_args__ = (
         Index("idx_date", "date"),
-    )
\ No newline at end of file
+    )
+
+# 联网搜索结果缓存表
+class SearchResultCache(Base):
+    """联网搜索结果缓存表，相同（归一化后）查询在有效期内直接复用搜索结果"""
+    __tablename__ = "search_result_cache"
+
+    cache_key: Mapped[str] = mapped_column(String(64), primary_key=True, comment="归一化查询参数的SHA256")
+    query: Mapped[str] = mapped_column(Text, nullable=False, comment="归一化后的查询语句")
+    search_type: Mapped[str] = mapped_column(String(50), nullable=False, comment="搜索类型")
+    payload: Mapped[dict] = mapped_column(JSON, nullable=False, comment="搜索结果（web_items/content/result）")
+    expires_at: Mapped[datetime.datetime] = mapped_column(DateTime, nullable=False, comment="过期时间")
+    created_at: Mapped[datetime.datetime] = mapped_column(
+        DateTime,
+        default=datetime.datetime.utcnow,
+        nullable=False,
+        comment="创建时间"
+    )
+
+    __table_args__ = (
+        Index("idx_search_result_cache_expires_at", "expires_at"),
+    )
+
+
+# 命理分析结果表
+class FortuneResult(Base):
+    """八字/紫微分析结果表，结果只取决于出生信息和查询日期，计算一次后直接复用"""
+    __tablename__ = "fortune_result"
+
+    cache_key: Mapped[str] = mapped_column(String(64), primary_key=True, comment="归一化输入参数的SHA256")
+    kind: Mapped[str] = mapped_column(String(20), nullable=False, comment="分析类型：bazi/ziwei")
+    birth_info: Mapped[str] = mapped_column(String(100), nullable=False, comment="归一化出生信息（年-月-日-时-性别）")
+    query_date: Mapped[str] = mapped_column(String(20), nullable=False, comment="查询日期（格式：YYYY-MM-DD）")
+    result: Mapped[str] = mapped_column(Text, nullable=False, comment="分析结果文本")
+    source: Mapped[str] = mapped_column(String(20), nullable=False, comment="结果来源：api/search/precompute")
+    created_at: Mapped[datetime.datetime] = mapped_column(
+        DateTime,
+        default=datetime.datetime.utcnow,
+        nullable=False,
+        comment="创建时间"
+    )
+
+    __table_args__ = (
+        Index("idx_fortune_result_query_date", "query_date"),
+    )
@@ -4,10 +4,15 @@ from langgraph.checkpoint.postgres import PostgresSaver
 from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
 from langgraph.checkpoint.memory import MemorySaver
 from langgraph.checkpoint.base import BaseCheckpointSaver
-from typing import Optional, Union
+from contextvars import ContextVar
+from typing import Dict, Optional, Union
+import functools
+import inspect
 import logging
 import time
 
+from utils.log.metrics import CHECKPOINT_DURATION
+
 logger = logging.getLogger(__name__)
 
 # 数据库连接超时时间（秒），每次尝试 15 秒，共尝试 2 次
@@ -83,7 +88,7 @@ class MemoryManager:
 
     def _create_fallback_checkpointer(self) -> MemorySaver:
         """创建内存兜底 checkpointer"""
-        self._checkpointer = MemorySaver()
+        self._checkpointer = _instrument_checkpointer(MemorySaver())
         logger.warning("Using MemorySaver as fallback checkpointer (data will not persist across restarts)")
         return self._checkpointer
 
@@ -110,7 +115,9 @@ class MemoryManager:
         # 4. 尝试创建连接池和 checkpointer
         try:
             self._pool = AsyncConnectionPool(conninfo=db_url, timeout=DB_CONNECTION_TIMEOUT)
-            self._checkpointer = AsyncPostgresSaver(self._pool)
+            self._checkpointer = _instrument_checkpointer(
+                AsyncPostgresSaver(self._pool), _ASYNC_CHECKPOINT_OPERATIONS
+            )
             logger.info("AsyncPostgresSaver initialized successfully")
         except Exception as e:
             logger.warning(f"Failed to create AsyncPostgresSaver: {e}, will fallback to MemorySaver")
@@ -118,6 +125,88 @@ class MemoryManager:
 
         return self._checkpointer
 
+# checkpoint 读写方法 -> 指标中的 operation 标签
+_CHECKPOINT_OPERATIONS = {
+    "get_tuple": "read", "aget_tuple": "read",
+    "list": "list", "alist": "list",
+    "put": "write", "aput": "write",
+    "put_writes": "write_pending", "aput_writes": "write_pending",
+}
+# AsyncPostgresSaver 的同步方法在调用线程中通过事件循环执行异步方法，上下文变量跨不过去，只包装异步方法
+_ASYNC_CHECKPOINT_OPERATIONS = {name: op for name, op in _CHECKPOINT_OPERATIONS.items() if name.startswith("a")}
+
+# 是否已处于计时中的 checkpoint 调用内：MemorySaver 的异步方法内部调用同步方法，嵌套调用不重复计数
+_in_checkpoint_call: ContextVar[bool] = ContextVar("in_checkpoint_call", default=False)
+
+
+def _instrument_checkpointer(checkpointer: BaseCheckpointSaver,
+                             operations: Dict[str, str] = _CHECKPOINT_OPERATIONS) -> BaseCheckpointSaver:
+    """在实例上包装 checkpoint 读写方法，记录耗时到 agent_checkpoint_duration_seconds（嵌套调用只计最外层）"""
+    for method_name, operation in operations.items():
+        method = getattr(checkpointer, method_name, None)
+        if method is None:
+            continue
+        if inspect.isasyncgenfunction(method):
+            # alist 是异步生成器，按完整遍历耗时计；只在推进内部迭代器时标记，不影响调用方处理每一项
+            def wrapper(*args, _method=method, _operation=operation, **kwargs):
+                if _in_checkpoint_call.get():
+                    return _method(*args, **kwargs)
+
+                async def _iterate():
+                    with CHECKPOINT_DURATION.time(operation=_operation):
+                        iterator = _method(*args, **kwargs).__aiter__()
+                        while True:
+                            token = _in_checkpoint_call.set(True)
+                            try:
+                                item = await iterator.__anext__()
+                            except StopAsyncIteration:
+                                return
+                            finally:
+                                _in_checkpoint_call.reset(token)
+                            yield item
+                return _iterate()
+        elif inspect.iscoroutinefunction(method):
+            async def wrapper(*args, _method=method, _operation=operation, **kwargs):
+                if _in_checkpoint_call.get():
+                    return await _method(*args, **kwargs)
+                token = _in_checkpoint_call.set(True)
+                try:
+                    with CHECKPOINT_DURATION.time(operation=_operation):
+                        return await _method(*args, **kwargs)
+                finally:
+                    _in_checkpoint_call.reset(token)
+        elif method_name == "list":
+            def wrapper(*args, _method=method, _operation=operation, **kwargs):
+                if _in_checkpoint_call.get():
+                    return _method(*args, **kwargs)
+
+                def _iterate():
+                    with CHECKPOINT_DURATION.time(operation=_operation):
+                        iterator = iter(_method(*args, **kwargs))
+                        while True:
+                            token = _in_checkpoint_call.set(True)
+                            try:
+                                item = next(iterator)
+                            except StopIteration:
+                                return
+                            finally:
+                                _in_checkpoint_call.reset(token)
+                            yield item
+                return _iterate()
+        else:
+            def wrapper(*args, _method=method, _operation=operation, **kwargs):
+                if _in_checkpoint_call.get():
+                    return _method(*args, **kwargs)
+                token = _in_checkpoint_call.set(True)
+                try:
+                    with CHECKPOINT_DURATION.time(operation=_operation):
+                        return _method(*args, **kwargs)
+                finally:
+                    _in_checkpoint_call.reset(token)
+        setattr(checkpointer, method_name, functools.wraps(method)(wrapper))
+    return checkpointer
+
+
 _memory_manager: Optional[MemoryManager] = None
 
 
@@ -0,0 +1,41 @@
+"""
+数据库工具异步化辅助
+为基于 get_session() 的同步工具挂载 coroutine，使 ainvoke / graph.astream 走异步数据库驱动
+"""
+import asyncio
+import functools
+from typing import Any
+
+from langchain_core.tools import BaseTool
+
+from storage.database.db import run_in_async_session
+
+
+def async_db_tool(t: BaseTool = None, *, blocking_io: bool = False):
+    """
+    为 @tool 生成的工具挂载异步实现（StructuredTool.coroutine）。
+
+    - 默认：工具函数在 AsyncEngine 上执行（run_in_async_session），
+      其中的 `with get_session()` 使用异步驱动，等待数据库时不阻塞事件循环。
+    - blocking_io=True：工具内部还包含网络请求等阻塞调用，改为在线程池中执行同步实现。
+
+    用法：
+
+        @async_db_tool
+        @tool
+        def login(...): ...
+    """
+    if t is None:
+        return functools.partial(async_db_tool, blocking_io=blocking_io)
+
+    func = t.func
+
+    if blocking_io:
+        async def _acall(*args: Any, **kwargs: Any) -> Any:
+            return await asyncio.to_thread(func, *args, **kwargs)
+    else:
+        async def _acall(*args: Any, **kwargs: Any) -> Any:
+            return await run_in_async_session(func, *args, **kwargs)
+
+    t.coroutine = _acall
+    return t
@@ -9,6 +9,7 @@ from datetime import datetime
 from langchain.tools import tool
 
 from storage.database.db import get_session
+from tools.async_db_tool import async_db_tool
 from storage.database.shared.model import UserAccount
 
 logger = logging.getLogger(__name__)
@@ -19,6 +20,7 @@ def _hash_password(password: str) -> str:
     return hashlib.sha256(password.encode()).hexdigest()
 
 
+@async_db_tool
 @tool
 def login(
     username: str,
@@ -92,6 +94,7 @@ def login(
 """
 
 
+@async_db_tool
 @tool
 def register(
     user_id: str,
@@ -178,6 +181,7 @@ def register(
 """
 
 
+@async_db_tool
 @tool
 def check_admin(
     user_id: str
@@ -228,6 +232,7 @@ def check_admin(
 """
 
 
+@async_db_tool
 @tool
 def get_user_info(
     user_id: str
@@ -267,6 +272,7 @@ def get_user_info(
 """
 
 
+@async_db_tool
 @tool
 def reset_password(
     username: str,
@@ -1,45 +1,6 @@
-import os
-import requests
 from langchain.tools import tool
 from typing import Any, Optional, List
-from cozeloop.decorator import observe
-from coze_coding_utils.runtime_ctx.context import Context
-
-
-@observe
-def web_search(
-    ctx: Context,
-    query: str,
-    search_type: str = "web",
-    count: int = 10,
-    need_summary: bool = True,
-):
-    """联网搜索辅助函数"""
-    from coze_coding_utils.runtime_ctx.context import default_headers
-
-    api_key = os.getenv("COZE_WORKLOAD_IDENTITY_API_KEY")
-    base_url = os.getenv("COZE_INTEGRATION_BASE_URL")
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {api_key}",
-    }
-    headers.update(default_headers(ctx))
-    request = {
-        "Query": query,
-        "SearchType": search_type,
-        "Count": count,
-        "NeedSummary": need_summary,
-    }
-    response = requests.post(f'{base_url}/api/search_api/web_search', json=request, headers=headers)
-    response.raise_for_status()
-    data = response.json()
-    
-    result = data.get("Result", {})
-    content = None
-    if result.get("Choices"):
-        content = result.get("Choices", [{}])[0].get("Message", {}).get("Content", "")
-    
-    return content
+from tools.search_client import web_search_summary
 
 
 # 行业转型数据库（示例）
@@ -138,7 +99,7 @@ def career_transition_advice(current_industry: str, target_industry: str,
     # 联网搜索获取转型建议
     search_query = f"{current_industry}转{target_industry} 职业发展 技能要求 转型建议"
     try:
-        online_content = web_search(ctx, search_query, search_type="web_summary", count=5, need_summary=True)
+        online_content = web_search_summary(ctx, search_query, search_type="web_summary", count=5, need_summary=True)
         
         if online_content and online_content.strip():
             advice_lines.append("\n【行业分析】")
@@ -245,7 +206,7 @@ def skill_gap_analysis(current_industry: str, target_industry: str,
     search_query = f"{target_industry}行业 核心技能 职位要求 能力模型"
     
     try:
-        online_content = web_search(ctx, search_query, search_type="web_summary", count=5, need_summary=True)
+        online_content = web_search_summary(ctx, search_query, search_type="web_summary", count=5, need_summary=True)
         
         analysis_lines = [f"📊 技能差距分析：{current_industry} → {target_industry}"]
         
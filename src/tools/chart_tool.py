@@ -1,6 +1,72 @@
 import json
+import logging
 from langchain.tools import tool
-from typing import Any, List
+from typing import Any, List, Sequence
+
+import numpy as np
+
+from storage.database.db import get_session
+from storage.database.shared.model import UserProfile
+from tools.async_db_tool import async_db_tool
+from tools.external_api_tool import parse_birth_date
+from tools.roster_tool import _parse_relationship_type
+
+logger = logging.getLogger(__name__)
+
+MONTH_LABELS = ["1月", "2月", "3月", "4月", "5月", "6月",
+                "7月", "8月", "9月", "10月", "11月", "12月"]
+
+# 团队运势图最多绘制的成员曲线数（超过时只画团队平均线）
+TEAM_CHART_MAX_SERIES = 8
+
+
+def _build_luck_table() -> np.ndarray:
+    """
+    预计算 出生月 × 月份 的运势分数表（12×12）。
+    月度运势只与出生月和月份有关，批量打分时按出生月取行即可，无需逐月循环。
+    """
+    birth_months = np.arange(1, 13)[:, None]
+    months = np.arange(1, 13)[None, :]
+
+    # 1. 基础分
+    scores = np.full((12, 12), 70, dtype=np.int16)
+
+    # 2. 基于出生月的影响：出生月加分，对冲月减分
+    scores += np.where(months == birth_months, 10, 0).astype(np.int16)
+    scores -= np.where(np.abs(months - birth_months) == 6, 5, 0).astype(np.int16)
+
+    # 3. 基于奇偶月的影响（简化）
+    scores += np.where(months % 2 == 0, 3, -2).astype(np.int16)
+
+    # 4. 基于季节的影响（简化）：冬 -2 / 春 +2 / 夏 -1 / 秋 +3
+    season = np.array([-2, -2, 2, 2, 2, -1, -1, -1, 3, 3, 3, -2], dtype=np.int16)
+    scores += season[None, :]
+
+    # 5. 确保分数在合理范围内
+    return np.clip(scores, 40, 100)
+
+
+LUCK_TABLE = _build_luck_table()
+
+
+def score_monthly_luck_batch(birth_months: Sequence[Any], years: Sequence[Any]) -> np.ndarray:
+    """
+    批量计算月度运势分数：N 人 × M 年 × 12 个月，一次向量化完成。
+
+    Args:
+        birth_months: N 个出生月份（1-12，可为字符串）
+        years: M 个预测年份
+
+    Returns:
+        形状为 (N, M, 12) 的整数数组，scores[i, j, k] 为第 i 人第 j 年 (k+1) 月的分数
+    """
+    months = np.asarray([int(m) for m in birth_months], dtype=np.int64)
+    if months.size and ((months < 1) | (months > 12)).any():
+        raise ValueError("出生月份必须在1-12之间")
+
+    # 当前算法与年份无关：按出生月取行后沿年份维度广播
+    rows = LUCK_TABLE[months - 1]
+    return np.broadcast_to(rows[:, None, :], (len(months), len(years), 12))
 
 
 @tool
@@ -27,8 +93,7 @@ def generate_luck_chart(monthly_scores: List[int], year: str, name: str, runtime
     chart_config = {
         "type": "line",
         "data": {
-            "labels": ["1月", "2月", "3月", "4月", "5月", "6月", 
-                      "7月", "8月", "9月", "10月", "11月", "12月"],
+            "labels": MONTH_LABELS,
             "datasets": [{
                 "label": f"{year}年运势走势",
                 "data": monthly_scores,
@@ -134,47 +199,10 @@ def predict_monthly_luck(birth_year: str, birth_month: str, birth_day: str,
     Returns:
         月度运势分数JSON字符串
     """
-    # 这里使用简化的算法计算月度运势
+    # 这里使用简化的算法计算月度运势（与批量接口共用同一张分数表）
     # 实际应用中应该调用专业命理API或使用更复杂的算法
-    
-    base_score = 70  # 基础分数
-    
-    monthly_scores = []
-    for month in range(1, 13):
-        # 基于出生信息、月份、性别等因素的简化计算
-        # 这是一个示例算法，实际应该使用专业命理方法
-        
-        # 1. 基础分
-        score = base_score
-        
-        # 2. 基于出生月的影响
-        birth_month_int = int(birth_month)
-        if month == birth_month_int:
-            score += 10  # 出生月加分
-        elif abs(month - birth_month_int) == 6:
-            score -= 5  # 对冲月减分
-        
-        # 3. 基于奇偶月的影响（简化）
-        if month % 2 == 0:
-            score += 3
-        else:
-            score -= 2
-        
-        # 4. 基于季节的影响（简化）
-        if 3 <= month <= 5:  # 春季
-            score += 2
-        elif 6 <= month <= 8:  # 夏季
-            score -= 1
-        elif 9 <= month <= 11:  # 秋季
-            score += 3
-        else:  # 冬季
-            score -= 2
-        
-        # 5. 确保分数在1-100之间
-        score = max(40, min(100, score))
-        
-        monthly_scores.append(int(score))
-    
+    monthly_scores = score_monthly_luck_batch([birth_month], [year])[0, 0].tolist()
+
     return json.dumps({
         "year": year,
         "monthly_scores": monthly_scores,
@@ -204,8 +232,7 @@ def generate_combined_chart(bazi_scores: List[int], career_scores: List[int],
     chart_config = {
         "type": "line",
         "data": {
-            "labels": ["1月", "2月", "3月", "4月", "5月", "6月", 
-                      "7月", "8月", "9月", "10月", "11月", "12月"],
+            "labels": MONTH_LABELS,
             "datasets": [
                 {
                     "label": "命理运势",
@@ -259,3 +286,102 @@ def generate_combined_chart(bazi_scores: List[int], career_scores: List[int],
 
 ⚠️ 提醒：以上分析仅供参考。
 """
+
+
+@async_db_tool
+@tool
+def predict_team_monthly_luck(user_id: str, years: List[str], relationship_type: str = "同事",
+                              runtime: Any = None) -> str:
+    """
+    批量预测花名册成员的月度运势（如"团队今年运势"），一次调用完成，无需逐人调用 predict_monthly_luck。
+
+    Args:
+        user_id: 用户ID
+        years: 预测年份列表（如：["2025", "2026"]）
+        relationship_type: 按关系类型筛选（默认同事；传空字符串表示全部成员）
+        runtime: 工具运行时对象
+
+    Returns:
+        团队月度运势（成员分数、团队平均走势及趋势图）
+    """
+    if not years:
+        return "❌ 错误：必须提供至少一个预测年份"
+
+    try:
+        with get_session() as session:
+            query = session.query(UserProfile.name, UserProfile.birth_date).filter(
+                UserProfile.user_id == user_id
+            )
+            if relationship_type:
+                query = query.filter(UserProfile.relationship_type == _parse_relationship_type(relationship_type))
+            rows = query.order_by(UserProfile.created_at.desc()).all()
+
+        names, birth_months, skipped = [], [], []
+        for name, birth_date in rows:
+            parsed = parse_birth_date(birth_date)
+            if parsed is None or not 1 <= int(parsed[1]) <= 12:
+                skipped.append(name)
+                continue
+            names.append(name)
+            birth_months.append(parsed[1])
+
+        if not names:
+            return "📋 花名册中没有可预测的成员（需要填写出生日期）"
+
+        scores = score_monthly_luck_batch(birth_months, years)  # (N, M, 12)
+        team_avg = scores.mean(axis=0)                           # (M, 12)
+        member_avg = scores.mean(axis=2)                         # (N, M)
+        member_best = scores.argmax(axis=2) + 1                  # (N, M)
+
+        result = f"📈 **团队月度运势**（共 {len(names)} 人）\n\n"
+        for j, year in enumerate(years):
+            best_month = int(team_avg[j].argmax()) + 1
+            worst_month = int(team_avg[j].argmin()) + 1
+            result += f"**{year}年**\n"
+            result += f"• 团队平均运势指数：{team_avg[j].mean():.1f}\n"
+            result += f"• 团队最佳月份：{best_month}月（{team_avg[j, best_month - 1]:.1f}分）\n"
+            result += f"• 团队低谷月份：{worst_month}月（{team_avg[j, worst_month - 1]:.1f}分）\n"
+            for i, name in enumerate(names):
+                result += f"  {name}：平均 {member_avg[i, j]:.1f} 分，最佳 {member_best[i, j]}月 | "
+                result += " ".join(str(v) for v in scores[i, j].tolist()) + "\n"
+            result += "\n"
+
+        # 趋势图：第一个年份的团队平均线 + 成员曲线
+        datasets = [{
+            "label": "团队平均",
+            "data": [round(v, 1) for v in team_avg[0].tolist()],
+            "borderColor": "rgb(99, 102, 241)",
+            "borderWidth": 3,
+            "fill": False,
+            "tension": 0.4
+        }]
+        if len(names) <= TEAM_CHART_MAX_SERIES:
+            for i, name in enumerate(names):
+                datasets.append({
+                    "label": name,
+                    "data": scores[i, 0].tolist(),
+                    "fill": False,
+                    "tension": 0.4,
+                    "borderDash": [4, 4]
+                })
+        chart_config = {
+            "type": "line",
+            "data": {"labels": MONTH_LABELS, "datasets": datasets},
+            "options": {
+                "plugins": {
+                    "title": {"display": True, "text": f"{years[0]}年团队运势趋势图"}
+                },
+                "scales": {"y": {"min": 0, "max": 100}}
+            }
+        }
+        chart_url = f"https://quickchart.io/chart?c={json.dumps(chart_config, ensure_ascii=False)}"
+        result += f"![团队运势]({chart_url})\n\n💡 查看【高清原图】：{chart_url}\n"
+
+        if skipped:
+            result += f"\n⚠️ 以下成员缺少有效出生日期，未参与预测：{'、'.join(skipped)}\n"
+        result += "\n⚠️ 提醒：以上运势趋势仅供娱乐参考，实际决策请结合现实情况。"
+        return result
+
+    except Exception as e:
+        logger.error(f"❌ 团队运势预测失败: {e}")
+        return f"❌ 预测失败：{str(e)}"
@@ -0,0 +1,388 @@
+"""
+花名册配合度工具 - 基于八字五行、MBTI、关系级别计算成员两两之间的配合度矩阵
+
+矩阵按用户缓存在进程内：
+- 首次查询时对全部花名册条目一次性向量化计算 N×N 矩阵
+- update_roster_entry / add_user_bazi 修改单个条目时只重算该条目所在的行和列
+- 读取时用 (条目数, 最大更新时间, 更新时间毫秒数之和) 指纹校验，其他进程改动花名册后自动重建；
+  本地增量更新按各条目的更新时间精确重算指纹，不会把其他进程的改动一并"确认"掉
+"""
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain.tools import tool
+from sqlalchemy import Numeric, cast, func
+from sqlalchemy.orm import load_only
+
+from storage.database.db import get_session
+from storage.database.shared.model import (
+    UserProfile,
+    RelationshipType,
+    RelationshipLevel,
+    USER_PROFILE_LIST_COLUMNS
+)
+from tools.async_db_tool import async_db_tool
+from tools.external_api_tool import parse_birth_date, local_four_pillars
+from tools.roster_tool import _parse_relationship_type
+from utils.calendar.four_pillars import (
+    HEAVENLY_STEMS,
+    EARTHLY_BRANCHES,
+    STEM_ELEMENTS,
+    BRANCH_ELEMENTS,
+    FIVE_ELEMENTS,
+)
+
+logger = logging.getLogger(__name__)
+
+# 进程内最多缓存的用户矩阵数
+COMPATIBILITY_CACHE_SIZE = int(os.getenv("COMPATIBILITY_CACHE_SIZE", "256"))
+
+_PILLAR_RE = re.compile(f"[{HEAVENLY_STEMS}][{EARTHLY_BRANCHES}]")
+
+# 五行生克（下标顺序同 FIVE_ELEMENTS：金木水火土）
+_GENERATES = {"木": "火", "火": "土", "土": "金", "金": "水", "水": "木"}
+_CONTROLS = {"木": "土", "土": "水", "水": "火", "火": "金", "金": "木"}
+
+
+def _build_element_relation() -> np.ndarray:
+    """日主五行关系分：同类 +4，相生 +8，相克 -6（对称）"""
+    relation = np.zeros((5, 5), dtype=np.float32)
+    for a, ea in enumerate(FIVE_ELEMENTS):
+        for b, eb in enumerate(FIVE_ELEMENTS):
+            if a == b:
+                relation[a, b] = 4
+            elif _GENERATES[ea] == eb or _GENERATES[eb] == ea:
+                relation[a, b] = 8
+            elif _CONTROLS[ea] == eb or _CONTROLS[eb] == ea:
+                relation[a, b] = -6
+    return relation
+
+
+ELEMENT_RELATION = _build_element_relation()
+
+# MBTI 四个维度（E/I、S/N、T/F、J/P）的权重：
+# 相同取 +1、不同取 -1 后加权，S/N、J/P 一致更利于协作，E/I、T/F 互补更利于协作
+MBTI_WEIGHTS = np.array([-2, 3, -2, 3], dtype=np.float32)
+_MBTI_POSITIVE = "ESTJ"
+
+_LEVEL_VALUES = {
+    RelationshipLevel.LEVEL_2_SUPERIOR: 2,
+    RelationshipLevel.LEVEL_1_SUPERIOR: 1,
+    RelationshipLevel.SAME_LEVEL: 0,
+    RelationshipLevel.LEVEL_1_SUBORDINATE: -1,
+    RelationshipLevel.LEVEL_2_SUBORDINATE: -2,
+}
+
+BASE_SCORE = 60
+
+
+@dataclass
+class _RosterMatrix:
+    """单个用户的花名册特征与配合度矩阵"""
+    ids: List[int]
+    names: List[str]
+    rel_types: List[Any]
+    elements: np.ndarray      # (N, 5) 五行计数
+    day_element: np.ndarray   # (N,) 日主五行下标，未知为 -1
+    mbti: np.ndarray          # (N, 4) 各维度 +1/-1，未知为 0
+    levels: np.ndarray        # (N,) 关系级别，未知为 NaN
+    scores: np.ndarray        # (N, N) 配合度，对角线为 NaN
+    updated_ats: List[Optional[datetime]]  # 各条目的更新时间（用于精确维护指纹）
+    fingerprint: "RosterFingerprint"
+
+
+# 花名册指纹：(条目数, 最大更新时间, 更新时间毫秒数之和)
+RosterFingerprint = Tuple[int, Optional[datetime], int]
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _epoch_ms(updated_at: Optional[datetime]) -> int:
+    """更新时间转为毫秒数（四舍五入，与数据库端 round(extract(epoch)::numeric * 1000) 一致）"""
+    if updated_at is None:
+        return 0
+    return ((updated_at - _EPOCH) // timedelta(microseconds=1) + 500) // 1000
+
+
+def _roster_fingerprint(updated_ats: List[Optional[datetime]]) -> RosterFingerprint:
+    """按各条目更新时间计算指纹，与 CompatibilityCache._fingerprint 的查询结果一一对应"""
+    return (
+        len(updated_ats),
+        max((t for t in updated_ats if t is not None), default=None),
+        sum(_epoch_ms(t) for t in updated_ats),
+    )
+
+
+def _bazi_elements(entry: UserProfile) -> Tuple[Optional[np.ndarray], int]:
+    """从已存八字（或出生日期本地排盘）得到五行计数与日主五行"""
+    pillars = _PILLAR_RE.findall(entry.bazi or "")
+    if len(pillars) < 3:
+        birth = parse_birth_date(entry.birth_date)
+        four_pillars = local_four_pillars(*birth) if birth else None
+        if not four_pillars:
+            return None, -1
+        pillars = list(four_pillars.pillars)
+
+    counts = np.zeros(5, dtype=np.float32)
+    for pillar in pillars[:4]:
+        counts[FIVE_ELEMENTS.index(STEM_ELEMENTS[HEAVENLY_STEMS.index(pillar[0])])] += 1
+        counts[FIVE_ELEMENTS.index(BRANCH_ELEMENTS[EARTHLY_BRANCHES.index(pillar[1])])] += 1
+    day_element = FIVE_ELEMENTS.index(STEM_ELEMENTS[HEAVENLY_STEMS.index(pillars[2][0])])
+    return counts, day_element
+
+
+def _mbti_vector(mbti: Optional[str]) -> np.ndarray:
+    mbti = (mbti or "").strip().upper()
+    if not re.fullmatch(r"[EI][SN][TF][JP]", mbti):
+        return np.zeros(4, dtype=np.float32)
+    return np.array([1 if c in _MBTI_POSITIVE else -1 for c in mbti], dtype=np.float32)
+
+
+def _entry_features(entry: UserProfile) -> Tuple[np.ndarray, int, np.ndarray, float]:
+    elements, day_element = _bazi_elements(entry)
+    if elements is None:
+        elements = np.zeros(5, dtype=np.float32)
+    level = _LEVEL_VALUES.get(entry.relationship_level, np.nan)
+    return elements, day_element, _mbti_vector(entry.mbti), level
+
+
+def _score_block(m: _RosterMatrix, rows: np.ndarray) -> np.ndarray:
+    """计算 rows 指定的成员与全部成员之间的配合度（|rows|×N），全量与增量计算共用"""
+    # 1. 日主五行生克
+    de_a = m.day_element[rows][:, None]
+    de_b = m.day_element[None, :]
+    known = (de_a >= 0) & (de_b >= 0)
+    element_score = np.where(known, ELEMENT_RELATION[np.maximum(de_a, 0), np.maximum(de_b, 0)], 0)
+
+    # 2. 五行互补：对方补足自己所缺的五行（双向计数）
+    has_bazi = m.elements.sum(axis=1) > 0
+    present = (m.elements > 0).astype(np.float32)
+    missing = np.where(has_bazi[:, None], 1 - present, 0)
+    complement = missing[rows] @ present.T + present[rows] @ missing.T
+
+    # 3. MBTI 维度加权
+    mbti_score = (m.mbti[rows] * MBTI_WEIGHTS) @ m.mbti.T
+
+    # 4. 职级距离：平级 +3，相邻 +5（带教关系），相差两级及以上 -2
+    distance = np.abs(m.levels[rows][:, None] - m.levels[None, :])
+    level_score = np.select([distance == 0, distance == 1, distance >= 2], [3, 5, -2], default=0)
+
+    scores = BASE_SCORE + element_score + 2 * complement + mbti_score + level_score
+    scores = np.clip(scores, 0, 100).astype(np.float32)
+    scores[np.arange(len(rows)), rows] = np.nan
+    return scores
+
+
+def _pair_reasons(m: _RosterMatrix, i: int, j: int) -> List[str]:
+    """单对成员的配合要点（只在输出 Top 结果时计算）"""
+    reasons = []
+    if m.day_element[i] >= 0 and m.day_element[j] >= 0:
+        relation = ELEMENT_RELATION[m.day_element[i], m.day_element[j]]
+        if relation > 4:
+            reasons.append("日主相生")
+        elif relation > 0:
+            reasons.append("日主同类")
+        elif relation < 0:
+            reasons.append("日主相克")
+    if m.elements[i].sum() > 0 and ((m.elements[i] == 0) & (m.elements[j] > 0)).any():
+        reasons.append("五行互补")
+    if m.mbti[i].any() and m.mbti[j].any():
+        same = m.mbti[i] * m.mbti[j]
+        if same[1] > 0 and same[3] > 0:
+            reasons.append("做事方式一致")
+        if same[0] < 0 or same[2] < 0:
+            reasons.append("性格互补")
+    if not np.isnan(m.levels[i]) and not np.isnan(m.levels[j]):
+        distance = abs(m.levels[i] - m.levels[j])
+        reasons.append({0: "平级协作", 1: "适合带教"}.get(distance, "职级跨度大"))
+    return reasons
+
+
+class CompatibilityCache:
+    """按用户缓存配合度矩阵，支持单条目增量更新"""
+
+    def __init__(self, max_size: int = COMPATIBILITY_CACHE_SIZE):
+        self._max_size = max_size
+        self._matrices: "OrderedDict[str, _RosterMatrix]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _fingerprint(session, user_id: str) -> RosterFingerprint:
+        count, latest, checksum = session.query(
+            func.count(UserProfile.id),
+            func.max(UserProfile.updated_at),
+            func.coalesce(func.sum(func.round(cast(func.extract("epoch", UserProfile.updated_at), Numeric) * 1000)), 0),
+        ).filter(UserProfile.user_id == user_id).one()
+        return count, latest, int(checksum)
+
+    def _build(self, session, user_id: str) -> _RosterMatrix:
+        entries = session.query(UserProfile).options(
+            load_only(*USER_PROFILE_LIST_COLUMNS)
+        ).filter(UserProfile.user_id == user_id).order_by(UserProfile.id).all()
+
+        features = [_entry_features(entry) for entry in entries]
+        n = len(entries)
+        m = _RosterMatrix(
+            ids=[entry.id for entry in entries],
+            names=[entry.name for entry in entries],
+            rel_types=[entry.relationship_type for entry in entries],
+            elements=np.array([f[0] for f in features], dtype=np.float32).reshape(n, 5),
+            day_element=np.array([f[1] for f in features], dtype=np.int64),
+            mbti=np.array([f[2] for f in features], dtype=np.float32).reshape(n, 4),
+            levels=np.array([f[3] for f in features], dtype=np.float32),
+            scores=np.empty((n, n), dtype=np.float32),
+            updated_ats=[entry.updated_at for entry in entries],
+            fingerprint=_roster_fingerprint([entry.updated_at for entry in entries]),
+        )
+        m.scores = _score_block(m, np.arange(n))
+        return m
+
+    def get(self, user_id: str) -> _RosterMatrix:
+        """读取用户的配合度矩阵，缓存缺失或花名册已变化时重建"""
+        with get_session() as session:
+            fingerprint = self._fingerprint(session, user_id)
+            with self._lock:
+                cached = self._matrices.get(user_id)
+                if cached is not None and cached.fingerprint == fingerprint:
+                    self._matrices.move_to_end(user_id)
+                    return cached
+
+            matrix = self._build(session, user_id)
+
+        with self._lock:
+            self._matrices[user_id] = matrix
+            self._matrices.move_to_end(user_id)
+            while len(self._matrices) > self._max_size:
+                self._matrices.popitem(last=False)
+        return matrix
+
+    def upsert_entry(self, entry: UserProfile):
+        """
+        条目新增或修改后增量更新：只重算该条目的特征及其所在行/列，O(N)。
+        用户矩阵尚未缓存时无需处理，下次读取时全量构建。
+        """
+        elements, day_element, mbti, level = _entry_features(entry)
+        with self._lock:
+            m = self._matrices.get(entry.user_id)
+            if m is None:
+                return
+
+            if entry.id in m.ids:
+                i = m.ids.index(entry.id)
+                m.names[i] = entry.name
+                m.rel_types[i] = entry.relationship_type
+                m.updated_ats[i] = entry.updated_at
+                n = len(m.ids)
+            else:
+                i = len(m.ids)
+                n = i + 1
+                m.ids.append(entry.id)
+                m.names.append(entry.name)
+                m.rel_types.append(entry.relationship_type)
+                m.updated_ats.append(entry.updated_at)
+                m.elements = np.vstack([m.elements, np.zeros((1, 5), dtype=np.float32)])
+                m.day_element = np.append(m.day_element, -1)
+                m.mbti = np.vstack([m.mbti, np.zeros((1, 4), dtype=np.float32)])
+                m.levels = np.append(m.levels, np.float32(np.nan))
+                scores = np.full((n, n), np.nan, dtype=np.float32)
+                scores[:i, :i] = m.scores
+                m.scores = scores
+
+            m.elements[i] = elements
+            m.day_element[i] = day_element
+            m.mbti[i] = mbti
+            m.levels[i] = level
+
+            row = _score_block(m, np.array([i]))[0]
+            m.scores[i, :] = row
+            m.scores[:, i] = row
+
+            # 只把本条目的更新时间计入指纹：其他进程此前的改动仍会让读取时的指纹对不上而触发重建
+            m.fingerprint = _roster_fingerprint(m.updated_ats)
+
+    def invalidate(self, user_id: str):
+        with self._lock:
+            self._matrices.pop(user_id, None)
+
+
+compatibility_cache = CompatibilityCache()
+
+
+@async_db_tool
+@tool
+def get_team_compatibility(user_id: str, relationship_type: str = "同事", top_k: int = 3) -> str:
+    """
+    团队配合度总览：一次计算花名册成员两两之间的配合度（八字五行、MBTI、关系级别），
+    回答"团队里我适合和谁合作""谁和谁搭档最好"等问题，无需逐对调用 relationship_advice。
+
+    参数：
+    - user_id: 用户ID
+    - relationship_type: 参与计算的关系类型（默认同事；传空字符串表示全部成员），本人始终参与
+    - top_k: 每人列出的最佳搭档数量（默认3）
+
+    返回：本人的最佳合作对象、团队最佳搭档组合、每位成员的推荐搭档
+    """
+    try:
+        m = compatibility_cache.get(user_id)
+
+        rel_type = _parse_relationship_type(relationship_type) if relationship_type else None
+        members = np.array([
+            i for i, t in enumerate(m.rel_types)
+            if rel_type is None or t == rel_type or t == RelationshipType.SELF
+        ], dtype=np.int64)
+        if len(members) < 2:
+            return "📋 花名册中可计算配合度的成员不足2人，请先添加同事信息"
+
+        sub = m.scores[np.ix_(members, members)]
+        filled = np.where(np.isnan(sub), -1, sub)
+        top_k = max(1, min(int(top_k), len(members) - 1))
+        ranked = np.argsort(-filled, axis=1, kind="stable")[:, :top_k]
+
+        def _label(local: int) -> str:
+            return m.names[members[local]]
+
+        def _pair_line(a: int, b: int) -> str:
+            reasons = _pair_reasons(m, members[a], members[b])
+            return f"{_label(b)}（{sub[a, b]:.0f}分{'，' + '、'.join(reasons) if reasons else ''}）"
+
+        result = f"🤝 **团队配合度总览**（共 {len(members)} 人）\n\n"
+
+        self_local = [k for k, i in enumerate(members) if m.rel_types[i] == RelationshipType.SELF]
+        if self_local:
+            a = self_local[0]
+            result += "**你最适合合作的人：**\n"
+            for b in ranked[a]:
+                result += f"• {_pair_line(a, b)}\n"
+            result += "\n"
+
+        upper = np.triu_indices(len(members), k=1)
+        pair_order = np.argsort(-filled[upper], kind="stable")[:top_k]
+        result += "**团队最佳搭档组合：**\n"
+        for p in pair_order:
+            a, b = upper[0][p], upper[1][p]
+            result += f"• {_label(a)} × {_pair_line(a, b)}\n"
+
+        result += "\n**成员推荐搭档：**\n"
+        for a in range(len(members)):
+            if self_local and a == self_local[0]:
+                continue
+            partners = "、".join(f"{_label(b)}({sub[a, b]:.0f})" for b in ranked[a])
+            result += f"• {_label(a)}：{partners}\n"
+
+        unknown = [_label(a) for a in range(len(members))
+                   if m.day_element[members[a]] < 0 and not m.mbti[members[a]].any()]
+        if unknown:
+            result += f"\n⚠️ 以下成员缺少八字和MBTI信息，配合度仅供参考：{'、'.join(unknown)}\n"
+        result += "\n💡 配合度综合八字五行、MBTI和职级关系计算，仅供参考。"
+        return result
+
+    except Exception as e:
+        logger.error(f"❌ 计算团队配合度失败: {e}")
+        return f"❌ 计算失败：{str(e)}"
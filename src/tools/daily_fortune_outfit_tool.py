@@ -2,17 +2,40 @@
 每日运势和穿搭合并工具
 一次性返回运势和穿搭建议，便于前端调用
 """
+import contextvars
 import logging
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from datetime import datetime, date
-from typing import Optional
+from typing import Optional, Tuple
 from langchain.tools import tool
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
 from storage.database.db import get_session
+from tools.async_db_tool import async_db_tool
+from storage.cache.report_cache import report_cache, DAILY_REPORT
 from storage.database.shared.model import UserProfile, DailyReport
+from utils.helper.single_flight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
+# 同一 (user_id, report_date) 的并发请求只生成一次，其余请求等待并共享结果
+_daily_report_flight = SingleFlight()
 
+# 生成阶段超时（秒），超时后使用降级结果
+STAGE_TIMEOUTS = {
+    "bazi": 15,
+    "weather": 8,
+    "dressing": 10,
+}
+
+# 生成阶段线程池（八字/天气/穿搭均为网络调用）
+# 注意：阶段超时只是不再等待，已在运行的阶段无法取消，会继续占用线程直到底层 HTTP 超时
+# （八字接口 10 秒，搜索 SEARCH_CONNECT_TIMEOUT + SEARCH_READ_TIMEOUT，含重试），线程数按此留有余量
+_stage_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="daily-report-stage")
+
+
+@async_db_tool(blocking_io=True)
 @tool
 def get_daily_fortune_and_outfit(
     user_id: str,
@@ -33,136 +56,180 @@ def get_daily_fortune_and_outfit(
     返回：运势+穿搭的完整报告
     """
     try:
-        from tools.weather_tool import get_weather, dressing_advice
-        from tools.external_api_tool import bazi_api_analysis
-
         # 如果没有指定日期，使用今天
         if not report_date:
             report_date = date.today().strftime("%Y-%m-%d")
 
-        with get_session() as session:
-            # 1. 获取用户信息
-            user_profile = session.query(UserProfile).filter(
-                UserProfile.user_id == user_id,
-                UserProfile.relationship_type == "self"
-            ).first()
-
-            if not user_profile:
-                return "❌ 未找到您的个人信息，请先完成注册"
-
-            # 2. 检查是否有缓存
-            daily_report = session.query(DailyReport).filter(
-                DailyReport.user_id == user_id,
-                DailyReport.report_date == report_date
-            ).first()
-
-            # 判断是否需要重新生成
-            need_generate = (
-                force_refresh or  # 强制刷新
-                not daily_report or  # 无缓存
-                (daily_report.created_at and
-                 (datetime.utcnow() - daily_report.created_at).days >= 1)  # 缓存超过1天
-            )
-
-            if not need_generate and daily_report:
-                # 返回缓存数据
-                return _format_daily_report(daily_report, user_profile, from_cache=True)
-
-            # 3. 生成运势数据
-            logger.info(f"🔮 开始为用户 {user_id} 生成 {report_date} 的运势数据")
-
-            # 调用八字分析工具获取运势
-            bazi_result = bazi_api_analysis(
-                user_id=user_id,
-                query_date=report_date,
-                runtime=runtime
-            )
-
-            # 解析八字分析结果
-            fortune_data = _parse_bazi_result(bazi_result)
-
-            # 4. 获取天气信息
-            weather_info = ""
-            city = user_profile.current_location.split("市")[0] if user_profile.current_location else "北京"
-
-            try:
-                weather_result = get_weather(city=city, runtime=runtime)
-                weather_info = weather_result
-            except Exception as e:
-                logger.warning(f"⚠️ 获取天气信息失败: {e}")
-                weather_info = "天气信息获取失败，请手动查看"
-
-            # 5. 生成穿搭建议
-            dressing_info = ""
-            try:
-                # 提取幸运色
-                lucky_color = fortune_data.get("lucky_color", "蓝色")
-
-                # 获取行业信息
-                industry = user_profile.company_type if user_profile.company_type else "通用"
-
-                # 调用穿搭建议工具
-                dressing_result = dressing_advice(
-                    industry=industry,
-                    weather=_extract_weather_desc(weather_info),
-                    lucky_color=lucky_color,
-                    runtime=runtime
-                )
-                dressing_info = dressing_result
-            except Exception as e:
-                logger.warning(f"⚠️ 生成穿搭建议失败: {e}")
-                dressing_info = f"👔 穿搭建议\n\n主色调：{fortune_data.get('lucky_color', '蓝色')}\n建议穿着舒适得体的服装"
-
-            # 6. 保存到数据库
-            if daily_report:
-                # 更新现有记录
-                daily_report.fortune_score = fortune_data.get("fortune_score")
-                daily_report.fortune_yi = fortune_data.get("fortune_yi")
-                daily_report.fortune_ji = fortune_data.get("fortune_ji")
-                daily_report.fortune_mood = fortune_data.get("fortune_mood")
-                daily_report.fortune_status = fortune_data.get("fortune_status")
-                daily_report.fortune_work_situation = fortune_data.get("fortune_work_situation")
-                daily_report.fortune_advice = fortune_data.get("fortune_advice")
-                daily_report.lucky_number = fortune_data.get("lucky_number")
-                daily_report.lucky_color = fortune_data.get("lucky_color")
-                daily_report.weather = weather_info
-                daily_report.dressing_style = _extract_dressing_style(dressing_info)
-                daily_report.dressing_color = f"主色调：{fortune_data.get('lucky_color', '蓝色')}"
-                daily_report.dressing_details = dressing_info
-                daily_report.created_at = datetime.utcnow()
-            else:
-                # 创建新记录
-                daily_report = DailyReport(
-                    user_id=user_id,
-                    report_date=report_date,
-                    fortune_score=fortune_data.get("fortune_score"),
-                    fortune_yi=fortune_data.get("fortune_yi"),
-                    fortune_ji=fortune_data.get("fortune_ji"),
-                    fortune_mood=fortune_data.get("fortune_mood"),
-                    fortune_status=fortune_data.get("fortune_status"),
-                    fortune_work_situation=fortune_data.get("fortune_work_situation"),
-                    fortune_advice=fortune_data.get("fortune_advice"),
-                    lucky_number=fortune_data.get("lucky_number"),
-                    lucky_color=fortune_data.get("lucky_color"),
-                    weather=weather_info,
-                    dressing_style=_extract_dressing_style(dressing_info),
-                    dressing_color=f"主色调：{fortune_data.get('lucky_color', '蓝色')}",
-                    dressing_details=dressing_info,
-                    created_at=datetime.utcnow()
-                )
-                session.add(daily_report)
-
-            session.commit()
-            logger.info(f"✅ {report_date} 的每日报告生成并保存成功")
-
-            # 7. 格式化返回
-            return _format_daily_report(daily_report, user_profile, from_cache=False)
+        # force_refresh 计入 key：强制刷新不能合并到普通读取上拿回旧报告
+        return _daily_report_flight.do(
+            (user_id, report_date, force_refresh),
+            _get_or_generate_daily_report,
+            user_id, report_date, force_refresh, runtime
+        )
 
     except Exception as e:
         logger.error(f"❌ 获取每日运势和穿搭失败: {e}")
         return f"❌ 获取失败：{str(e)}"
 
 
+def _get_or_generate_daily_report(user_id: str, report_date: str, force_refresh: bool, runtime) -> str:
+    """读取当日报告，不存在或过期时调用外部接口生成并保存"""
+    # 1-2. 读取用户信息和已有报告（网络调用前释放数据库连接）
+    with get_session() as session:
+        user_profile = session.query(UserProfile).filter(
+            UserProfile.user_id == user_id,
+            UserProfile.relationship_type == "self"
+        ).first()
+
+        if not user_profile:
+            return "❌ 未找到您的个人信息，请先完成注册"
+
+        # 检查是否有缓存
+        daily_report = session.query(DailyReport).filter(
+            DailyReport.user_id == user_id,
+            DailyReport.report_date == report_date
+        ).first()
+
+        # 判断是否需要重新生成
+        need_generate = (
+            force_refresh or  # 强制刷新
+            not daily_report or  # 无缓存
+            (daily_report.created_at and
+             (datetime.utcnow() - daily_report.created_at).days >= 1)  # 缓存超过1天
+        )
+
+        if not need_generate and daily_report:
+            # 返回缓存数据
+            return _format_daily_report(daily_report, user_profile, from_cache=True)
+
+        city = user_profile.current_location.split("市")[0] if user_profile.current_location else "北京"
+        industry = user_profile.company_type if user_profile.company_type else "通用"
+        birth_date = user_profile.birth_date
+        gender = user_profile.gender
+
+    # 3-5. 生成运势、天气和穿搭建议
+    logger.info(f"🔮 开始为用户 {user_id} 生成 {report_date} 的运势数据")
+    fortune_data, weather_info, dressing_info = _run_generation_pipeline(
+        report_date, birth_date, gender, city, industry, runtime
+    )
+
+    # 6. 保存到数据库：按 (user_id, report_date) upsert，跨进程并发生成时也不会产生重复行
+    with get_session() as session:
+        values = dict(
+            user_id=user_id,
+            report_date=report_date,
+            fortune_score=fortune_data.get("fortune_score"),
+            fortune_yi=fortune_data.get("fortune_yi"),
+            fortune_ji=fortune_data.get("fortune_ji"),
+            fortune_mood=fortune_data.get("fortune_mood"),
+            fortune_status=fortune_data.get("fortune_status"),
+            fortune_work_situation=fortune_data.get("fortune_work_situation"),
+            fortune_advice=fortune_data.get("fortune_advice"),
+            lucky_number=fortune_data.get("lucky_number"),
+            lucky_color=fortune_data.get("lucky_color"),
+            weather=weather_info,
+            dressing_style=_extract_dressing_style(dressing_info),
+            dressing_color=f"主色调：{fortune_data.get('lucky_color', '蓝色')}",
+            dressing_details=dressing_info,
+            created_at=datetime.utcnow()
+        )
+        stmt = pg_insert(DailyReport).values(**values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[DailyReport.user_id, DailyReport.report_date],
+            set_={key: stmt.excluded[key] for key in values if key not in ("user_id", "report_date")}
+        ).returning(DailyReport)
+        daily_report = session.scalars(
+            stmt,
+            execution_options={"populate_existing": True}
+        ).one()
+
+        session.commit()
+        report_cache.invalidate(DAILY_REPORT, user_id, report_date)
+        logger.info(f"✅ {report_date} 的每日报告生成并保存成功")
+
+        # 7. 格式化返回
+        return _format_daily_report(daily_report, user_profile, from_cache=False)
+
+
+def _submit_stage(name: str, fn, **kwargs) -> Tuple[Future, float]:
+    """提交一个生成阶段，返回 (future, 截止时间)；超时从提交时刻起算"""
+    deadline = time.monotonic() + STAGE_TIMEOUTS[name]
+    ctx = contextvars.copy_context()
+    return _stage_executor.submit(ctx.run, fn, **kwargs), deadline
+
+
+def _await_stage(name: str, stage: Tuple[Future, float], fallback: str) -> str:
+    """等待阶段结果，超时或失败时返回降级结果"""
+    future, deadline = stage
+    try:
+        return future.result(timeout=max(0.0, deadline - time.monotonic()))
+    except FutureTimeoutError:
+        # cancel 只对尚未开始的阶段有效；已在运行的阶段会一直执行到底层请求超时
+        if future.cancel():
+            logger.warning(f"⚠️ {name} 阶段排队超时（{STAGE_TIMEOUTS[name]}秒），已取消，使用降级结果")
+        else:
+            logger.warning(f"⚠️ {name} 阶段超时（{STAGE_TIMEOUTS[name]}秒），使用降级结果，"
+                           f"后台请求仍占用线程直至其自身超时")
+    except Exception as e:
+        logger.warning(f"⚠️ {name} 阶段失败: {e}，使用降级结果")
+    return fallback
+
+
+def _profile_bazi_analysis(ctx, birth_date: str, gender: str, report_date: str) -> str:
+    """按花名册中的出生信息获取八字运势（优先读取结果存储中的预计算结果）"""
+    from tools.external_api_tool import get_bazi_analysis, parse_birth_date
+
+    birth = parse_birth_date(birth_date)
+    if not birth:
+        raise ValueError(f"无法解析出生日期: {birth_date}")
+    return get_bazi_analysis(ctx, *birth, gender, report_date)
+
+
+def _run_generation_pipeline(report_date: str, birth_date: str, gender: str, city: str, industry: str,
+                             runtime) -> Tuple[dict, str, str]:
+    """
+    每日报告生成流水线
+
+    八字分析与天气查询互不依赖，并发执行；穿搭建议依赖二者结果，随后执行。
+    冷启动耗时为 max(八字, 天气) + 穿搭，任一阶段超时或失败都用降级结果继续。
+    """
+    from coze_coding_utils.runtime_ctx.context import new_context
+    from tools.weather_tool import _fetch_weather, _fetch_dressing
+
+    # 直接调用底层函数（@tool 包装后的对象不能按普通函数调用），runtime 可能为空（如定时任务）
+    ctx = runtime.context if runtime is not None else new_context(method="daily_fortune")
+
+    # 3-4. 并发获取八字运势和天气
+    bazi_stage = _submit_stage(
+        "bazi", _profile_bazi_analysis,
+        ctx=ctx,
+        birth_date=birth_date,
+        gender=gender,
+        report_date=report_date
+    )
+    weather_stage = _submit_stage("weather", _fetch_weather, ctx=ctx, city=city)
+
+    # 解析八字分析结果（失败时 _parse_bazi_result 返回默认运势）
+    fortune_data = _parse_bazi_result(_await_stage("bazi", bazi_stage, fallback=""))
+    weather_info = _await_stage("weather", weather_stage, fallback="天气信息获取失败，请手动查看")
+
+    # 5. 生成穿搭建议
+    lucky_color = fortune_data.get("lucky_color", "蓝色")
+    dressing_stage = _submit_stage(
+        "dressing", _fetch_dressing,
+        ctx=ctx,
+        industry=industry,
+        weather=_extract_weather_desc(weather_info),
+        lucky_color=lucky_color
+    )
+    dressing_info = _await_stage(
+        "dressing", dressing_stage,
+        fallback=f"👔 穿搭建议\n\n主色调：{lucky_color}\n建议穿着舒适得体的服装"
+    )
+
+    return fortune_data, weather_info, dressing_info
+
+
 def _parse_bazi_result(bazi_result: str) -> dict:
     """解析八字分析结果，提取运势信息"""
     fortune_data = {
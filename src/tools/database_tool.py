@@ -8,19 +8,31 @@ from typing import Optional, Dict, List, Any
 from datetime import datetime
 from langchain.tools import tool
 
+from sqlalchemy.orm import load_only
+
 from storage.database.db import get_session
+from storage.database.pagination import keyset_page
+from storage.database.report_store import profile_report_store
+from tools.async_db_tool import async_db_tool
+from storage.cache.report_cache import report_cache, LIFE_INTERPRETATION, CAREER_TREND, DAILY_REPORT
 from storage.database.shared.model import (
     UserProfile,
     UserAccount,
     DailyReport,
     UserConversationMemory,
     UserDailyUsage,
-    GlobalDailyUsage
+    GlobalDailyUsage,
+    USER_PROFILE_LIST_COLUMNS
 )
 
 logger = logging.getLogger(__name__)
 
+# 联系人列表分页：只传 cursor 时的每页条数 / 每页上限
+CONTACTS_PAGE_SIZE = 50
+CONTACTS_MAX_PAGE_SIZE = 200
+
 
+@async_db_tool
 @tool
 def query_user_by_id(
     user_id: str
@@ -82,21 +94,30 @@ def query_user_by_id(
         return f'{{"status": "failed", "error": "{str(e)}"}}'
 
 
+@async_db_tool
 @tool
 def query_contacts(
     user_id: str,
-    contact_type: Optional[str] = None
+    contact_type: Optional[str] = None,
+    limit: int = 0,
+    cursor: Optional[str] = None
 ) -> str:
     """
-    查询联系人列表（对应 contacts 表）
+    查询联系人列表（对应 contacts 表，按创建时间倒序）
 
     参数：
     - user_id: 用户ID
     - contact_type: 联系人类型（可选：self/colleague/parent/child/friend/other）
+    - limit: 每页条数（可选，最多200；limit 和 cursor 都不传时返回全部联系人）
+    - cursor: 翻页游标（可选，传入上一页返回的 next_cursor；只传 cursor 时每页50条）
 
-    返回：联系人列表（JSON格式）
+    返回：联系人列表（JSON格式，has_more 为 true 时用 next_cursor 获取下一页）
     """
     try:
+        paged = bool(limit) or bool(cursor)
+        if paged:
+            limit = max(1, min(int(limit or CONTACTS_PAGE_SIZE), CONTACTS_MAX_PAGE_SIZE))
+
         with get_session() as session:
             query = session.query(UserProfile).filter_by(user_id=user_id)
 
@@ -106,12 +127,24 @@ def query_contacts(
             else:
                 query = query.filter(UserProfile.relationship_type != "self")
 
-            contacts = query.all()
+            # 只加载列表需要的列，人生解读/职场大势 JSON 不随列表读取
+            list_query = query.options(load_only(*USER_PROFILE_LIST_COLUMNS))
+            if paged:
+                total = query.count()
+                contacts, next_cursor = keyset_page(
+                    list_query, UserProfile.created_at, UserProfile.id, cursor or "", limit
+                )
+            else:
+                contacts = list_query.order_by(UserProfile.created_at.desc(), UserProfile.id.desc()).all()
+                total, next_cursor = len(contacts), None
 
             result = {
                 "status": "success",
                 "user_id": user_id,
-                "total": len(contacts),
+                "total": total,
+                "count": len(contacts),
+                "has_more": next_cursor is not None,
+                "next_cursor": next_cursor,
                 "contacts": []
             }
 
@@ -143,6 +176,7 @@ def query_contacts(
         return f'{{"status": "failed", "error": "{str(e)}"}}'
 
 
+@async_db_tool
 @tool
 def query_user_reports(
     user_id: str,
@@ -177,17 +211,21 @@ def query_user_reports(
 
             if profile:
                 if report_type in [None, "life"]:
-                    if profile.life_interpretation:
+                    life_data = profile_report_store.load_current(session, profile, LIFE_INTERPRETATION)
+                    if life_data:
                         result["reports"]["life"] = {
                             "generated_at": profile.life_interpretation_generated_at.strftime("%Y-%m-%d %H:%M:%S") if profile.life_interpretation_generated_at else None,
-                            "data": profile.life_interpretation
+                            "version": profile.life_interpretation_version,
+                            "data": life_data
                         }
 
                 if report_type in [None, "career"]:
-                    if profile.career_trend:
+                    career_data = profile_report_store.load_current(session, profile, CAREER_TREND)
+                    if career_data:
                         result["reports"]["career"] = {
                             "generated_at": profile.career_trend_generated_at.strftime("%Y-%m-%d %H:%M:%S") if profile.career_trend_generated_at else None,
-                            "data": profile.career_trend
+                            "version": profile.career_trend_version,
+                            "data": career_data
                         }
 
             # 2. 查询每日报告
@@ -232,6 +270,7 @@ def query_user_reports(
         return f'{{"status": "failed", "error": "{str(e)}"}}'
 
 
+@async_db_tool
 @tool
 def update_user_profile(
     user_id: str,
@@ -295,6 +334,9 @@ def update_user_profile(
 
             profile.updated_at = datetime.utcnow()
             session.commit()
+            # 报告缓存文本中包含姓名，档案变更后一并失效
+            report_cache.invalidate(LIFE_INTERPRETATION, user_id)
+            report_cache.invalidate(CAREER_TREND, user_id)
 
             logger.info(f"✅ 更新用户档案成功 | user_id: {user_id}")
 
@@ -310,6 +352,7 @@ def update_user_profile(
         return f'{{"status": "failed", "error": "{str(e)}"}}'
 
 
+@async_db_tool
 @tool
 def add_contact(
     user_id: str,
@@ -365,6 +408,7 @@ def add_contact(
         return f'{{"status": "failed", "error": "{str(e)}"}}'
 
 
+@async_db_tool
 @tool
 def save_report(
     user_id: str,
@@ -414,6 +458,7 @@ def save_report(
                     existing.fashion_trends = data.get("fashion_trends")
 
                     session.commit()
+                    report_cache.invalidate(DAILY_REPORT, user_id, report_date)
                     msg = f"✅ 每日报告更新成功（日期: {report_date}）"
                 else:
                     # 新增
@@ -439,6 +484,7 @@ def save_report(
                     )
                     session.add(new_report)
                     session.commit()
+                    report_cache.invalidate(DAILY_REPORT, user_id, report_date)
                     msg = f"✅ 每日报告创建成功（日期: {report_date}）"
 
             elif report_type == "life":
@@ -449,9 +495,9 @@ def save_report(
                 ).first()
 
                 if profile:
-                    profile.life_interpretation = data
-                    profile.life_interpretation_generated_at = datetime.utcnow()
+                    profile_report_store.save(session, profile, LIFE_INTERPRETATION, data)
                     session.commit()
+                    report_cache.invalidate(LIFE_INTERPRETATION, user_id)
                     msg = "✅ 人生解读报告保存成功"
                 else:
                     msg = "❌ 用户档案不存在"
@@ -464,9 +510,9 @@ def save_report(
                 ).first()
 
                 if profile:
-                    profile.career_trend = data
-                    profile.career_trend_generated_at = datetime.utcnow()
+                    profile_report_store.save(session, profile, CAREER_TREND, data)
                     session.commit()
+                    report_cache.invalidate(CAREER_TREND, user_id)
                     msg = "✅ 职场大势报告保存成功"
                 else:
                     msg = "❌ 用户档案不存在"
@@ -1,60 +1,89 @@
 import os
+import re
 import json
+import threading
 import requests
 from langchain.tools import tool
-from typing import Any, Optional
-from cozeloop.decorator import observe
+from typing import Any, Optional, Tuple
 from coze_coding_utils.runtime_ctx.context import Context
+from tools.search_client import web_search
+from storage.cache.fortune_store import fortune_store, normalize_birth_info
+from utils.calendar.four_pillars import FourPillars, compute_four_pillars
 
-@observe
-def web_search(
-    ctx: Context,
-    query: str,
-    search_type: str = "web",
-    count: Optional[int] = 10,
-    need_summary: Optional[bool] = True,
-):
-    """
-    融合信息搜索API，作为降级方案使用。
-    """
-    from coze_coding_utils.runtime_ctx.context import default_headers
-
-    api_key = os.getenv("COZE_WORKLOAD_IDENTITY_API_KEY")
-    base_url = os.getenv("COZE_INTEGRATION_BASE_URL")
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {api_key}",
-    }
-    headers.update(default_headers(ctx))
-    request = {
-        "Query": query,
-        "SearchType": search_type,
-        "Count": count,
-        "NeedSummary": need_summary,
-    }
+# 外部API配置缓存：按文件 mtime 重新加载，避免每次调用都读盘
+_api_config_lock = threading.Lock()
+_api_config_mtime_ns: Optional[int] = None
+_api_config: dict = {}
+
+# 这些结果说明本次分析没有拿到有效内容，不写入结果存储
+_UNCACHEABLE_MARKERS = ("分析失败：", "暂未获取到详细信息")
+
+# 出生信息中未记录时辰时，按午时（12点）排盘
+DEFAULT_BIRTH_HOUR = "12"
+_BIRTH_DATE_RE = re.compile(r"(\d{4})\D+(\d{1,2})\D+(\d{1,2})(?:\D+(\d{1,2}))?")
+
+
+def get_external_api_config() -> dict:
+    """读取 config/external_apis.json，文件未变化时直接返回内存中的配置"""
+    global _api_config_mtime_ns, _api_config
+
+    workspace_path = os.getenv("COZE_WORKSPACE_PATH", "/workspace/projects")
+    api_config_path = os.path.join(workspace_path, "config/external_apis.json")
     try:
-        response = requests.post(f'{base_url}/api/search_api/web_search', json=request, headers=headers)
-        response.raise_for_status()
-        data = response.json()
-
-        response_metadata = data.get("ResponseMetadata", {})
-        result = data.get("Result", {})
-        if response_metadata.get("Error"):
-            raise Exception(f"web_search 失败: {response_metadata.get('Error')}")
-
-        web_items = []
-        if result.get("WebResults"):
-            web_items = result.get("WebResults", [])
-        
-        content = None
-        if result.get("Choices"):
-            content = result.get("Choices", [{}])[0].get("Message", {}).get("Content", "")
-        
-        return web_items, content
-    except requests.RequestException as e:
-        raise Exception(f"网络请求失败: {str(e)}")
-    except Exception as e:
-        raise Exception(f"web_search 失败: {str(e)}")
+        mtime_ns = os.stat(api_config_path).st_mtime_ns
+    except FileNotFoundError:
+        return {}
+
+    if mtime_ns == _api_config_mtime_ns:
+        return _api_config
+
+    with _api_config_lock:
+        if mtime_ns != _api_config_mtime_ns:
+            with open(api_config_path, 'r', encoding='utf-8') as f:
+                _api_config = json.load(f)
+            _api_config_mtime_ns = mtime_ns
+    return _api_config
+
+
+def parse_birth_date(birth_date: str) -> Optional[Tuple[str, str, str, str]]:
+    """从花名册的出生年月日时间（如 1990-03-15 08:30 / 1990年3月15日8时）解析出 (年, 月, 日, 时)"""
+    match = _BIRTH_DATE_RE.search(birth_date or "")
+    if not match:
+        return None
+    year, month, day, hour = match.groups()
+    return year, month, day, hour if hour is not None else DEFAULT_BIRTH_HOUR
+
+
+def _is_cacheable(result: str) -> bool:
+    return bool(result) and not any(marker in result for marker in _UNCACHEABLE_MARKERS)
+
+
+def get_bazi_analysis(ctx: Context, birth_year: str, birth_month: str, birth_day: str,
+                      birth_hour: str, gender: str, query_date: str) -> str:
+    """八字分析：优先读取结果存储（含夜间预计算结果），未命中时调用外部API/联网搜索并保存"""
+    birth_info = normalize_birth_info(birth_year, birth_month, birth_day, birth_hour, gender)
+    cached = fortune_store.get("bazi", birth_info, query_date)
+    if cached:
+        return cached
+
+    result, source = _compute_bazi_analysis(ctx, birth_year, birth_month, birth_day, birth_hour, gender, query_date)
+    if _is_cacheable(result):
+        fortune_store.put("bazi", birth_info, query_date, result, source)
+    return result
+
+
+def get_ziwei_analysis(ctx: Context, birth_year: str, birth_month: str, birth_day: str,
+                       birth_hour: str, gender: str, query_date: str) -> str:
+    """紫微斗数分析：优先读取结果存储，未命中时调用外部API/联网搜索并保存"""
+    birth_info = normalize_birth_info(birth_year, birth_month, birth_day, birth_hour, gender)
+    cached = fortune_store.get("ziwei", birth_info, query_date)
+    if cached:
+        return cached
+
+    result, source = _compute_ziwei_analysis(ctx, birth_year, birth_month, birth_day, birth_hour, gender, query_date)
+    if _is_cacheable(result):
+        fortune_store.put("ziwei", birth_info, query_date, result, source)
+    return result
 
 
 @tool
@@ -83,48 +112,46 @@ def bazi_api_analysis(birth_year: str, birth_month: str, birth_day: str,
     if not query_date:
         query_date = date.today().strftime("%Y-%m-%d")
     
-    # 检查是否配置了外部API
-    workspace_path = os.getenv("COZE_WORKSPACE_PATH", "/workspace/projects")
-    api_config_path = os.path.join(workspace_path, "config/external_apis.json")
-    
+    return get_bazi_analysis(ctx, birth_year, birth_month, birth_day, birth_hour, gender, query_date)
+
+
+def _compute_bazi_analysis(ctx: Context, birth_year: str, birth_month: str, birth_day: str,
+                           birth_hour: str, gender: str, query_date: str) -> Tuple[str, str]:
+    """调用外部八字API，失败时降级到联网搜索，返回 (结果, 来源)"""
     # 尝试调用外部API
     try:
-        if os.path.exists(api_config_path):
-            with open(api_config_path, 'r', encoding='utf-8') as f:
-                api_config = json.load(f)
-            
-            bazi_api = api_config.get('bazi_api', {})
+        bazi_api = get_external_api_config().get('bazi_api', {})
+        
+        if bazi_api.get('enabled', False):
+            api_url = bazi_api.get('url')
+            api_key = bazi_api.get('api_key')
             
-            if bazi_api.get('enabled', False):
-                api_url = bazi_api.get('url')
-                api_key = bazi_api.get('api_key')
+            if api_url and api_key:
+                # 调用外部八字API（示例：腾讯云市场API）
+                # 注意：这里需要根据实际API文档调整请求格式
+                response = requests.post(
+                    api_url,
+                    json={
+                        "birth_year": birth_year,
+                        "birth_month": birth_month,
+                        "birth_day": birth_day,
+                        "birth_hour": birth_hour,
+                        "gender": gender,
+                        "query_date": query_date,  # 添加查询日期参数
+                        "api_key": api_key
+                    },
+                    timeout=10
+                )
                 
-                if api_url and api_key:
-                    # 调用外部八字API（示例：腾讯云市场API）
-                    # 注意：这里需要根据实际API文档调整请求格式
-                    response = requests.post(
-                        api_url,
-                        json={
-                            "birth_year": birth_year,
-                            "birth_month": birth_month,
-                            "birth_day": birth_day,
-                            "birth_hour": birth_hour,
-                            "gender": gender,
-                            "query_date": query_date,  # 添加查询日期参数
-                            "api_key": api_key
-                        },
-                        timeout=10
-                    )
-                    
-                    if response.status_code == 200:
-                        data = response.json()
-                        # 解析API返回的数据
-                        return parse_bazi_api_response(data, birth_year, birth_month, birth_day, birth_hour, gender, query_date)
+                if response.status_code == 200:
+                    data = response.json()
+                    # 解析API返回的数据
+                    return parse_bazi_api_response(data, birth_year, birth_month, birth_day, birth_hour, gender, query_date), "api"
     except Exception as e:
         print(f"外部API调用失败，降级到联网搜索: {str(e)}")
     
     # 降级到联网搜索
-    return fallback_bazi_analysis(ctx, birth_year, birth_month, birth_day, birth_hour, gender, query_date)
+    return fallback_bazi_analysis(ctx, birth_year, birth_month, birth_day, birth_hour, gender, query_date), "search"
 
 
 def parse_bazi_api_response(data: dict, birth_year: str, birth_month: str, 
@@ -136,6 +163,10 @@ def parse_bazi_api_response(data: dict, birth_year: str, birth_month: str,
     try:
         # 假设API返回格式（需要根据实际API文档调整）
         eight_chars = data.get("eight_characters", "")
+        if not eight_chars:
+            # 接口未返回排盘时使用本地排盘结果
+            pillars = local_four_pillars(birth_year, birth_month, birth_day, birth_hour)
+            eight_chars = pillars.format() if pillars else ""
         five_elements = data.get("five_elements", {})
         today_luck = data.get("today_luck", "")
         lucky_color = data.get("lucky_color", "")
@@ -164,44 +195,55 @@ def parse_bazi_api_response(data: dict, birth_year: str, birth_month: str,
         raise Exception(f"API数据解析失败: {str(e)}")
 
 
+def local_four_pillars(birth_year: str, birth_month: str, birth_day: str, birth_hour: str) -> Optional[FourPillars]:
+    """本地排四柱，出生信息无法解析或超出支持范围时返回 None"""
+    try:
+        hour = int(birth_hour) if str(birth_hour).strip().isdigit() else int(DEFAULT_BIRTH_HOUR)
+        return compute_four_pillars(int(birth_year), int(birth_month), int(birth_day), hour)
+    except (TypeError, ValueError):
+        return None
+
+
 def fallback_bazi_analysis(ctx: Context, birth_year: str, birth_month: str, 
                            birth_day: str, birth_hour: str, gender: str, query_date: str) -> str:
-    """降级方案：使用联网搜索获取命理信息"""
-    query = f"{query_date} {birth_year}年{birth_month}月{birth_day}日{birth_hour}时出生{gender}性 八字排盘 五行分析 运势"
+    """降级方案：四柱在本地排盘，联网搜索只用于获取运势解读文字"""
+    pillars = local_four_pillars(birth_year, birth_month, birth_day, birth_hour)
+    if pillars:
+        query = f"{query_date} 八字 {pillars} 日主{pillars.day[0]} {gender}命 运势"
+    else:
+        query = f"{query_date} {birth_year}年{birth_month}月{birth_day}日{birth_hour}时出生{gender}性 八字排盘 五行分析 运势"
     
     try:
-        web_items, content = web_search(ctx, query, search_type="web_summary", count=5, need_summary=True)
+        web_items, content, _ = web_search(ctx, query, search_type="web_summary", count=5, need_summary=True)
         
         if content and content.strip():
-            return f"""🎯 命理分析报告（联网搜索）
-
-【查询日期】{query_date}
-【出生信息】
-{birth_year}年{birth_month}月{birth_day}日 {birth_hour}时 | 性别：{gender}
-
-【命理分析】
-{content}
-
-⚠️ 提醒：以上分析仅供参考，实际决策请结合现实情况。
-"""
+            analysis = content
         else:
             results = []
             for item in web_items[:3]:
                 results.append(f"- {item.get('Title', '')}: {item.get('Snippet', '')}")
-            
-            return f"""🎯 命理分析报告（联网搜索）
+            analysis = chr(10).join(results) if results else '暂未获取到详细信息，请稍后再试。'
+    except Exception as e:
+        if not pillars:
+            return f"命理分析失败：{str(e)}"
+        analysis = f"暂未获取到详细信息，请稍后再试。（{str(e)}）"
+    
+    bazi_section = f"""
+【八字排盘】
+{pillars.format()}
+""" if pillars else ""
+    
+    return f"""🎯 命理分析报告（{'本地排盘 + 联网解读' if pillars else '联网搜索'}）
 
 【查询日期】{query_date}
 【出生信息】
 {birth_year}年{birth_month}月{birth_day}日 {birth_hour}时 | 性别：{gender}
-
+{bazi_section}
 【命理分析】
-{chr(10).join(results) if results else '暂未获取到详细信息，请稍后再试。'}
+{analysis}
 
 ⚠️ 提醒：以上分析仅供参考，实际决策请结合现实情况。
 """
-    except Exception as e:
-        return f"命理分析失败：{str(e)}"
 
 
 @tool
@@ -230,51 +272,49 @@ def ziwei_analysis(birth_year: str, birth_month: str, birth_day: str,
     if not query_date:
         query_date = date.today().strftime("%Y-%m-%d")
     
+    return get_ziwei_analysis(ctx, birth_year, birth_month, birth_day, birth_hour, gender, query_date)
+
+
+def _compute_ziwei_analysis(ctx: Context, birth_year: str, birth_month: str, birth_day: str,
+                            birth_hour: str, gender: str, query_date: str) -> Tuple[str, str]:
+    """调用外部紫微斗数API，失败时降级到联网搜索，返回 (结果, 来源)"""
     # 转换性别
     gender_code = "1" if gender == "男" else "0"
     
-    # 检查是否配置了外部API
-    workspace_path = os.getenv("COZE_WORKSPACE_PATH", "/workspace/projects")
-    api_config_path = os.path.join(workspace_path, "config/external_apis.json")
-    
     # 尝试调用外部API
     try:
-        if os.path.exists(api_config_path):
-            with open(api_config_path, 'r', encoding='utf-8') as f:
-                api_config = json.load(f)
-            
-            ziwei_api = api_config.get('ziwei_api', {})
+        ziwei_api = get_external_api_config().get('ziwei_api', {})
+        
+        if ziwei_api.get('enabled', False):
+            api_url = ziwei_api.get('url')
+            api_key = ziwei_api.get('api_key')
             
-            if ziwei_api.get('enabled', False):
-                api_url = ziwei_api.get('url')
-                api_key = ziwei_api.get('api_key')
+            if api_url and api_key:
+                # 调用外部紫微斗数API（示例：江阴雨辰互联API）
+                response = requests.post(
+                    api_url,
+                    data={
+                        "name": "用户",
+                        "sex": gender_code,
+                        "type": "0",  # 0表示公历
+                        "year": birth_year,
+                        "month": birth_month,
+                        "day": birth_day,
+                        "hours": birth_hour,
+                        "minute": "00",
+                        "api_key": api_key
+                    },
+                    timeout=10
+                )
                 
-                if api_url and api_key:
-                    # 调用外部紫微斗数API（示例：江阴雨辰互联API）
-                    response = requests.post(
-                        api_url,
-                        data={
-                            "name": "用户",
-                            "sex": gender_code,
-                            "type": "0",  # 0表示公历
-                            "year": birth_year,
-                            "month": birth_month,
-                            "day": birth_day,
-                            "hours": birth_hour,
-                            "minute": "00",
-                            "api_key": api_key
-                        },
-                        timeout=10
-                    )
-                    
-                    if response.status_code == 200:
-                        data = response.json()
-                        return parse_ziwei_api_response(data, birth_year, birth_month, birth_day, birth_hour, gender, query_date)
+                if response.status_code == 200:
+                    data = response.json()
+                    return parse_ziwei_api_response(data, birth_year, birth_month, birth_day, birth_hour, gender, query_date), "api"
     except Exception as e:
         print(f"紫微斗数API调用失败，降级到联网搜索: {str(e)}")
     
     # 降级到联网搜索
-    return fallback_ziwei_analysis(ctx, birth_year, birth_month, birth_day, birth_hour, gender, query_date)
+    return fallback_ziwei_analysis(ctx, birth_year, birth_month, birth_day, birth_hour, gender, query_date), "search"
 
 
 def parse_ziwei_api_response(data: dict, birth_year: str, birth_month: str, 
@@ -310,7 +350,7 @@ def fallback_ziwei_analysis(ctx: Context, birth_year: str, birth_month: str,
     query = f"{query_date} {birth_year}年{birth_month}月{birth_day}日{birth_hour}时出生{gender}性 紫微斗数 排盘 命盘 运势"
     
     try:
-        web_items, content = web_search(ctx, query, search_type="web_summary", count=5, need_summary=True)
+        web_items, content, _ = web_search(ctx, query, search_type="web_summary", count=5, need_summary=True)
         
         if content and content.strip():
             return f"""🔮 紫微斗数命盘分析（联网搜索）
@@ -1,45 +1,6 @@
-import os
-import requests
 from langchain.tools import tool
 from typing import Any
-from cozeloop.decorator import observe
-from coze_coding_utils.runtime_ctx.context import Context
-
-
-@observe
-def web_search(
-    ctx: Context,
-    query: str,
-    search_type: str = "web",
-    count: int = 10,
-    need_summary: bool = True,
-):
-    """联网搜索辅助函数"""
-    from coze_coding_utils.runtime_ctx.context import default_headers
-
-    api_key = os.getenv("COZE_WORKLOAD_IDENTITY_API_KEY")
-    base_url = os.getenv("COZE_INTEGRATION_BASE_URL")
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {api_key}",
-    }
-    headers.update(default_headers(ctx))
-    request = {
-        "Query": query,
-        "SearchType": search_type,
-        "Count": count,
-        "NeedSummary": need_summary,
-    }
-    response = requests.post(f'{base_url}/api/search_api/web_search', json=request, headers=headers)
-    response.raise_for_status()
-    data = response.json()
-    
-    result = data.get("Result", {})
-    content = None
-    if result.get("Choices"):
-        content = result.get("Choices", [{}])[0].get("Message", {}).get("Content", "")
-    
-    return content
+from tools.search_client import web_search_summary
 
 
 # MBTI类型基础数据库
@@ -217,7 +178,7 @@ def mbti_analysis(mbti_type: str, name: str, birth_info: dict, career_info: dict
     # 使用联网搜索获取更详细的MBTI资料
     search_query = f"{mbti_upper}型人格 性格特点 职业发展 心理学"
     try:
-        online_content = web_search(ctx, search_query, search_type="web_summary", count=3, need_summary=True)
+        online_content = web_search_summary(ctx, search_query, search_type="web_summary", count=3, need_summary=True)
         
         online_analysis = ""
         if online_content and online_content.strip():
@@ -1,74 +1,6 @@
-import os
-from typing import Optional, Any
+from typing import Any
 from langchain.tools import tool
-from cozeloop.decorator import observe
-from coze_coding_utils.runtime_ctx.context import Context
-
-
-@observe
-def web_search(
-    ctx: Context,
-    query: str,
-    search_type: str = "web",
-    count: Optional[int] = 10,
-    need_content: Optional[bool] = False,
-    need_url: Optional[bool] = False,
-    sites: Optional[str] = None,
-    block_hosts: Optional[str] = None,
-    need_summary: Optional[bool] = True,
-    time_range: Optional[str] = None,
-):
-    """
-    融合信息搜索API，返回搜索结果项列表、搜索结果内容总结和原始响应数据。
-    """
-    import requests
-    from coze_coding_utils.runtime_ctx.context import default_headers
-
-    api_key = os.getenv("COZE_WORKLOAD_IDENTITY_API_KEY")
-    base_url = os.getenv("COZE_INTEGRATION_BASE_URL")
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {api_key}",
-    }
-    headers.update(default_headers(ctx))
-    request = {
-        "Query": query,
-        "SearchType": search_type,
-        "Count": count,
-        "Filter": {
-            "NeedContent": need_content,
-            "NeedUrl": need_url,
-            "Sites": sites,
-            "BlockHosts": block_hosts,
-        },
-        "NeedSummary": need_summary,
-        "TimeRange": time_range,
-    }
-    try:
-        response = requests.post(f'{base_url}/api/search_api/web_search', json=request, headers=headers)
-        response.raise_for_status()
-        data = response.json()
-
-        response_metadata = data.get("ResponseMetadata", {})
-        result = data.get("Result", {})
-        if response_metadata.get("Error"):
-            raise Exception(f"web_search 失败: {response_metadata.get('Error')}")
-
-        web_items = []
-        if result.get("WebResults"):
-            web_items = result.get("WebResults", [])
-        
-        content = None
-        if result.get("Choices"):
-            content = result.get("Choices", [{}])[0].get("Message", {}).get("Content", "")
-        
-        return web_items, content, result
-    except requests.RequestException as e:
-        raise Exception(f"网络请求失败: {str(e)}")
-    except Exception as e:
-        raise Exception(f"web_search 失败: {str(e)}")
-    finally:
-        response.close()
+from tools.search_client import web_search
 
 
 @tool
@@ -1,45 +1,6 @@
-import os
-import requests
 from langchain.tools import tool
 from typing import Any, Optional
-from cozeloop.decorator import observe
-from coze_coding_utils.runtime_ctx.context import Context
-
-
-@observe
-def web_search(
-    ctx: Context,
-    query: str,
-    search_type: str = "web",
-    count: int = 10,
-    need_summary: bool = True,
-):
-    """联网搜索辅助函数"""
-    from coze_coding_utils.runtime_ctx.context import default_headers
-
-    api_key = os.getenv("COZE_WORKLOAD_IDENTITY_API_KEY")
-    base_url = os.getenv("COZE_INTEGRATION_BASE_URL")
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {api_key}",
-    }
-    headers.update(default_headers(ctx))
-    request = {
-        "Query": query,
-        "SearchType": search_type,
-        "Count": count,
-        "NeedSummary": need_summary,
-    }
-    response = requests.post(f'{base_url}/api/search_api/web_search', json=request, headers=headers)
-    response.raise_for_status()
-    data = response.json()
-    
-    result = data.get("Result", {})
-    content = None
-    if result.get("Choices"):
-        content = result.get("Choices", [{}])[0].get("Message", {}).get("Content", "")
-    
-    return content
+from tools.search_client import web_search_summary
 
 
 # 人际关系类型数据库
@@ -187,7 +148,7 @@ def relationship_advice(situation: str, mbti_type: Optional[str] = None,
         # 如果没有预定义的关系类型，使用联网搜索
         search_query = f"{situation} 人际关系 处理技巧 沟通建议"
         try:
-            online_content = web_search(ctx, search_query, search_type="web_summary", count=3, need_summary=True)
+            online_content = web_search_summary(ctx, search_query, search_type="web_summary", count=3, need_summary=True)
             
             if online_content and online_content.strip():
                 return f"""🤝 {situation}人际关系建议
@@ -242,7 +203,7 @@ def relationship_advice(situation: str, mbti_type: Optional[str] = None,
         advice_lines.append(f"\n【关于「{specific_issue}」】")
         search_query = f"{situation} {specific_issue} 解决方案 处理技巧"
         try:
-            online_content = web_search(ctx, search_query, search_type="web_summary", count=3, need_summary=True)
+            online_content = web_search_summary(ctx, search_query, search_type="web_summary", count=3, need_summary=True)
             if online_content and online_content.strip():
                 advice_lines.append(online_content)
             else:
@@ -274,7 +235,7 @@ def conflict_resolution(situation: str, conflict_type: str, mbti_type: Optional[
     search_query = f"{situation} {conflict_type} 冲突解决 处理方法"
     
     try:
-        online_content = web_search(ctx, search_query, search_type="web_summary", count=5, need_summary=True)
+        online_content = web_search_summary(ctx, search_query, search_type="web_summary", count=5, need_summary=True)
         
         advice_lines = [f"⚡ {situation} - {conflict_type}冲突解决建议"]
         
@@ -0,0 +1,292 @@
+"""
+花名册批量导入/导出工具
+支持 CSV / JSONL 格式：整批校验后在一个事务内用多行 INSERT ... RETURNING 写入，逐行返回错误，
+团队一次性录入几十上百位同事时只需一次调用。
+"""
+import csv
+import io
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain.tools import tool
+from sqlalchemy import insert
+from sqlalchemy.orm import load_only
+
+from storage.database.db import get_session
+from storage.database.shared.model import (
+    UserProfile,
+    RelationshipType,
+    USER_PROFILE_LIST_COLUMNS
+)
+from tools.async_db_tool import async_db_tool
+from tools.roster_tool import (
+    _parse_relationship_type,
+    _parse_relationship_level,
+    _format_relationship_level,
+    _invalidate_profile_reports
+)
+
+logger = logging.getLogger(__name__)
+
+# 单次导入的最大行数
+ROSTER_IMPORT_MAX_ROWS = int(os.getenv("ROSTER_IMPORT_MAX_ROWS", "1000"))
+
+# 导入/导出字段（顺序即 CSV 列顺序）及可识别的中文表头
+ROSTER_FIELDS = [
+    "name", "gender", "relationship_type", "relationship_level", "current_location",
+    "birth_date", "mbti", "birth_place", "company_name", "company_type",
+    "job_title", "job_level", "notes",
+]
+_HEADER_ALIASES = {
+    "姓名": "name",
+    "性别": "gender",
+    "关系类型": "relationship_type",
+    "关系": "relationship_type",
+    "关系级别": "relationship_level",
+    "现居地": "current_location",
+    "出生日期": "birth_date",
+    "出生年月日时间": "birth_date",
+    "mbti": "mbti",
+    "出生地": "birth_place",
+    "公司名称": "company_name",
+    "公司类型": "company_type",
+    "职位": "job_title",
+    "职位类型": "job_title",
+    "职级": "job_level",
+    "备注": "notes",
+}
+
+_REL_TYPE_DISPLAY = {
+    RelationshipType.SELF: "本人",
+    RelationshipType.COLLEAGUE: "同事",
+    RelationshipType.PARENT: "父母",
+    RelationshipType.CHILD: "儿女",
+    RelationshipType.FRIEND: "朋友",
+    RelationshipType.OTHER: "其他",
+}
+
+
+def _normalize_key(key: str) -> str:
+    key = (key or "").strip().lstrip("\ufeff")
+    return _HEADER_ALIASES.get(key.lower(), _HEADER_ALIASES.get(key, key.lower()))
+
+
+def parse_roster_rows(content: str, file_format: str = "auto") -> List[Dict[str, str]]:
+    """
+    解析导入内容为行字典列表（键已归一化为字段名）
+
+    参数：
+    - content: CSV（首行为表头）或 JSONL（每行一个 JSON 对象）文本
+    - file_format: csv / jsonl / auto（按首个非空字符判断）
+    """
+    content = content.strip().lstrip("\ufeff")
+    if file_format == "auto":
+        file_format = "jsonl" if content.startswith("{") else "csv"
+
+    if file_format == "jsonl":
+        rows = []
+        for line_no, line in enumerate(content.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"第 {line_no} 行不是合法的 JSON：{e}")
+            if not isinstance(item, dict):
+                raise ValueError(f"第 {line_no} 行必须是 JSON 对象")
+            rows.append({_normalize_key(k): "" if v is None else str(v) for k, v in item.items()})
+        return rows
+
+    if file_format == "csv":
+        reader = csv.DictReader(io.StringIO(content))
+        return [
+            {_normalize_key(k): (v or "") for k, v in row.items() if k is not None}
+            for row in reader
+        ]
+
+    raise ValueError(f"不支持的导入格式: {file_format}（支持 csv/jsonl）")
+
+
+def _validate_row(user_id: str, row: Dict[str, str]) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """校验单行并转换为 UserProfile 插入参数，规则与 add_roster_entry 一致"""
+    values = {field: (row.get(field) or "").strip() for field in ROSTER_FIELDS}
+
+    missing = [label for field, label in (
+        ("name", "姓名"), ("gender", "性别"), ("relationship_type", "关系类型"), ("current_location", "现居地")
+    ) if not values[field]]
+    if missing:
+        return None, f"缺少必填字段：{'、'.join(missing)}"
+
+    rel_type = _parse_relationship_type(values["relationship_type"])
+    if rel_type == RelationshipType.SELF and not values["birth_date"]:
+        return None, "本人的出生年月日时间为必填字段"
+
+    rel_level = None
+    if values["relationship_level"] and rel_type == RelationshipType.COLLEAGUE:
+        rel_level = _parse_relationship_level(values["relationship_level"])
+        if rel_level is None:
+            return None, f"无法识别的关系级别：{values['relationship_level']}"
+
+    params = {field: (values[field] or None) for field in ROSTER_FIELDS}
+    params.update(user_id=user_id, relationship_type=rel_type, relationship_level=rel_level)
+    return params, None
+
+
+def import_roster(user_id: str, rows: List[Dict[str, str]], skip_existing: bool = True) -> Dict[str, Any]:
+    """
+    批量导入花名册：整批校验后一次事务写入
+
+    参数：
+    - user_id: 用户ID
+    - rows: parse_roster_rows 的结果
+    - skip_existing: 是否跳过已存在的同名同关系条目（重复导入时避免产生重复数据）
+
+    返回：{"total", "imported", "failed", "created": [{"line", "id", "name"}], "errors": [{"line", "name", "error"}]}
+    """
+    if len(rows) > ROSTER_IMPORT_MAX_ROWS:
+        raise ValueError(f"单次最多导入 {ROSTER_IMPORT_MAX_ROWS} 行，当前 {len(rows)} 行")
+
+    errors: List[Dict[str, Any]] = []
+    pending: List[Tuple[int, Dict[str, Any]]] = []
+
+    with get_session() as session:
+        existing = set()
+        if skip_existing:
+            existing = set(session.query(UserProfile.name, UserProfile.relationship_type).filter(
+                UserProfile.user_id == user_id
+            ).all())
+        has_self = any(rel == RelationshipType.SELF for _, rel in existing)
+
+        seen = set()
+        for line, row in enumerate(rows, start=1):
+            params, error = _validate_row(user_id, row)
+            if error is None:
+                key = (params["name"], params["relationship_type"])
+                if key in seen:
+                    error = "与文件中前面的行重复"
+                elif key in existing:
+                    error = "花名册中已存在同名同关系的条目"
+                elif params["relationship_type"] == RelationshipType.SELF and has_self:
+                    error = "本人信息已存在，请使用更新功能修改"
+            if error:
+                errors.append({"line": line, "name": (row.get("name") or "").strip(), "error": error})
+                continue
+            seen.add(key)
+            has_self = has_self or params["relationship_type"] == RelationshipType.SELF
+            pending.append((line, params))
+
+        created = []
+        if pending:
+            # 多行 INSERT ... RETURNING，按参数顺序返回 ID
+            stmt = insert(UserProfile).returning(
+                UserProfile.id, UserProfile.name, sort_by_parameter_order=True
+            )
+            result = session.execute(stmt, [params for _, params in pending]).all()
+            session.commit()
+            created = [
+                {"line": line, "id": row.id, "name": row.name}
+                for (line, _), row in zip(pending, result)
+            ]
+
+    if created:
+        from tools.compatibility_tool import compatibility_cache
+        compatibility_cache.invalidate(user_id)
+        if any(params["relationship_type"] == RelationshipType.SELF for _, params in pending):
+            _invalidate_profile_reports(user_id)
+
+    logger.info(f"✅ 花名册批量导入完成 | user_id: {user_id} | 成功: {len(created)} | 失败: {len(errors)}")
+    return {
+        "total": len(rows),
+        "imported": len(created),
+        "failed": len(errors),
+        "created": created,
+        "errors": errors,
+    }
+
+
+def export_roster(user_id: str, file_format: str = "csv", relationship_type: str = "") -> str:
+    """导出花名册为 CSV / JSONL 文本（字段与导入格式一致，可直接再次导入）"""
+    if file_format not in ("csv", "jsonl"):
+        raise ValueError(f"不支持的导出格式: {file_format}（支持 csv/jsonl）")
+
+    with get_session() as session:
+        query = session.query(UserProfile).options(
+            load_only(*USER_PROFILE_LIST_COLUMNS)
+        ).filter(UserProfile.user_id == user_id)
+        if relationship_type:
+            query = query.filter(UserProfile.relationship_type == _parse_relationship_type(relationship_type))
+
+        records = []
+        for entry in query.order_by(UserProfile.created_at, UserProfile.id).all():
+            record = {field: getattr(entry, field) or "" for field in ROSTER_FIELDS}
+            record["relationship_type"] = _REL_TYPE_DISPLAY.get(entry.relationship_type, entry.relationship_type)
+            record["relationship_level"] = _format_relationship_level(entry.relationship_level)
+            records.append(record)
+
+    if file_format == "jsonl":
+        return "\n".join(json.dumps(record, ensure_ascii=False) for record in records)
+
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=ROSTER_FIELDS)
+    writer.writeheader()
+    writer.writerows(records)
+    return buffer.getvalue()
+
+
+@async_db_tool
+@tool
+def import_roster_entries(user_id: str, content: str, file_format: str = "auto") -> str:
+    """
+    批量导入花名册（一次录入多位同事/家人/朋友）
+
+    参数：
+    - user_id: 用户ID
+    - content: 导入内容。CSV 首行为表头（支持 name/姓名、gender/性别、relationship_type/关系类型、
+      current_location/现居地、birth_date/出生日期、mbti、relationship_level/关系级别、
+      company_name/公司名称、job_title/职位、job_level/职级、notes/备注 等）；
+      JSONL 每行一个对象，键同上
+    - file_format: csv / jsonl / auto（默认自动识别）
+
+    返回：导入结果，包含成功条数和每一行的错误原因
+    """
+    try:
+        rows = parse_roster_rows(content, file_format)
+        if not rows:
+            return "❌ 导入失败：没有可导入的数据行"
+
+        report = import_roster(user_id, rows)
+
+        result = f"📥 **批量导入完成**（共 {report['total']} 行，成功 {report['imported']} 行，失败 {report['failed']} 行）\n\n"
+        if report["created"]:
+            result += "✅ 已添加：" + "、".join(item["name"] for item in report["created"]) + "\n\n"
+        if report["errors"]:
+            result += "❌ 失败明细：\n"
+            for item in report["errors"]:
+                result += f"  第 {item['line']} 条 {item['name'] or '(未填姓名)'}：{item['error']}\n"
+        return result
+
+    except Exception as e:
+        logger.error(f"❌ 批量导入花名册失败: {e}")
+        return f"❌ 导入失败：{str(e)}"
+
+
+@async_db_tool
+@tool
+def export_roster_entries(user_id: str, file_format: str = "csv", relationship_type: str = "") -> str:
+    """
+    导出花名册（CSV 或 JSONL，格式与批量导入一致）
+
+    参数：
+    - user_id: 用户ID
+    - file_format: csv / jsonl（默认 csv）
+    - relationship_type: 可选，按关系类型筛选（本人/同事/父母/儿女/朋友/其他）
+
+    返回：导出的文本内容
+    """
+    try:
+        return export_roster(user_id, file_format, relationship_type)
+    except Exception as e:
+        logger.error(f"❌ 导出花名册失败: {e}")
+        return f"❌ 导出失败：{str(e)}"
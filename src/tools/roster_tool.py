@@ -5,21 +5,37 @@
 import json
 import logging
 from datetime import datetime
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 from langchain.tools import tool
+from sqlalchemy import bindparam, case, func, literal_column
+from sqlalchemy.orm import load_only
 
 from storage.database.db import get_session
+from storage.database.pagination import keyset_page
+from storage.database.report_store import profile_report_store
+from tools.async_db_tool import async_db_tool
+from storage.cache.report_cache import report_cache, LIFE_INTERPRETATION, CAREER_TREND, DAILY_REPORT
 from storage.database.shared.model import (
     UserProfile,
     RelationshipType,
     RelationshipLevel,
     UserConversationMemory,
     ConversationType,
-    DailyReport
+    DailyReport,
+    ROSTER_SEARCH_DOCUMENT,
+    USER_PROFILE_LIST_COLUMNS
 )
 
 logger = logging.getLogger(__name__)
 
+# 花名册列表分页：只传 cursor 时的每页条数 / 每页上限
+ROSTER_PAGE_SIZE = 20
+ROSTER_MAX_PAGE_SIZE = 100
+
+# 花名册搜索分页：默认每页条数 / 每页上限
+SEARCH_PAGE_SIZE = 10
+SEARCH_MAX_PAGE_SIZE = 50
+
 
 def _parse_relationship_type(rel_type: str) -> RelationshipType:
     """解析关系类型字符串为枚举"""
@@ -64,6 +80,68 @@ def _parse_relationship_level(rel_level: str) -> Optional[RelationshipLevel]:
     return level_map.get(rel_level)
 
 
+def _invalidate_profile_reports(user_id: str):
+    """本人条目变更后失效人生解读/职场大势缓存（缓存文本中包含姓名等档案信息）"""
+    report_cache.invalidate(LIFE_INTERPRETATION, user_id)
+    report_cache.invalidate(CAREER_TREND, user_id)
+
+
+def _refresh_compatibility(entry: UserProfile):
+    """条目新增/修改后增量更新配合度矩阵（失败不影响花名册操作）"""
+    from tools.compatibility_tool import compatibility_cache
+
+    try:
+        compatibility_cache.upsert_entry(entry)
+    except Exception as e:
+        logger.warning(f"⚠️ 更新配合度矩阵失败，已失效该用户缓存: {e}")
+        compatibility_cache.invalidate(entry.user_id)
+
+
+def _escape_like(keyword: str) -> str:
+    """转义 LIKE 通配符，关键词中的 % 和 _ 按字面匹配"""
+    return keyword.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _search_roster(session, user_id: str, keyword: str, limit: int, offset: int):
+    """
+    花名册搜索：在该用户的条目中按 姓名/MBTI/备注 做子串匹配，按相关度排序并分页
+
+    - 过滤条件使用 ROSTER_SEARCH_DOCUMENT 表达式，可命中 pg_trgm GIN 索引（见 init_db.migrate_roster_search_index），
+      与 user_id 索引做位图合并，耗时只与该用户的匹配条目数相关
+    - 排序：姓名完全匹配 > 姓名前缀 > 姓名包含 > MBTI 完全匹配，同档按三元组相似度、ID 倒序
+    - total 由窗口函数随分页结果一并返回，无需额外 COUNT 查询
+
+    返回：(匹配总数, 当前页结果行)
+    """
+    document = literal_column(ROSTER_SEARCH_DOCUMENT)
+    escaped = _escape_like(keyword)
+    rank = (
+        case(
+            (func.lower(UserProfile.name) == keyword.lower(), 4.0),
+            (UserProfile.name.ilike(f"{escaped}%", escape="\\"), 3.0),
+            (UserProfile.name.ilike(f"%{escaped}%", escape="\\"), 2.0),
+            (func.upper(UserProfile.mbti) == keyword.upper(), 1.5),
+            else_=0.0,
+        ) + func.word_similarity(keyword, document)
+    ).label("rank")
+
+    rows = session.query(
+        UserProfile.id,
+        UserProfile.name,
+        UserProfile.mbti,
+        UserProfile.notes,
+        rank,
+        func.count().over().label("total"),
+    ).filter(
+        UserProfile.user_id == user_id,
+        document.ilike(bindparam("search_pattern", f"%{escaped}%"), escape="\\"),
+    ).order_by(
+        rank.desc(), UserProfile.id.desc()
+    ).limit(limit).offset(offset).all()
+
+    return (rows[0].total if rows else 0), rows
+
+
 def _format_relationship_level(rel_level: Optional[RelationshipLevel]) -> str:
     """安全地格式化关系级别为字符串"""
     if rel_level is None:
@@ -73,6 +151,7 @@ def _format_relationship_level(rel_level: Optional[RelationshipLevel]) -> str:
     return str(rel_level)
 
 
+@async_db_tool
 @tool
 def add_roster_entry(
     user_id: str,
@@ -150,6 +229,7 @@ def add_roster_entry(
             session.add(entry)
             session.commit()
             session.refresh(entry)
+            _refresh_compatibility(entry)
 
             logger.info(f"✅ 成功添加花名册条目: {name} (ID: {entry.id})")
 
@@ -174,77 +254,113 @@ def add_roster_entry(
         return f"❌ 添加失败：{str(e)}"
 
 
+def list_roster_entries(user_id: str, relationship_type: str = "",
+                        limit: int = 0, cursor: str = "") -> Tuple[str, Optional[str]]:
+    """
+    获取花名册列表文本和下一页游标（get_roster_entries 与 /api/roster 共用）
+
+    limit、cursor 都不传时返回全部条目（与分页前的行为一致）；传入任一参数时按创建时间倒序分页，
+    只传 cursor 时每页 ROSTER_PAGE_SIZE 条。
+
+    返回：(列表文本, 下一页游标)，没有下一页时游标为 None
+    """
+    paged = bool(limit) or bool(cursor)
+    if paged:
+        limit = max(1, min(int(limit or ROSTER_PAGE_SIZE), ROSTER_MAX_PAGE_SIZE))
+
+    with get_session() as session:
+        query = session.query(UserProfile).filter(UserProfile.user_id == user_id)
+
+        # 按关系类型筛选
+        if relationship_type:
+            rel_type = _parse_relationship_type(relationship_type)
+            query = query.filter(UserProfile.relationship_type == rel_type)
+
+        # 只加载列表需要的列，人生解读/职场大势 JSON 不随列表读取
+        list_query = query.options(load_only(*USER_PROFILE_LIST_COLUMNS))
+        if paged:
+            total = query.count()
+            entries, next_cursor = keyset_page(list_query, UserProfile.created_at, UserProfile.id, cursor, limit)
+        else:
+            entries = list_query.order_by(UserProfile.created_at.desc(), UserProfile.id.desc()).all()
+            total, next_cursor = len(entries), None
+
+        if not entries:
+            if cursor:
+                return "📋 花名册没有更多条目了", None
+            return "📋 花名册为空，还没有添加任何条目", None
+
+        # 格式化输出
+        if paged:
+            result = f"📋 **花名册**（共 {total} 条，本页 {len(entries)} 条）\n\n"
+        else:
+            result = f"📋 **花名册**（共 {total} 条）\n\n"
+        for entry in entries:
+            rel_type_display = {
+                RelationshipType.SELF: "本人",
+                RelationshipType.COLLEAGUE: "同事",
+                RelationshipType.PARENT: "父母",
+                RelationshipType.CHILD: "儿女",
+                RelationshipType.FRIEND: "朋友",
+                RelationshipType.OTHER: "其他",
+            }.get(entry.relationship_type, entry.relationship_type)
+
+            rel_level_display = f" ({_format_relationship_level(entry.relationship_level)})"
+
+            result += f"**{entry.name}** - {rel_type_display}{rel_level_display}\n"
+            result += f"  性别: {entry.gender} | "
+            result += f"现居地: {entry.current_location}\n"
+            if entry.birth_date:
+                result += f"  出生日期: {entry.birth_date}\n"
+            if entry.mbti:
+                result += f"  MBTI: {entry.mbti}\n"
+            if entry.bazi:
+                result += f"  八字: {entry.bazi[:20]}...\n"  # 只显示前20个字符
+            if entry.birth_place:
+                result += f"  出生地: {entry.birth_place}\n"
+            if entry.company_name:
+                result += f"  公司名称: {entry.company_name}\n"
+            if entry.company_type:
+                result += f"  公司类型: {entry.company_type}\n"
+            if entry.job_title:
+                result += f"  职位: {entry.job_title}\n"
+            if entry.job_level:
+                result += f"  职级: {entry.job_level}\n"
+            if entry.notes:
+                result += f"  备注: {entry.notes}\n"
+            result += f"  ID: {entry.id} | 更新时间: {entry.updated_at.strftime('%Y-%m-%d %H:%M')}\n"
+            result += "\n"
+
+        if next_cursor:
+            result += f"👉 还有更多条目，传入 cursor=\"{next_cursor}\" 查看下一页\n"
+
+        return result, next_cursor
+
+
+@async_db_tool
 @tool
-def get_roster_entries(user_id: str, relationship_type: str = "") -> str:
+def get_roster_entries(user_id: str, relationship_type: str = "",
+                       limit: int = 0, cursor: str = "") -> str:
     """
-    获取花名册列表
+    获取花名册列表（按创建时间倒序）
 
     参数：
     - user_id: 用户ID
     - relationship_type: 可选，按关系类型筛选（本人/同事/父母/儿女/朋友/其他）
+    - limit: 可选，每页条数（最多100）；limit 和 cursor 都不传时返回全部条目
+    - cursor: 可选，翻页游标，传入上一页返回的游标查看下一页
 
     返回：花名册列表
     """
     try:
-        with get_session() as session:
-            query = session.query(UserProfile).filter(UserProfile.user_id == user_id)
-
-            # 按关系类型筛选
-            if relationship_type:
-                rel_type = _parse_relationship_type(relationship_type)
-                query = query.filter(UserProfile.relationship_type == rel_type)
-
-            # 按创建时间倒序
-            entries = query.order_by(UserProfile.created_at.desc()).all()
-
-            if not entries:
-                return "📋 花名册为空，还没有添加任何条目"
-
-            # 格式化输出
-            result = f"📋 **花名册**（共 {len(entries)} 条）\n\n"
-            for entry in entries:
-                rel_type_display = {
-                    RelationshipType.SELF: "本人",
-                    RelationshipType.COLLEAGUE: "同事",
-                    RelationshipType.PARENT: "父母",
-                    RelationshipType.CHILD: "儿女",
-                    RelationshipType.FRIEND: "朋友",
-                    RelationshipType.OTHER: "其他",
-                }.get(entry.relationship_type, entry.relationship_type)
-
-                rel_level_display = f" ({_format_relationship_level(entry.relationship_level)})"
-
-                result += f"**{entry.name}** - {rel_type_display}{rel_level_display}\n"
-                result += f"  性别: {entry.gender} | "
-                result += f"现居地: {entry.current_location}\n"
-                if entry.birth_date:
-                    result += f"  出生日期: {entry.birth_date}\n"
-                if entry.mbti:
-                    result += f"  MBTI: {entry.mbti}\n"
-                if entry.bazi:
-                    result += f"  八字: {entry.bazi[:20]}...\n"  # 只显示前20个字符
-                if entry.birth_place:
-                    result += f"  出生地: {entry.birth_place}\n"
-                if entry.company_name:
-                    result += f"  公司名称: {entry.company_name}\n"
-                if entry.company_type:
-                    result += f"  公司类型: {entry.company_type}\n"
-                if entry.job_title:
-                    result += f"  职位: {entry.job_title}\n"
-                if entry.job_level:
-                    result += f"  职级: {entry.job_level}\n"
-                if entry.notes:
-                    result += f"  备注: {entry.notes}\n"
-                result += f"  ID: {entry.id} | 更新时间: {entry.updated_at.strftime('%Y-%m-%d %H:%M')}\n"
-                result += "\n"
-
-            return result
+        return list_roster_entries(user_id, relationship_type, limit, cursor)[0]
 
     except Exception as e:
         logger.error(f"❌ 获取花名册失败: {e}")
         return f"❌ 获取失败：{str(e)}"
 
 
+@async_db_tool
 @tool
 def get_roster_entry_by_id(entry_id: int) -> str:
     """
@@ -299,6 +415,7 @@ def get_roster_entry_by_id(entry_id: int) -> str:
         return f"❌ 获取失败：{str(e)}"
 
 
+@async_db_tool
 @tool
 def update_roster_entry(
     entry_id: int,
@@ -390,6 +507,8 @@ def update_roster_entry(
 
             entry.updated_at = datetime.utcnow()
             session.commit()
+            _invalidate_profile_reports(entry.user_id)
+            _refresh_compatibility(entry)
 
             logger.info(f"✅ 成功更新花名册条目: {entry.name} (ID: {entry.id})")
 
@@ -415,6 +534,7 @@ def update_roster_entry(
         return f"❌ 更新失败：{str(e)}"
 
 
+@async_db_tool
 @tool
 def delete_roster_entry(entry_id: int) -> str:
     """
@@ -433,8 +553,13 @@ def delete_roster_entry(entry_id: int) -> str:
                 return f"❌ 未找到ID为 {entry_id} 的条目"
 
             entry_name = entry.name
+            entry_user_id = entry.user_id
             session.delete(entry)
             session.commit()
+            _invalidate_profile_reports(entry_user_id)
+
+            from tools.compatibility_tool import compatibility_cache
+            compatibility_cache.invalidate(entry_user_id)
 
             logger.info(f"✅ 成功删除花名册条目: {entry_name} (ID: {entry_id})")
 
@@ -445,59 +570,67 @@ def delete_roster_entry(entry_id: int) -> str:
         return f"❌ 删除失败：{str(e)}"
 
 
+@async_db_tool
 @tool
-def search_roster_entries(user_id: str, keyword: str) -> str:
+def search_roster_entries(user_id: str, keyword: str, limit: int = SEARCH_PAGE_SIZE, offset: int = 0) -> str:
     """
     搜索花名册条目
 
     参数：
     - user_id: 用户ID
     - keyword: 搜索关键词（姓名、MBTI、备注等）
+    - limit: 每页条数（默认10，最多50）
+    - offset: 跳过的条数（翻页时传入上一页返回的 offset）
 
-    返回：匹配的条目列表
+    返回：按相关度排序的匹配条目列表
     """
     try:
-        with get_session() as session:
-            keyword = keyword.strip()
-
-            # 搜索姓名、MBTI、备注
-            query = session.query(UserProfile).filter(
-                UserProfile.user_id == user_id,
-                (UserProfile.name.ilike(f"%{keyword}%") |
-                 UserProfile.mbti.ilike(f"%{keyword}%") |
-                 UserProfile.notes.ilike(f"%{keyword}%"))
-            )
-
-            entries = query.order_by(UserProfile.created_at.desc()).all()
+        keyword = keyword.strip()
+        if not keyword:
+            return "❌ 搜索失败：关键词不能为空"
+        limit = max(1, min(int(limit), SEARCH_MAX_PAGE_SIZE))
+        offset = max(0, int(offset))
 
-            if not entries:
-                return f"🔍 未找到包含关键词 '{keyword}' 的条目"
-
-            # 格式化输出
-            result = f"🔍 **搜索结果**（关键词: '{keyword}'，共 {len(entries)} 条）\n\n"
-            for entry in entries:
-                result += f"**{entry.name}** (ID: {entry.id})\n"
-                if entry.mbti:
-                    result += f"  MBTI: {entry.mbti}\n"
-                if entry.notes:
-                    result += f"  备注: {entry.notes[:50]}...\n"
-                result += "\n"
-
-            return result
+        with get_session() as session:
+            total, rows = _search_roster(session, user_id, keyword, limit, offset)
+
+        if not total:
+            if offset:
+                return f"🔍 关键词 '{keyword}' 没有更多结果了"
+            return f"🔍 未找到包含关键词 '{keyword}' 的条目"
+
+        # 格式化输出
+        result = (
+            f"🔍 **搜索结果**（关键词: '{keyword}'，共 {total} 条，"
+            f"当前第 {offset + 1}-{offset + len(rows)} 条）\n\n"
+        )
+        for row in rows:
+            result += f"**{row.name}** (ID: {row.id})\n"
+            if row.mbti:
+                result += f"  MBTI: {row.mbti}\n"
+            if row.notes:
+                result += f"  备注: {row.notes[:50]}...\n"
+            result += "\n"
+
+        if offset + len(rows) < total:
+            result += f"👉 还有更多结果，传入 offset={offset + len(rows)} 查看下一页\n"
+
+        return result
 
     except Exception as e:
         logger.error(f"❌ 搜索花名册失败: {e}")
         return f"❌ 搜索失败：{str(e)}"
 
 
+@async_db_tool
 @tool
-def add_user_bazi(user_id: str, bazi: str) -> str:
+def add_user_bazi(user_id: str, bazi: str = "") -> str:
     """
     为用户添加八字信息（系统产出）
 
     参数：
     - user_id: 用户ID
-    - bazi: 八字信息
+    - bazi: 八字信息（可选，不填则根据本人的出生年月日时间本地排盘）
 
     返回：添加结果
     """
@@ -512,19 +645,30 @@ def add_user_bazi(user_id: str, bazi: str) -> str:
             if not entry:
                 return "❌ 未找到本人的信息，请先添加本人信息到花名册"
 
+            if not bazi or not bazi.strip():
+                from tools.external_api_tool import parse_birth_date, local_four_pillars
+
+                birth = parse_birth_date(entry.birth_date)
+                pillars = local_four_pillars(*birth) if birth else None
+                if not pillars:
+                    return f"❌ 无法根据出生日期排盘：{entry.birth_date or '未填写'}，请先完善出生年月日时间"
+                bazi = pillars.format()
+
             entry.bazi = bazi.strip()
             entry.updated_at = datetime.utcnow()
             session.commit()
+            _refresh_compatibility(entry)
 
             logger.info(f"✅ 成功为用户 {entry.name} 添加八字信息")
 
-            return f"✅ 成功为 {entry.name} 添加八字信息！"
+            return f"✅ 成功为 {entry.name} 添加八字信息！\n\n{entry.bazi}"
 
     except Exception as e:
         logger.error(f"❌ 添加八字信息失败: {e}")
         return f"❌ 添加失败：{str(e)}"
 
 
+@async_db_tool
 @tool
 def save_life_interpretation(user_id: str, interpretation: dict) -> str:
     """
@@ -551,10 +695,10 @@ def save_life_interpretation(user_id: str, interpretation: dict) -> str:
             if not entry:
                 return "❌ 未找到本人的信息，请先添加本人信息到花名册"
 
-            entry.life_interpretation = interpretation
-            entry.life_interpretation_generated_at = datetime.utcnow()
+            profile_report_store.save(session, entry, LIFE_INTERPRETATION, interpretation)
             entry.updated_at = datetime.utcnow()
             session.commit()
+            report_cache.invalidate(LIFE_INTERPRETATION, user_id)
 
             logger.info(f"✅ 成功保存用户 {entry.name} 的人生解读报告")
 
@@ -565,6 +709,7 @@ def save_life_interpretation(user_id: str, interpretation: dict) -> str:
         return f"❌ 保存失败：{str(e)}"
 
 
+@async_db_tool
 @tool
 def get_life_interpretation(user_id: str, check_expired: bool = True) -> str:
     """
@@ -579,6 +724,11 @@ def get_life_interpretation(user_id: str, check_expired: bool = True) -> str:
     try:
         from datetime import timedelta
 
+        # 缓存条目在报告过期前有效，命中即为未过期的报告
+        cached = report_cache.get(LIFE_INTERPRETATION, user_id)
+        if cached:
+            return cached[1]
+
         with get_session() as session:
             entry = session.query(UserProfile).filter(
                 UserProfile.user_id == user_id,
@@ -588,7 +738,7 @@ def get_life_interpretation(user_id: str, check_expired: bool = True) -> str:
             if not entry:
                 return "❌ 未找到本人的信息"
 
-            if not entry.life_interpretation:
+            if not entry.life_interpretation_version:
                 return "📋 尚未生成人生解读报告，请先生成报告"
 
             # 检查是否过期（3个月缓存）
@@ -597,7 +747,9 @@ def get_life_interpretation(user_id: str, check_expired: bool = True) -> str:
                 if datetime.utcnow() > expired_time:
                     return "📋 人生解读报告已过期（缓存3个月），请重新生成"
 
-            interpretation = entry.life_interpretation
+            interpretation = profile_report_store.load_current(session, entry, LIFE_INTERPRETATION)
+            if not interpretation:
+                return "📋 尚未生成人生解读报告，请先生成报告"
 
             # 格式化输出
             result = f"📚 **{entry.name} 的人生解读**\n\n"
@@ -634,6 +786,11 @@ def get_life_interpretation(user_id: str, check_expired: bool = True) -> str:
                     result += f"{interpretation['fate_features']}\n"
                 result += "\n"
 
+            report_cache.set(
+                LIFE_INTERPRETATION, user_id,
+                generated_at=entry.life_interpretation_generated_at,
+                text=result
+            )
             return result
 
     except Exception as e:
@@ -641,6 +798,7 @@ def get_life_interpretation(user_id: str, check_expired: bool = True) -> str:
         return f"❌ 获取失败：{str(e)}"
 
 
+@async_db_tool
 @tool
 def save_career_trend(user_id: str, career_trend: dict) -> str:
     """
@@ -672,10 +830,10 @@ def save_career_trend(user_id: str, career_trend: dict) -> str:
             if not entry.job_title or not entry.job_level:
                 return "⚠️ 请先录入职场信息（职位类型、职级）后再生成职场大势报告"
 
-            entry.career_trend = career_trend
-            entry.career_trend_generated_at = datetime.utcnow()
+            profile_report_store.save(session, entry, CAREER_TREND, career_trend)
             entry.updated_at = datetime.utcnow()
             session.commit()
+            report_cache.invalidate(CAREER_TREND, user_id)
 
             logger.info(f"✅ 成功保存用户 {entry.name} 的职场大势报告")
 
@@ -686,6 +844,7 @@ def save_career_trend(user_id: str, career_trend: dict) -> str:
         return f"❌ 保存失败：{str(e)}"
 
 
+@async_db_tool
 @tool
 def get_career_trend(user_id: str, check_expired: bool = True) -> str:
     """
@@ -700,6 +859,11 @@ def get_career_trend(user_id: str, check_expired: bool = True) -> str:
     try:
         from datetime import timedelta
 
+        # 缓存条目在报告过期前有效，命中即为未过期的报告
+        cached = report_cache.get(CAREER_TREND, user_id)
+        if cached:
+            return cached[1]
+
         with get_session() as session:
             entry = session.query(UserProfile).filter(
                 UserProfile.user_id == user_id,
@@ -709,7 +873,7 @@ def get_career_trend(user_id: str, check_expired: bool = True) -> str:
             if not entry:
                 return "❌ 未找到本人的信息"
 
-            if not entry.career_trend:
+            if not entry.career_trend_version:
                 return "📋 尚未生成职场大势报告，请先生成报告"
 
             # 检查是否过期（3个月缓存）
@@ -718,7 +882,9 @@ def get_career_trend(user_id: str, check_expired: bool = True) -> str:
                 if datetime.utcnow() > expired_time:
                     return "📋 职场大势报告已过期（缓存3个月），请重新生成"
 
-            trend = entry.career_trend
+            trend = profile_report_store.load_current(session, entry, CAREER_TREND)
+            if not trend:
+                return "📋 尚未生成职场大势报告，请先生成报告"
 
             # 格式化输出
             result = f"💼 **{entry.name} 的职场大势**\n\n"
@@ -750,6 +916,11 @@ def get_career_trend(user_id: str, check_expired: bool = True) -> str:
                 result += "### 📈 职场运势走势图\n"
                 result += "（走势图数据已保存，可生成可视化图表）\n\n"
 
+            report_cache.set(
+                CAREER_TREND, user_id,
+                generated_at=entry.career_trend_generated_at,
+                text=result
+            )
             return result
 
     except Exception as e:
@@ -757,6 +928,7 @@ def get_career_trend(user_id: str, check_expired: bool = True) -> str:
         return f"❌ 获取失败：{str(e)}"
 
 
+@async_db_tool
 @tool
 def save_daily_report(user_id: str, report_date: str, report_data: dict) -> str:
     """
@@ -798,6 +970,7 @@ def save_daily_report(user_id: str, report_date: str, report_data: dict) -> str:
                     if hasattr(existing_report, key):
                         setattr(existing_report, key, value)
                 session.commit()
+                report_cache.invalidate(DAILY_REPORT, user_id, report_date)
                 logger.info(f"✅ 成功更新用户 {report_date} 的每日报告")
                 return f"✅ 成功更新 {report_date} 的每日报告！"
 
@@ -823,6 +996,7 @@ def save_daily_report(user_id: str, report_date: str, report_data: dict) -> str:
             )
             session.add(report)
             session.commit()
+            report_cache.invalidate(DAILY_REPORT, user_id, report_date)
 
             logger.info(f"✅ 成功保存用户 {report_date} 的每日报告")
 
@@ -833,6 +1007,7 @@ def save_daily_report(user_id: str, report_date: str, report_data: dict) -> str:
         return f"❌ 保存失败：{str(e)}"
 
 
+@async_db_tool
 @tool
 def get_daily_report(user_id: str, report_date: str = "", check_expired: bool = True) -> str:
     """
@@ -848,11 +1023,16 @@ def get_daily_report(user_id: str, report_date: str = "", check_expired: bool =
     try:
         from datetime import date, timedelta
 
-        with get_session() as session:
-            # 如果没有指定日期，使用今天
-            if not report_date:
-                report_date = date.today().strftime("%Y-%m-%d")
+        # 如果没有指定日期，使用今天
+        if not report_date:
+            report_date = date.today().strftime("%Y-%m-%d")
 
+        # 缓存条目在创建后1天内有效，与过期判断一致
+        cached = report_cache.get(DAILY_REPORT, user_id, report_date)
+        if cached:
+            return cached[1]
+
+        with get_session() as session:
             report = session.query(DailyReport).filter(
                 DailyReport.user_id == user_id,
                 DailyReport.report_date == report_date
@@ -935,6 +1115,12 @@ def get_daily_report(user_id: str, report_date: str = "", check_expired: bool =
             if report.fashion_trends:
                 result += f"**当前流行趋势**: 已收录最新流行元素\n\n"
 
+            if report.created_at:
+                report_cache.set(
+                    DAILY_REPORT, user_id, report_date,
+                    generated_at=report.created_at,
+                    text=result
+                )
             return result
 
     except Exception as e:
@@ -942,6 +1128,7 @@ def get_daily_report(user_id: str, report_date: str = "", check_expired: bool =
         return f"❌ 获取失败：{str(e)}"
 
 
+@async_db_tool
 @tool
 def save_user_photo(user_id: str, photo_url: str) -> str:
     """
@@ -977,6 +1164,7 @@ def save_user_photo(user_id: str, photo_url: str) -> str:
         return f"❌ 保存失败：{str(e)}"
 
 
+@async_db_tool
 @tool
 def check_user_info_exists(user_id: str) -> str:
     """
@@ -0,0 +1,208 @@
+"""
+联网搜索客户端
+所有工具共用的融合信息搜索 API 客户端：连接池复用（keep-alive）、按次超时、带抖动退避的重试
+"""
+import logging
+import os
+import random
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from cozeloop.decorator import observe
+from coze_coding_utils.runtime_ctx.context import Context, default_headers
+
+from storage.cache.search_cache import (
+    search_cache, make_cache_key, SEARCH_CACHE_ENABLED, SEARCH_TYPE_TTLS, DEFAULT_SEARCH_TTL
+)
+
+logger = logging.getLogger(__name__)
+
+# 连接池大小（同一 host 的最大保活连接数）
+SEARCH_POOL_SIZE = int(os.getenv("SEARCH_POOL_SIZE", "32"))
+# 超时（秒）：建连 / 读取
+SEARCH_CONNECT_TIMEOUT = float(os.getenv("SEARCH_CONNECT_TIMEOUT", "3"))
+SEARCH_READ_TIMEOUT = float(os.getenv("SEARCH_READ_TIMEOUT", "20"))
+# 失败重试次数（不含首次请求）及退避参数（秒）
+SEARCH_MAX_RETRIES = int(os.getenv("SEARCH_MAX_RETRIES", "2"))
+SEARCH_BACKOFF_BASE = 0.2
+SEARCH_BACKOFF_MAX = 2.0
+
+# 可重试的 HTTP 状态码
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class SearchClient:
+    """融合信息搜索 API 客户端，进程内共享一个 requests.Session"""
+
+    def __init__(
+        self,
+        pool_size: int = SEARCH_POOL_SIZE,
+        connect_timeout: float = SEARCH_CONNECT_TIMEOUT,
+        read_timeout: float = SEARCH_READ_TIMEOUT,
+        max_retries: int = SEARCH_MAX_RETRIES,
+    ):
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.session = requests.Session()
+        # 重试由本类自行处理（需要抖动退避且区分业务错误），适配器层不重试
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    @staticmethod
+    def _backoff(attempt: int) -> float:
+        """全抖动指数退避：[0, min(max, base * 2^attempt)]"""
+        return random.uniform(0, min(SEARCH_BACKOFF_MAX, SEARCH_BACKOFF_BASE * (2 ** attempt)))
+
+    def post(self, url: str, payload: Dict[str, Any], headers: Dict[str, str],
+             timeout: Optional[Tuple[float, float]] = None) -> Dict[str, Any]:
+        """发送 POST 请求并返回 JSON，网络错误和可重试状态码会按退避策略重试"""
+        last_error: Optional[Exception] = None
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self.session.post(url, json=payload, headers=headers, timeout=timeout or self.timeout) as response:
+                    if response.status_code in RETRYABLE_STATUS and attempt < self.max_retries:
+                        last_error = requests.HTTPError(f"HTTP {response.status_code}", response=response)
+                    else:
+                        response.raise_for_status()
+                        return response.json()
+            except (requests.ConnectionError, requests.Timeout) as e:
+                last_error = e
+                if attempt >= self.max_retries:
+                    raise
+
+            delay = self._backoff(attempt)
+            logger.warning(f"⚠️ 搜索请求失败，{delay:.2f}秒后重试（{attempt + 1}/{self.max_retries}）: {last_error}")
+            time.sleep(delay)
+
+        raise last_error
+
+    def web_search(
+        self,
+        ctx: Context,
+        query: str,
+        search_type: str = "web",
+        count: Optional[int] = 10,
+        need_content: Optional[bool] = False,
+        need_url: Optional[bool] = False,
+        sites: Optional[str] = None,
+        block_hosts: Optional[str] = None,
+        need_summary: Optional[bool] = True,
+        time_range: Optional[str] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str], Dict[str, Any]]:
+        """
+        融合信息搜索API，返回搜索结果项列表、搜索结果内容总结和原始响应数据。
+        """
+        api_key = os.getenv("COZE_WORKLOAD_IDENTITY_API_KEY")
+        base_url = os.getenv("COZE_INTEGRATION_BASE_URL")
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {api_key}",
+        }
+        headers.update(default_headers(ctx))
+        request = {
+            "Query": query,
+            "SearchType": search_type,
+            "Count": count,
+            "Filter": {
+                "NeedContent": need_content,
+                "NeedUrl": need_url,
+                "Sites": sites,
+                "BlockHosts": block_hosts,
+            },
+            "NeedSummary": need_summary,
+            "TimeRange": time_range,
+        }
+        try:
+            data = self.post(f'{base_url}/api/search_api/web_search', request, headers)
+
+            response_metadata = data.get("ResponseMetadata", {})
+            result = data.get("Result", {})
+            if response_metadata.get("Error"):
+                raise Exception(f"web_search 失败: {response_metadata.get('Error')}")
+
+            web_items = []
+            if result.get("WebResults"):
+                web_items = result.get("WebResults", [])
+
+            content = None
+            if result.get("Choices"):
+                content = result.get("Choices", [{}])[0].get("Message", {}).get("Content", "")
+
+            return web_items, content, result
+        except requests.RequestException as e:
+            raise Exception(f"网络请求失败: {str(e)}")
+        except Exception as e:
+            raise Exception(f"web_search 失败: {str(e)}")
+
+
+# 全局单例
+search_client = SearchClient()
+
+
+@observe
+def web_search(
+    ctx: Context,
+    query: str,
+    search_type: str = "web",
+    count: Optional[int] = 10,
+    need_content: Optional[bool] = False,
+    need_url: Optional[bool] = False,
+    sites: Optional[str] = None,
+    block_hosts: Optional[str] = None,
+    need_summary: Optional[bool] = True,
+    time_range: Optional[str] = None,
+    cache_ttl: Optional[int] = None,
+):
+    """
+    融合信息搜索API，返回搜索结果项列表、搜索结果内容总结和原始响应数据。
+
+    结果按归一化查询缓存，有效期默认取 SEARCH_TYPE_TTLS；时效性强的查询（如天气）
+    可通过 cache_ttl 缩短，cache_ttl=0 表示不使用缓存。
+    """
+    ttl = SEARCH_TYPE_TTLS.get(search_type, DEFAULT_SEARCH_TTL) if cache_ttl is None else cache_ttl
+    use_cache = SEARCH_CACHE_ENABLED and ttl > 0
+    if use_cache:
+        key = make_cache_key(
+            query, search_type, count, need_summary,
+            need_content=need_content, need_url=need_url,
+            sites=sites, block_hosts=block_hosts, time_range=time_range,
+        )
+        cached = search_cache.get(key)
+        if cached is not None:
+            return cached["web_items"], cached["content"], cached["result"]
+
+    web_items, content, result = search_client.web_search(
+        ctx,
+        query,
+        search_type=search_type,
+        count=count,
+        need_content=need_content,
+        need_url=need_url,
+        sites=sites,
+        block_hosts=block_hosts,
+        need_summary=need_summary,
+        time_range=time_range,
+    )
+
+    if use_cache:
+        search_cache.set(key, query, search_type, {
+            "web_items": web_items,
+            "content": content,
+            "result": result,
+        }, ttl)
+    return web_items, content, result
+
+
+def web_search_summary(
+    ctx: Context,
+    query: str,
+    search_type: str = "web",
+    count: int = 10,
+    need_summary: bool = True,
+) -> Optional[str]:
+    """联网搜索，只返回搜索结果内容总结"""
+    _, content, _ = web_search(ctx, query, search_type=search_type, count=count, need_summary=need_summary)
+    return content
@@ -2,12 +2,20 @@
 消耗限制工具
 提供消耗检查和记录功能，防止资源过度消耗
 """
+import atexit
 import logging
+import os
+import threading
+import time
+from collections import defaultdict
 from datetime import datetime, date
-from typing import Optional
+from typing import Dict, Optional, Tuple
 from langchain.tools import tool
+from sqlalchemy import and_, func, literal, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
 from storage.database.db import get_session
+from tools.async_db_tool import async_db_tool
 from storage.database.shared.model import UserAccount, UserDailyUsage, GlobalDailyUsage
 
 logger = logging.getLogger(__name__)
@@ -18,7 +26,217 @@ USAGE_LIMITS = {
     "user_daily_limit": 300,     # 单用户每日消耗限制
 }
 
+# 全局消耗分片计数（可选）：开启后全局消耗先在进程内累加，由后台线程批量刷写到数据库
+GLOBAL_COUNTER_ENABLED = os.getenv("USAGE_GLOBAL_BATCH_FLUSH", "0") == "1"
+GLOBAL_COUNTER_SHARDS = 16
+GLOBAL_COUNTER_FLUSH_INTERVAL = float(os.getenv("USAGE_GLOBAL_FLUSH_INTERVAL", "1.0"))  # 秒
+GLOBAL_COUNTER_FLUSH_THRESHOLD = 100  # 未刷写增量达到该值时立即刷写
+
+# check_all_limits 进程内缓存有效期（秒），多实例部署时即为计数的最大滞后
+LIMIT_CACHE_TTL = float(os.getenv("USAGE_LIMIT_CACHE_TTL", "5.0"))
+
+
+def _upsert_user_usage(session, user_id: str, day: str, amount: int, now: datetime) -> int:
+    """原子累加用户当日消耗，返回累加后的值"""
+    stmt = pg_insert(UserDailyUsage).values(
+        user_id=user_id,
+        date=day,
+        usage=amount,
+        updated_at=now
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[UserDailyUsage.user_id, UserDailyUsage.date],
+        set_={
+            "usage": UserDailyUsage.usage + stmt.excluded.usage,
+            "updated_at": stmt.excluded.updated_at,
+        }
+    ).returning(UserDailyUsage.usage)
+    return session.execute(stmt).scalar_one()
+
+
+def _upsert_global_usage(session, day: str, amount: int, now: datetime) -> int:
+    """原子累加全局当日消耗，返回累加后的值"""
+    stmt = pg_insert(GlobalDailyUsage).values(
+        date=day,
+        total_usage=amount,
+        updated_at=now
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[GlobalDailyUsage.date],
+        set_={
+            "total_usage": GlobalDailyUsage.total_usage + stmt.excluded.total_usage,
+            "updated_at": stmt.excluded.updated_at,
+        }
+    ).returning(GlobalDailyUsage.total_usage)
+    return session.execute(stmt).scalar_one()
+
+
+class _ShardedGlobalCounter:
+    """
+    进程内分片的全局消耗计数器
+
+    每次 record_usage 只在本线程对应的分片上累加增量，不再争用数据库中当天那一行；
+    后台线程按固定间隔（或增量超过阈值时）把各分片增量汇总成一次 upsert 写入。
+    代价是全局消耗的数据库值最多滞后一个刷写间隔，进程退出时会做最后一次刷写。
+    """
 
+    def __init__(self, shards: int, flush_interval: float, flush_threshold: int):
+        self._shards = [(threading.Lock(), defaultdict(int)) for _ in range(shards)]
+        self._flush_interval = flush_interval
+        self._flush_threshold = flush_threshold
+        self._flush_lock = threading.Lock()
+        self._flush_event = threading.Event()
+        self._flushed_totals: Dict[str, int] = {}
+        self._pending = 0
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="usage-counter-flush", daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def add(self, day: str, amount: int) -> int:
+        """累加增量，返回当日全局消耗的估计值（已刷写值 + 未刷写增量）"""
+        self._ensure_started()
+        lock, deltas = self._shards[threading.get_ident() % len(self._shards)]
+        with lock:
+            deltas[day] += amount
+        self._pending += amount  # 仅用于触发刷写，允许不精确
+        if self._pending >= self._flush_threshold:
+            self._flush_event.set()
+        return self._flushed_totals.get(day, 0) + self.pending(day)
+
+    def pending(self, day: str) -> int:
+        """当日尚未刷写到数据库的增量"""
+        total = 0
+        for lock, deltas in self._shards:
+            with lock:
+                total += deltas.get(day, 0)
+        return total
+
+    def flush(self):
+        """把所有分片的增量合并后写入数据库，失败时增量放回分片等待下次刷写"""
+        with self._flush_lock:
+            merged: Dict[str, int] = defaultdict(int)
+            for lock, deltas in self._shards:
+                with lock:
+                    for day, delta in deltas.items():
+                        merged[day] += delta
+                    deltas.clear()
+            self._pending = 0
+            if not merged:
+                return
+
+            try:
+                with get_session() as session:
+                    now = datetime.utcnow()
+                    totals = {
+                        day: _upsert_global_usage(session, day, delta, now)
+                        for day, delta in merged.items() if delta
+                    }
+                    session.commit()
+                self._flushed_totals = totals
+            except Exception as e:
+                logger.error(f"❌ 全局消耗批量刷写失败: {e}")
+                lock, deltas = self._shards[0]
+                with lock:
+                    for day, delta in merged.items():
+                        deltas[day] += delta
+
+    def _run(self):
+        while True:
+            self._flush_event.wait(self._flush_interval)
+            self._flush_event.clear()
+            self.flush()
+
+
+_global_counter: Optional[_ShardedGlobalCounter] = (
+    _ShardedGlobalCounter(GLOBAL_COUNTER_SHARDS, GLOBAL_COUNTER_FLUSH_INTERVAL, GLOBAL_COUNTER_FLUSH_THRESHOLD)
+    if GLOBAL_COUNTER_ENABLED else None
+)
+
+
+def _pending_global_usage(day: str) -> int:
+    """分片计数器中尚未刷写的全局消耗（未开启时为0）"""
+    return _global_counter.pending(day) if _global_counter is not None else 0
+
+
+# 限额缓存
+# 用户：user_id -> (过期时间, 日期, 是否管理员, 用户名, 用户今日消耗)
+# 全局：日期 -> (过期时间, 全局今日消耗)
+_user_limit_cache: Dict[str, Tuple[float, str, bool, Optional[str], int]] = {}
+_global_limit_cache: Dict[str, Tuple[float, int]] = {}
+_limit_cache_lock = threading.Lock()
+
+
+def _get_cached_limits(user_id: str, day: str) -> Optional[Tuple[bool, Optional[str], int, int]]:
+    """命中时返回 (是否管理员, 用户名, 用户今日消耗, 全局今日消耗)"""
+    now = time.monotonic()
+    user_entry = _user_limit_cache.get(user_id)
+    if not user_entry or user_entry[0] < now or user_entry[1] != day:
+        return None
+    _, _, is_admin, username, user_usage = user_entry
+    if is_admin:
+        return is_admin, username, user_usage, 0
+    global_entry = _global_limit_cache.get(day)
+    if not global_entry or global_entry[0] < now:
+        return None
+    return is_admin, username, user_usage, global_entry[1]
+
+
+def _set_cached_limits(user_id: str, day: str, is_admin: bool, username: Optional[str],
+                       user_usage: int, global_usage: int):
+    expires_at = time.monotonic() + LIMIT_CACHE_TTL
+    with _limit_cache_lock:
+        _user_limit_cache[user_id] = (expires_at, day, is_admin, username, user_usage)
+        _global_limit_cache[day] = (expires_at, global_usage)
+
+
+def _invalidate_limit_cache(user_id: str, day: str, global_usage: Optional[int] = None):
+    """record_usage 之后调用：丢弃该用户的缓存；已知最新全局消耗时直接写回，避免所有用户同时失效"""
+    with _limit_cache_lock:
+        _user_limit_cache.pop(user_id, None)
+        if global_usage is None:
+            _global_limit_cache.pop(day, None)
+        else:
+            _global_limit_cache[day] = (time.monotonic() + LIMIT_CACHE_TTL, global_usage)
+
+
+def _query_limits(session, user_id: str, day: str) -> Tuple[bool, Optional[str], int, int]:
+    """
+    一条语句查询管理员标识、用户今日消耗和全局今日消耗
+
+    以参数 CTE 为驱动表 LEFT JOIN 三张表，记录不存在时按0处理，不再为此插入空行。
+    """
+    params = select(
+        literal(user_id).label("user_id"),
+        literal(day).label("day")
+    ).cte("params")
+    stmt = (
+        select(
+            UserAccount.is_admin,
+            UserAccount.username,
+            func.coalesce(UserDailyUsage.usage, 0),
+            func.coalesce(GlobalDailyUsage.total_usage, 0),
+        )
+        .select_from(params)
+        .outerjoin(UserAccount, UserAccount.user_id == params.c.user_id)
+        .outerjoin(
+            UserDailyUsage,
+            and_(UserDailyUsage.user_id == params.c.user_id, UserDailyUsage.date == params.c.day)
+        )
+        .outerjoin(GlobalDailyUsage, GlobalDailyUsage.date == params.c.day)
+    )
+    is_admin, username, user_usage, global_usage = session.execute(stmt).one()
+    return bool(is_admin), username, user_usage, global_usage
+
+
+@async_db_tool
 @tool
 def check_global_usage_limit(
     user_id: str
@@ -48,7 +266,7 @@ def check_global_usage_limit(
                 session.add(global_usage)
                 session.commit()
 
-            current_usage = global_usage.total_usage
+            current_usage = global_usage.total_usage + _pending_global_usage(today)
             limit = USAGE_LIMITS["global_daily_limit"]
             remaining = limit - current_usage
 
@@ -77,6 +295,7 @@ def check_global_usage_limit(
         return f"❌ 检查失败：{str(e)}"
 
 
+@async_db_tool
 @tool
 def check_user_usage_limit(
     user_id: str
@@ -149,6 +368,7 @@ def check_user_usage_limit(
         return f"❌ 检查失败：{str(e)}"
 
 
+@async_db_tool
 @tool
 def record_usage(
     user_id: str,
@@ -173,43 +393,33 @@ def record_usage(
 
         with get_session() as session:
             today = date.today().strftime("%Y-%m-%d")
+            now = datetime.utcnow()
 
-            # 1. 更新全局消耗
-            global_usage = session.query(GlobalDailyUsage).filter_by(date=today).first()
-            if not global_usage:
-                global_usage = GlobalDailyUsage(
-                    date=today,
-                    total_usage=0,
-                    updated_at=datetime.utcnow()
-                )
-                session.add(global_usage)
+            # 1. 更新用户消耗：按 (user_id, date) 原子累加
+            user_total = _upsert_user_usage(session, user_id, today, amount, now)
 
-            global_usage.total_usage += amount
-            global_usage.updated_at = datetime.utcnow()
+            # 2. 更新全局消耗：未开启分片计数时同一事务内原子累加
+            global_total = None
+            if _global_counter is None:
+                global_total = _upsert_global_usage(session, today, amount, now)
 
-            # 2. 更新用户消耗
-            user_usage = session.query(UserDailyUsage).filter_by(user_id=user_id, date=today).first()
-            if not user_usage:
-                user_usage = UserDailyUsage(
-                    user_id=user_id,
-                    date=today,
-                    usage=0,
-                    updated_at=datetime.utcnow()
-                )
-                session.add(user_usage)
+            session.commit()
 
-            user_usage.usage += amount
-            user_usage.updated_at = datetime.utcnow()
+        # 开启分片计数时，全局消耗只在进程内累加，由后台线程批量刷写
+        if global_total is None:
+            global_total = _global_counter.add(today, amount)
 
-            session.commit()
+        # 缓存中只保存刚从数据库 upsert 返回的全局消耗；分片计数时本进程的已刷写值不含其他进程的增量，
+        # 不能回写缓存，直接失效，下次检查时重新从数据库读取
+        _invalidate_limit_cache(user_id, today, global_total if _global_counter is None else None)
 
-            logger.info(f"✅ 消耗记录成功 | 用户: {user_id} | 消耗: {amount}")
-            return f"""✅ 消耗记录成功
+        logger.info(f"✅ 消耗记录成功 | 用户: {user_id} | 消耗: {amount}")
+        return f"""✅ 消耗记录成功
 
 **用户ID**: {user_id}
 **消耗数量**: {amount}
-**用户今日消耗**: {user_usage.usage}
-**全局今日消耗**: {global_usage.total_usage}
+**用户今日消耗**: {user_total}
+**全局今日消耗**: {global_total}
 """
 
 
@@ -218,6 +428,7 @@ def record_usage(
         return f"❌ 记录失败：{str(e)}"
 
 
+@async_db_tool
 @tool
 def get_usage_statistics(
     admin_user_id: str,
@@ -284,6 +495,7 @@ def get_usage_statistics(
         return f"❌ 查询失败：{str(e)}"
 
 
+@async_db_tool
 @tool
 def check_all_limits(
     user_id: str
@@ -297,70 +509,55 @@ def check_all_limits(
     返回：检查结果
     """
     try:
-        with get_session() as session:
-            # 检查是否为管理员
-            user = session.query(UserAccount).filter_by(user_id=user_id).first()
-            if user and user.is_admin:
-                return f"""✅ 管理员账户，无任何限制
+        today = date.today().strftime("%Y-%m-%d")
 
-**用户ID**: {user_id}
-**用户名**: {user.username}
-"""
+        # 1. 优先读取进程内缓存，未命中时一条语句查询并回填
+        cached = _get_cached_limits(user_id, today)
+        if cached is None:
+            with get_session() as session:
+                cached = _query_limits(session, user_id, today)
+            _set_cached_limits(user_id, today, *cached)
+        is_admin, username, user_usage, global_usage = cached
 
-            today = date.today().strftime("%Y-%m-%d")
+        # 2. 管理员无限制
+        if is_admin:
+            return f"""✅ 管理员账户，无任何限制
 
-            # 1. 检查全局消耗
-            global_usage = session.query(GlobalDailyUsage).filter_by(date=today).first()
-            if not global_usage:
-                global_usage = GlobalDailyUsage(
-                    date=today,
-                    total_usage=0,
-                    updated_at=datetime.utcnow()
-                )
-                session.add(global_usage)
-                session.commit()
+**用户ID**: {user_id}
+**用户名**: {username}
+"""
 
-            # 2. 检查用户消耗
-            user_usage = session.query(UserDailyUsage).filter_by(user_id=user_id, date=today).first()
-            if not user_usage:
-                user_usage = UserDailyUsage(
-                    user_id=user_id,
-                    date=today,
-                    usage=0,
-                    updated_at=datetime.utcnow()
-                )
-                session.add(user_usage)
-                session.commit()
+        global_usage += _pending_global_usage(today)
 
-            # 3. 检查是否超限
-            global_limit = USAGE_LIMITS["global_daily_limit"]
-            user_limit = USAGE_LIMITS["user_daily_limit"]
+        # 3. 检查是否超限
+        global_limit = USAGE_LIMITS["global_daily_limit"]
+        user_limit = USAGE_LIMITS["user_daily_limit"]
 
-            if global_usage.total_usage >= global_limit:
-                logger.warning(f"⚠️ 全局消耗已超限 | 用户: {user_id}")
-                return f"""❌ 全局消耗已超限
+        if global_usage >= global_limit:
+            logger.warning(f"⚠️ 全局消耗已超限 | 用户: {user_id}")
+            return f"""❌ 全局消耗已超限
 
-**今日总消耗**: {global_usage.total_usage}
+**今日总消耗**: {global_usage}
 **消耗限制**: {global_limit}
 **提示**: 当日访问已超限，请明天再来
 """
 
-            if user_usage.usage >= user_limit:
-                logger.warning(f"⚠️ 用户消耗已超限 | 用户: {user_id}")
-                return f"""❌ 用户消耗已超限
+        if user_usage >= user_limit:
+            logger.warning(f"⚠️ 用户消耗已超限 | 用户: {user_id}")
+            return f"""❌ 用户消耗已超限
 
 **用户ID**: {user_id}
-**今日消耗**: {user_usage.usage}
+**今日消耗**: {user_usage}
 **消耗限制**: {user_limit}
 **提示**: 当日访问已超限，请明天再来
 """
 
-            # 未超限，返回状态
-            return f"""✅ 访问正常
+        # 未超限，返回状态
+        return f"""✅ 访问正常
 
 **用户ID**: {user_id}
-**用户今日消耗**: {user_usage.usage}/{user_limit}
-**全局今日消耗**: {global_usage.total_usage}/{global_limit}
+**用户今日消耗**: {user_usage}/{user_limit}
+**全局今日消耗**: {global_usage}/{global_limit}
 **状态**: 可以正常访问
 """
 
@@ -1,74 +1,9 @@
-import os
-from typing import Optional, Any
+from typing import Any
 from langchain.tools import tool
-from cozeloop.decorator import observe
-from coze_coding_utils.runtime_ctx.context import Context
-
-
-@observe
-def web_search(
-    ctx: Context,
-    query: str,
-    search_type: str = "web",
-    count: Optional[int] = 10,
-    need_content: Optional[bool] = False,
-    need_url: Optional[bool] = False,
-    sites: Optional[str] = None,
-    block_hosts: Optional[str] = None,
-    need_summary: Optional[bool] = True,
-    time_range: Optional[str] = None,
-):
-    """
-    融合信息搜索API，返回搜索结果项列表、搜索结果内容总结和原始响应数据。
-    """
-    import requests
-    from coze_coding_utils.runtime_ctx.context import default_headers
-
-    api_key = os.getenv("COZE_WORKLOAD_IDENTITY_API_KEY")
-    base_url = os.getenv("COZE_INTEGRATION_BASE_URL")
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {api_key}",
-    }
-    headers.update(default_headers(ctx))
-    request = {
-        "Query": query,
-        "SearchType": search_type,
-        "Count": count,
-        "Filter": {
-            "NeedContent": need_content,
-            "NeedUrl": need_url,
-            "Sites": sites,
-            "BlockHosts": block_hosts,
-        },
-        "NeedSummary": need_summary,
-        "TimeRange": time_range,
-    }
-    try:
-        response = requests.post(f'{base_url}/api/search_api/web_search', json=request, headers=headers)
-        response.raise_for_status()
-        data = response.json()
-
-        response_metadata = data.get("ResponseMetadata", {})
-        result = data.get("Result", {})
-        if response_metadata.get("Error"):
-            raise Exception(f"web_search 失败: {response_metadata.get('Error')}")
-
-        web_items = []
-        if result.get("WebResults"):
-            web_items = result.get("WebResults", [])
-        
-        content = None
-        if result.get("Choices"):
-            content = result.get("Choices", [{}])[0].get("Message", {}).get("Content", "")
-        
-        return web_items, content, result
-    except requests.RequestException as e:
-        raise Exception(f"网络请求失败: {str(e)}")
-    except Exception as e:
-        raise Exception(f"web_search 失败: {str(e)}")
-    finally:
-        response.close()
+from tools.search_client import web_search
+
+# 天气搜索结果时效性强，缓存有效期单独缩短（秒）
+WEATHER_CACHE_TTL = 1800
 
 
 @tool
@@ -83,8 +18,11 @@ def get_weather(city: str, runtime: Any) -> str:
     Returns:
         天气信息字符串，包含温度、天气状况等
     """
-    ctx = runtime.context
-    
+    return _fetch_weather(runtime.context, city)
+
+
+def _fetch_weather(ctx, city: str) -> str:
+    """查询天气（供工具和每日报告流水线直接调用）"""
     # 构建搜索查询
     query = f"{city}今天天气 温度 穿搭"
     
@@ -94,7 +32,8 @@ def get_weather(city: str, runtime: Any) -> str:
             query=query,
             search_type="web_summary",
             count=5,
-            need_summary=True
+            need_summary=True,
+            cache_ttl=WEATHER_CACHE_TTL
         )
         
         # 构建返回结果
@@ -135,8 +74,11 @@ def dressing_advice(industry: str, weather: str, lucky_color: str, runtime: Any)
     Returns:
         穿搭建议字符串
     """
-    ctx = runtime.context
-    
+    return _fetch_dressing(runtime.context, industry, weather, lucky_color)
+
+
+def _fetch_dressing(ctx, industry: str, weather: str, lucky_color: str) -> str:
+    """获取穿搭建议（供工具和每日报告流水线直接调用）"""
     # 构建搜索查询
     query = f"{industry}行业 {weather}天气 职场穿搭"
     
@@ -0,0 +1,171 @@
+"""
+四柱八字排盘
+根据公历出生时间离线计算年/月/日/时四柱和五行统计，不依赖外部接口
+
+- 节气：导入时按太阳视黄经算出 1899-2100 年每年 12 个"节"（小寒、立春……大雪）的北京时间，
+  以分钟数存放在一个 array('i') 中（约 2400 项），排盘时二分查找，单次计算为微秒级；
+  多算 1899 年是为了覆盖 1900 年小寒之前的几天（仍属 1899 年大雪所在的子月）
+- 年柱以立春为界，月柱以节为界，日柱按 1900-01-01（甲戌日）起算，
+  23 点之后按次日子时计
+"""
+import bisect
+import math
+from array import array
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, Tuple
+
+HEAVENLY_STEMS = "甲乙丙丁戊己庚辛壬癸"
+EARTHLY_BRANCHES = "子丑寅卯辰巳午未申酉戌亥"
+# 六十甲子
+SEXAGENARY_CYCLE: Tuple[str, ...] = tuple(
+    HEAVENLY_STEMS[i % 10] + EARTHLY_BRANCHES[i % 12] for i in range(60)
+)
+
+# 五行：天干、地支按下标对应
+STEM_ELEMENTS = "木木火火土土金金水水"
+BRANCH_ELEMENTS = "水土木木土火火土金金土水"
+FIVE_ELEMENTS = "金木水火土"
+
+_BEIJING_OFFSET = timedelta(hours=8)
+_UNIX_EPOCH = datetime(1970, 1, 1)
+_J2000 = 2451545.0
+# 12 个节的太阳视黄经（度），下标 0 为小寒
+_JIE_LONGITUDES = tuple((285 + 30 * k) % 360 for k in range(12))
+
+MIN_YEAR = 1900
+MAX_YEAR = 2100
+# 节气表起始年份（比 MIN_YEAR 早一年）
+_TABLE_START_YEAR = MIN_YEAR - 1
+
+# 分钟数的起点（北京时间）
+_EPOCH = datetime(1900, 1, 1)
+# 1900-01-01 为甲戌日（六十甲子第 10 位）
+_EPOCH_DAY_INDEX = 10
+
+
+def _sun_apparent_longitude(jd: float) -> float:
+    """太阳视黄经（度），Meeus《天文算法》低精度公式，误差约 0.01°（约 15 分钟）"""
+    t = (jd - _J2000) / 36525
+    l0 = 280.46646 + 36000.76983 * t + 0.0003032 * t * t
+    m = math.radians(357.52911 + 35999.05029 * t - 0.0001537 * t * t)
+    c = ((1.914602 - 0.004817 * t - 0.000014 * t * t) * math.sin(m)
+         + (0.019993 - 0.000101 * t) * math.sin(2 * m)
+         + 0.000289 * math.sin(3 * m))
+    omega = math.radians(125.04 - 1934.136 * t)
+    return (l0 + c - 0.00569 - 0.00478 * math.sin(omega)) % 360
+
+
+def _solar_term_jd(year: int, jie: int) -> float:
+    """求指定年份第 jie 个节的交节时刻（儒略日，忽略 ΔT）"""
+    # 初值：小寒约在 1 月 6 日，此后每个节约隔 30.44 天
+    jd = 2440587.5 + ((datetime(year, 1, 6) - _UNIX_EPOCH).total_seconds() / 86400) + jie * 30.4368
+    target = _JIE_LONGITUDES[jie]
+    for _ in range(10):
+        diff = (target - _sun_apparent_longitude(jd) + 180) % 360 - 180
+        jd += diff / 0.9856  # 太阳平均每天运行约 0.9856°
+        if abs(diff) < 1e-6:
+            break
+    return jd
+
+
+def _build_jie_table() -> array:
+    """预计算每年 12 个节的交节时刻（北京时间，自 1900-01-01 起的分钟数）"""
+    table = array("i")
+    for year in range(_TABLE_START_YEAR, MAX_YEAR + 1):
+        for jie in range(12):
+            moment = _UNIX_EPOCH + timedelta(days=_solar_term_jd(year, jie) - 2440587.5) + _BEIJING_OFFSET
+            table.append(int((moment - _EPOCH).total_seconds() // 60))
+    return table
+
+
+_JIE_TABLE = _build_jie_table()
+
+
+@dataclass
+class FourPillars:
+    """四柱排盘结果"""
+    year: str
+    month: str
+    day: str
+    hour: str
+    five_elements: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def pillars(self) -> Tuple[str, str, str, str]:
+        return self.year, self.month, self.day, self.hour
+
+    def __str__(self) -> str:
+        return " ".join(self.pillars)
+
+    def missing_elements(self) -> Tuple[str, ...]:
+        return tuple(e for e in FIVE_ELEMENTS if not self.five_elements.get(e))
+
+    def format(self) -> str:
+        """格式化为报告中使用的排盘文本"""
+        counts = "、".join(f"{e}{self.five_elements.get(e, 0)}" for e in FIVE_ELEMENTS)
+        missing = self.missing_elements()
+        return (
+            f"年柱：{self.year}　月柱：{self.month}　日柱：{self.day}　时柱：{self.hour}\n"
+            f"五行统计：{counts}" + (f"（缺{''.join(missing)}）" if missing else "")
+        )
+
+
+def _count_elements(pillars: Tuple[str, ...]) -> Dict[str, int]:
+    counts = {e: 0 for e in FIVE_ELEMENTS}
+    for pillar in pillars:
+        counts[STEM_ELEMENTS[HEAVENLY_STEMS.index(pillar[0])]] += 1
+        counts[BRANCH_ELEMENTS[EARTHLY_BRANCHES.index(pillar[1])]] += 1
+    return counts
+
+
+def compute_four_pillars(year: int, month: int, day: int, hour: int = 12, minute: int = 0) -> FourPillars:
+    """
+    按公历出生时间（北京时间）排四柱
+
+    参数：
+    - year/month/day: 公历年月日（1900-2100）
+    - hour/minute: 出生时间，未知时默认午时
+
+    返回：FourPillars
+    """
+    birth = datetime(int(year), int(month), int(day), int(hour), int(minute))
+    if not MIN_YEAR <= birth.year <= MAX_YEAR:
+        raise ValueError(f"仅支持 {MIN_YEAR}-{MAX_YEAR} 年的出生日期")
+    minutes = int((birth - _EPOCH).total_seconds() // 60)
+
+    # 年柱、月柱：找到出生时刻之前最近的一个节
+    jie_index = bisect.bisect_right(_JIE_TABLE, minutes) - 1
+    jie_year = _TABLE_START_YEAR + jie_index // 12
+    jie = jie_index % 12  # 0=小寒 1=立春 ... 11=大雪
+
+    pillar_year = jie_year if jie >= 1 else jie_year - 1  # 立春前仍属上一年
+    year_index = (pillar_year - 4) % 60  # 1984 年为甲子年
+    year_stem = year_index % 10
+
+    month_branch = (jie + 1) % 12  # 小寒→丑，立春→寅，……，大雪→子
+    month_stem = (year_stem * 2 + 2 + (month_branch - 2) % 12) % 10  # 甲己之年丙作首
+    month_index = _cycle_index(month_stem, month_branch)
+
+    # 日柱：23 点后按次日子时
+    day_offset = (birth.date() - _EPOCH.date()).days + (1 if birth.hour >= 23 else 0)
+    day_index = (_EPOCH_DAY_INDEX + day_offset) % 60
+    day_stem = day_index % 10
+
+    # 时柱：甲己还加甲
+    hour_branch = ((birth.hour + 1) // 2) % 12
+    hour_stem = (day_stem * 2 + hour_branch) % 10
+    hour_index = _cycle_index(hour_stem, hour_branch)
+
+    pillars = (
+        SEXAGENARY_CYCLE[year_index],
+        SEXAGENARY_CYCLE[month_index],
+        SEXAGENARY_CYCLE[day_index],
+        SEXAGENARY_CYCLE[hour_index],
+    )
+    return FourPillars(*pillars, five_elements=_count_elements(pillars))
+
+
+def _cycle_index(stem: int, branch: int) -> int:
+    """由天干、地支下标求六十甲子下标（二者奇偶性一致）"""
+    return (6 * stem - 5 * branch) % 60
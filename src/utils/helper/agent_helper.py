@@ -1,7 +1,7 @@
 import uuid
 import json
 import os
-from typing import Any, Dict, List, Tuple, Iterator
+from typing import Any, AsyncIterator, Dict, List, Tuple, Iterator
 import time
 from utils.file.file import File, FileOps, infer_file_category
 
@@ -277,31 +277,41 @@ def _item_to_server_messages(
     return messages
 
 
-def _iter_body_to_server_messages(
-        items: Iterator[Dict[Any, Dict[str, Any]]],
-        *,
-        session_id: str,
-        query_msg_id: str,
-        reply_id: str,
-        sequence_id_start: int = 1,
-        log_id: str = "",
-) -> Iterator[ServerMessage]:
-    seq = sequence_id_start
-    # Stable msg_id mapping per logical message stream
-    # Keys are derived from meta to keep same msg_id across chunks
-    stable_ids: Dict[Tuple[str, Any], str] = {}
-
-    accumulated_tool_chunks: List[Any] = []
-    accumulated_tool_response_content: Dict[str, str] = {}
-
-    def _flush_tool_chunks(seq_num: int) -> Tuple[List[ServerMessage], int]:
-        nonlocal accumulated_tool_chunks
+class _BodyMessageConverter:
+    """
+    将 LangGraph messages 流中的单个 item 转换为 ServerMessage 列表。
+
+    同步流（graph.stream）与异步流（graph.astream）共用这一份状态机，
+    保证两种模式下的输出顺序、sequence_id 和 msg_id 分组完全一致。
+    """
+
+    def __init__(
+            self,
+            *,
+            session_id: str,
+            query_msg_id: str,
+            reply_id: str,
+            sequence_id_start: int = 1,
+            log_id: str = "",
+    ):
+        self.session_id = session_id
+        self.query_msg_id = query_msg_id
+        self.reply_id = reply_id
+        self.log_id = log_id
+        self.seq = sequence_id_start
+        # Stable msg_id mapping per logical message stream
+        # Keys are derived from meta to keep same msg_id across chunks
+        self.stable_ids: Dict[Tuple[str, Any], str] = {}
+        self.accumulated_tool_chunks: List[Any] = []
+        self.accumulated_tool_response_content: Dict[str, str] = {}
+
+    def _flush_tool_chunks(self) -> List[ServerMessage]:
         msgs: List[ServerMessage] = []
-        if not accumulated_tool_chunks:
-            return msgs, seq_num
+        if not self.accumulated_tool_chunks:
+            return msgs
 
-        merged_tcs = _merge_tool_call_chunks(accumulated_tool_chunks)
-        accumulated_tool_chunks = []
+        merged_tcs = _merge_tool_call_chunks(self.accumulated_tool_chunks)
+        self.accumulated_tool_chunks = []
         for tc in merged_tcs:
             raw_args = tc.get("args", {})
             if isinstance(raw_args, str):
@@ -326,20 +336,20 @@ def _iter_body_to_server_messages(
             msgs.append(
                 ServerMessage(
                     type=MESSAGE_TYPE_TOOL_REQUEST,
-                    session_id=session_id,
-                    query_msg_id=query_msg_id,
-                    reply_id=reply_id,
+                    session_id=self.session_id,
+                    query_msg_id=self.query_msg_id,
+                    reply_id=self.reply_id,
                     msg_id=str(uuid.uuid4()),
-                    sequence_id=seq_num,
+                    sequence_id=self.seq,
                     finish=True,
                     content=content,
-                    log_id=log_id,
+                    log_id=self.log_id,
                 )
             )
-            seq_num += 1
-        return msgs, seq_num
+            self.seq += 1
+        return msgs
 
-    for item in items:
+    def feed(self, item: Any) -> List[ServerMessage]:
         chunk, meta = item
         chunk_type = chunk.__class__.__name__
         is_last = (meta or {}).get("chunk_position") == "last"
@@ -349,36 +359,24 @@ def _iter_body_to_server_messages(
         flushed_msgs: List[ServerMessage] = []
 
         # 0. Flush accumulated tool chunks if we receive something that is NOT an AIMessageChunk
-        # OR if we receive an AIMessageChunk but it seems to be a new message (e.g. different id, though hard to track without state)
-        # Simplest logic: If we have accumulated chunks, and we get a non-AIMessageChunk, flush.
-        # Also, if we get an AIMessageChunk but it has no tool_call_chunks, it might be an answer chunk.
-        # We need to be careful not to flush prematurely if the next chunk IS a continuation.
-
-        # However, standard behavior: tool_call_chunks come in a contiguous sequence of AIMessageChunks.
+        # Standard behavior: tool_call_chunks come in a contiguous sequence of AIMessageChunks.
         # If we see a ToolMessage, we definitely must flush.
-        # If we see an AIMessageChunk with NO tool_call_chunks (e.g. text answer), we should probably flush too,
-        # because usually tool calls and text content are either separate or tool calls come first.
-        # But let's be safe: only flush on ToolMessage or if is_last=True on AIMessageChunk.
-
-        if chunk_type == "ToolMessage" and accumulated_tool_chunks:
-            f_msgs, seq = _flush_tool_chunks(seq)
-            flushed_msgs.extend(f_msgs)
+        if chunk_type == "ToolMessage" and self.accumulated_tool_chunks:
+            flushed_msgs.extend(self._flush_tool_chunks())
 
         # 1. Handle AIMessageChunk with tool_call_chunks (Streaming Tool Request)
         if chunk_type == "AIMessageChunk":
             tc_chunks = getattr(chunk, "tool_call_chunks", None)
             if tc_chunks:
-                accumulated_tool_chunks.extend(tc_chunks)
+                self.accumulated_tool_chunks.extend(tc_chunks)
             # If we have accumulated chunks but this chunk has NO tool_call_chunks,
             # it implies the tool definition phase is likely over.
-            elif accumulated_tool_chunks:
-                f_msgs, seq = _flush_tool_chunks(seq)
-                flushed_msgs.extend(f_msgs)
+            elif self.accumulated_tool_chunks:
+                flushed_msgs.extend(self._flush_tool_chunks())
 
             # Flush if this is the last chunk
-            if is_last and accumulated_tool_chunks:
-                f_msgs, seq = _flush_tool_chunks(seq)
-                flushed_msgs.extend(f_msgs)
+            if is_last and self.accumulated_tool_chunks:
+                flushed_msgs.extend(self._flush_tool_chunks())
 
         # 2. Handle ToolMessage (Tool Response)
         elif chunk_type == "ToolMessage":
@@ -392,12 +390,12 @@ def _iter_body_to_server_messages(
                 full_result = result
                 should_emit = True
             else:
-                if tcid not in accumulated_tool_response_content:
-                    accumulated_tool_response_content[tcid] = ""
-                accumulated_tool_response_content[tcid] += str(result)
+                if tcid not in self.accumulated_tool_response_content:
+                    self.accumulated_tool_response_content[tcid] = ""
+                self.accumulated_tool_response_content[tcid] += str(result)
 
                 if is_last:
-                    full_result = accumulated_tool_response_content.pop(tcid)
+                    full_result = self.accumulated_tool_response_content.pop(tcid)
                     should_emit = True
 
             if should_emit:
@@ -411,49 +409,36 @@ def _iter_body_to_server_messages(
                 msgs_to_yield.append(
                     ServerMessage(
                         type=MESSAGE_TYPE_TOOL_RESPONSE,
-                        session_id=session_id,
-                        query_msg_id=query_msg_id,
-                        reply_id=reply_id,
+                        session_id=self.session_id,
+                        query_msg_id=self.query_msg_id,
+                        reply_id=self.reply_id,
                         msg_id=str(uuid.uuid4()),
-                        sequence_id=seq,
+                        sequence_id=self.seq,
                         finish=True,
                         content=content,
-                        log_id=log_id,
+                        log_id=self.log_id,
                     )
                 )
-                seq += 1
+                self.seq += 1
 
         # 3. Call _item_to_server_messages for everything else
         if chunk_type != "ToolMessage":
             inner_msgs = _item_to_server_messages(
                 item,
-                session_id=session_id,
-                query_msg_id=query_msg_id,
-                reply_id=reply_id,
-                sequence_id_start=seq,
-                log_id=log_id,
+                session_id=self.session_id,
+                query_msg_id=self.query_msg_id,
+                reply_id=self.reply_id,
+                sequence_id_start=self.seq,
+                log_id=self.log_id,
             )
             # Combine: flushed (previous) + inner (current)
-            final_msgs = flushed_msgs + inner_msgs
-            msgs_to_yield.extend(final_msgs)
-            
+            msgs_to_yield.extend(flushed_msgs + inner_msgs)
+
             if inner_msgs:
-                seq = inner_msgs[-1].sequence_id + 1
+                self.seq = inner_msgs[-1].sequence_id + 1
         else:
-            # For ToolMessage, msgs_to_yield already contains the ToolResponse (from block 2).
-            # We need to prepend flushed_msgs (from block 0).
-            # Note: msgs_to_yield might contain ToolResponse or nothing (if not emitted yet).
-            # But flushed_msgs MUST come before whatever is in msgs_to_yield.
-            # However, msgs_to_yield is a list we are appending to.
-            # So we should insert flushed_msgs at the beginning?
-            # Or better, just construct a new list.
-            
-            # Current content of msgs_to_yield comes from block 2 (Tool Response).
-            # flushed_msgs comes from block 0 (Tool Requests flushed).
-            # Order: Tool Request -> Tool Response.
-            final_msgs = flushed_msgs + msgs_to_yield
-            msgs_to_yield = final_msgs
-
+            # Order: Tool Request (flushed) -> Tool Response.
+            msgs_to_yield = flushed_msgs + msgs_to_yield
 
         for m in msgs_to_yield:
             # Derive a stable grouping base for this item
@@ -480,13 +465,112 @@ def _iter_body_to_server_messages(
             else:
                 key = (m.type, group_base)
 
-            if key not in stable_ids:
-                stable_ids[key] = str(uuid.uuid4())
-            m.msg_id = stable_ids[key]
+            if key not in self.stable_ids:
+                self.stable_ids[key] = str(uuid.uuid4())
+            m.msg_id = self.stable_ids[key]
+
+        return msgs_to_yield
 
+
+def _iter_body_to_server_messages(
+        items: Iterator[Dict[Any, Dict[str, Any]]],
+        *,
+        session_id: str,
+        query_msg_id: str,
+        reply_id: str,
+        sequence_id_start: int = 1,
+        log_id: str = "",
+) -> Iterator[ServerMessage]:
+    converter = _BodyMessageConverter(
+        session_id=session_id,
+        query_msg_id=query_msg_id,
+        reply_id=reply_id,
+        sequence_id_start=sequence_id_start,
+        log_id=log_id,
+    )
+    for item in items:
+        yield from converter.feed(item)
+
+
+async def _aiter_body_to_server_messages(
+        items: AsyncIterator[Dict[Any, Dict[str, Any]]],
+        *,
+        session_id: str,
+        query_msg_id: str,
+        reply_id: str,
+        sequence_id_start: int = 1,
+        log_id: str = "",
+) -> AsyncIterator[ServerMessage]:
+    converter = _BodyMessageConverter(
+        session_id=session_id,
+        query_msg_id=query_msg_id,
+        reply_id=reply_id,
+        sequence_id_start=sequence_id_start,
+        log_id=log_id,
+    )
+    async for item in items:
+        for m in converter.feed(item):
             yield m
 
 
+def _message_start(
+        *,
+        session_id: str,
+        query_msg_id: str,
+        local_msg_id: str,
+        run_id: str,
+        reply_id: str,
+        sequence_id: int,
+        log_id: str,
+) -> ServerMessage:
+    return ServerMessage(
+        type=MESSAGE_TYPE_MESSAGE_START,
+        session_id=session_id,
+        query_msg_id=query_msg_id,
+        reply_id=reply_id,
+        msg_id=str(uuid.uuid4()),
+        sequence_id=sequence_id,
+        finish=True,
+        content=ServerMessageContent(
+            message_start=MessageStartDetail(
+                local_msg_id=local_msg_id, msg_id=query_msg_id, execute_id=run_id
+            )
+        ),
+        log_id=log_id,
+    )
+
+
+def _message_end(
+        *,
+        session_id: str,
+        query_msg_id: str,
+        reply_id: str,
+        sequence_id: int,
+        code: str,
+        message: str,
+        time_cost_ms: int,
+        log_id: str,
+) -> ServerMessage:
+    return ServerMessage(
+        type=MESSAGE_TYPE_MESSAGE_END,
+        session_id=session_id,
+        query_msg_id=query_msg_id,
+        reply_id=reply_id,
+        msg_id=str(uuid.uuid4()),
+        sequence_id=sequence_id,
+        finish=True,
+        content=ServerMessageContent(
+            message_end=MessageEndDetail(
+                code=code,
+                message=message,
+                token_cost=TokenCost(input_tokens=0, output_tokens=0, total_tokens=0),
+                time_cost_ms=time_cost_ms,
+            )
+        ),
+        log_id=log_id,
+    )
+
+
 def iter_server_messages(
         items: Iterator[Dict[Any, Dict[str, Any]]],
         *,
@@ -499,24 +583,16 @@ def iter_server_messages(
 ) -> Iterator[ServerMessage]:
     t0 = time.time()
     reply_id = str(uuid.uuid4())
-    start_msg_id = str(uuid.uuid4())
     # message_start
-    start_sm = ServerMessage(
-        type=MESSAGE_TYPE_MESSAGE_START,
+    yield _message_start(
         session_id=session_id,
         query_msg_id=query_msg_id,
+        local_msg_id=local_msg_id,
+        run_id=run_id,
         reply_id=reply_id,
-        msg_id=start_msg_id,
         sequence_id=sequence_id_start,
-        finish=True,
-        content=ServerMessageContent(
-            message_start=MessageStartDetail(
-                local_msg_id=local_msg_id, msg_id=query_msg_id, execute_id=run_id
-            )
-        ),
         log_id=log_id,
     )
-    yield start_sm
     next_seq = sequence_id_start + 1
     last_seq = sequence_id_start
     try:
@@ -531,50 +607,72 @@ def iter_server_messages(
         ):
             yield sm
             last_seq = sm.sequence_id
+        code, message = MESSAGE_END_CODE_SUCCESS, ""
+    except Exception as ex:
+        code, message = "500", str(ex)
 
-        # message_end
-        t_ms = int((time.time() - t0) * 1000)
-        end_sm = ServerMessage(
-            type=MESSAGE_TYPE_MESSAGE_END,
-            session_id=session_id,
-            query_msg_id=query_msg_id,
-            reply_id=reply_id,
-            msg_id=str(uuid.uuid4()),
-            sequence_id=last_seq + 1,
-            finish=True,
-            content=ServerMessageContent(
-                message_end=MessageEndDetail(
-                    code=MESSAGE_END_CODE_SUCCESS,
-                    message="",
-                    token_cost=TokenCost(input_tokens=0, output_tokens=0, total_tokens=0),
-                    time_cost_ms=t_ms,
-                )
-            ),
-            log_id=log_id,
-        )
-        yield end_sm
+    # message_end
+    yield _message_end(
+        session_id=session_id,
+        query_msg_id=query_msg_id,
+        reply_id=reply_id,
+        sequence_id=last_seq + 1,
+        code=code,
+        message=message,
+        time_cost_ms=int((time.time() - t0) * 1000),
+        log_id=log_id,
+    )
+
+
+async def aiter_server_messages(
+        items: AsyncIterator[Dict[Any, Dict[str, Any]]],
+        *,
+        session_id: str,
+        query_msg_id: str,
+        local_msg_id: str,
+        run_id: str,
+        sequence_id_start: int = 1,
+        log_id: str,
+) -> AsyncIterator[ServerMessage]:
+    """iter_server_messages 的异步版本，直接消费 graph.astream 的输出"""
+    t0 = time.time()
+    reply_id = str(uuid.uuid4())
+    yield _message_start(
+        session_id=session_id,
+        query_msg_id=query_msg_id,
+        local_msg_id=local_msg_id,
+        run_id=run_id,
+        reply_id=reply_id,
+        sequence_id=sequence_id_start,
+        log_id=log_id,
+    )
+    next_seq = sequence_id_start + 1
+    last_seq = sequence_id_start
+    try:
+        async for sm in _aiter_body_to_server_messages(
+                items,
+                session_id=session_id,
+                query_msg_id=query_msg_id,
+                reply_id=reply_id,
+                sequence_id_start=next_seq,
+                log_id=log_id,
+        ):
+            yield sm
+            last_seq = sm.sequence_id
+        code, message = MESSAGE_END_CODE_SUCCESS, ""
     except Exception as ex:
-        # message_end
-        t_ms = int((time.time() - t0) * 1000)
-        end_sm = ServerMessage(
-            type=MESSAGE_TYPE_MESSAGE_END,
-            session_id=session_id,
-            query_msg_id=query_msg_id,
-            reply_id=reply_id,
-            msg_id=str(uuid.uuid4()),
-            sequence_id=last_seq + 1,
-            finish=True,
-            content=ServerMessageContent(
-                message_end=MessageEndDetail(
-                    code="500",
-                    message=str(ex),
-                    time_cost_ms=t_ms,
-                    token_cost=TokenCost(input_tokens=0, output_tokens=0, total_tokens=0),
-                )
-            ),
-            log_id=log_id,
-        )
-        yield end_sm
+        code, message = "500", str(ex)
+
+    yield _message_end(
+        session_id=session_id,
+        query_msg_id=query_msg_id,
+        reply_id=reply_id,
+        sequence_id=last_seq + 1,
+        code=code,
+        message=message,
+        time_cost_ms=int((time.time() - t0) * 1000),
+        log_id=log_id,
+    )
 
 
 def agent_iter_server_messages(
@@ -595,3 +693,23 @@ def agent_iter_server_messages(
         sequence_id_start=1,
         log_id=log_id,
     )
+
+
+def agent_aiter_server_messages(
+        items: AsyncIterator[Dict[Any, Dict[str, Any]]],
+        *,
+        session_id: str,
+        query_msg_id: str,
+        local_msg_id: str,
+        run_id: str,
+        log_id: str,
+) -> AsyncIterator[ServerMessage]:
+    return aiter_server_messages(
+        items,
+        session_id=session_id,
+        query_msg_id=query_msg_id,
+        local_msg_id=local_msg_id,
+        run_id=run_id,
+        sequence_id_start=1,
+        log_id=log_id,
+    )
@@ -3,8 +3,10 @@ import inspect
 import importlib
 import ast
 import textwrap
+import logging
+import threading
 from pydantic import BaseModel
-from typing import get_type_hints,Type,Optional,get_origin,Union,get_args
+from typing import get_type_hints,Type,Optional,get_origin,Union,get_args,Any,Dict,Tuple
 from langgraph.graph.state import CompiledStateGraph
 from langgraph.graph import START, END
 
@@ -16,9 +18,46 @@ def get_graph_instance(module_name):
             return obj
     return None
 
+logger = logging.getLogger(__name__)
+
+# 已编译 Agent 缓存：module_name -> (配置版本, agent)
+_agent_cache: Dict[str, Tuple[str, Any]] = {}
+_agent_cache_lock = threading.Lock()
+
+
 def get_agent_instance(module_name, ctx):
+    """
+    获取 Agent 实例。
+
+    如果模块提供 get_config_version()，则按配置版本缓存编译结果，
+    每个进程只编译一次，配置文件变化时自动重建；请求相关的信息
+    （如请求头）由 Agent 在运行时从 context 中获取。
+    未提供版本函数的模块保持每次构建的旧行为。
+    """
     module = importlib.import_module(module_name)
-    return module.build_agent(ctx)
+    get_version = getattr(module, "get_config_version", None)
+    if get_version is None:
+        return module.build_agent(ctx)
+
+    version = get_version()
+    cached = _agent_cache.get(module_name)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    with _agent_cache_lock:
+        cached = _agent_cache.get(module_name)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        agent = module.build_agent()
+        _agent_cache[module_name] = (version, agent)
+        logger.info(f"Agent compiled and cached: module={module_name}, config_version={version[:12]}")
+        return agent
+
+
+def clear_agent_cache():
+    """清空已编译 Agent 缓存，下次获取时重新构建"""
+    with _agent_cache_lock:
+        _agent_cache.clear()
 
 # return: func, input_class, output_class
 def get_graph_node_func_with_inout(graph, node_name):
@@ -0,0 +1,162 @@
+"""
+工具批量调度
+前端首页需要同时拉取 用户信息/每日运势/人生解读/职场大势 等多个工具结果，
+批量接口一次请求提交多个工具调用，在有界线程池中并发执行，按提交顺序返回结果及每个调用的耗时。
+
+调用格式：
+    {"tool_name": "get_daily_report", "tool_params": {...}, "depends_on": [0]}
+
+depends_on 只能引用排在前面的调用下标，被依赖的调用成功后才会执行；
+由于任务按提交顺序出队，等待中的任务所依赖的任务一定已在执行，不会因线程池占满而死锁。
+
+超时：到达整体截止时间后，尚未出队的调用直接取消，等待依赖的调用不再执行并立即释放线程；
+已经在执行的工具调用无法中断，会继续占用线程直到工具自身返回（依赖工具内部的网络/数据库超时），
+线程数 TOOL_BATCH_WORKERS 需按此留有余量。
+"""
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, Future, CancelledError, TimeoutError as FutureTimeoutError, wait
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 所有批量请求共享的工作线程数（限制工具调用对数据库/外部API的总并发）
+TOOL_BATCH_WORKERS = int(os.getenv("TOOL_BATCH_WORKERS", "8"))
+# 单次批量请求最多包含的调用数
+TOOL_BATCH_MAX_CALLS = int(os.getenv("TOOL_BATCH_MAX_CALLS", "20"))
+# 单次批量请求的整体超时（秒），超时未完成的调用返回 TIMEOUT
+TOOL_BATCH_TIMEOUT = float(os.getenv("TOOL_BATCH_TIMEOUT", "30"))
+
+_executor = ThreadPoolExecutor(max_workers=TOOL_BATCH_WORKERS, thread_name_prefix="tool-batch")
+
+
+class _DependencyFailed(Exception):
+    pass
+
+
+class _DeadlineExceeded(Exception):
+    """到达批量请求截止时间，调用未开始执行"""
+
+
+def validate_calls(calls: Any) -> Optional[str]:
+    """校验批量调用列表，返回错误信息；合法时返回 None"""
+    if not isinstance(calls, list) or not calls:
+        return "calls 必须是非空数组"
+    if len(calls) > TOOL_BATCH_MAX_CALLS:
+        return f"单次最多 {TOOL_BATCH_MAX_CALLS} 个调用，当前 {len(calls)} 个"
+    for index, call in enumerate(calls):
+        if not isinstance(call, dict) or not call.get("tool_name"):
+            return f"第 {index} 个调用缺少 tool_name"
+        if not isinstance(call.get("tool_params", {}), dict):
+            return f"第 {index} 个调用的 tool_params 必须是对象"
+        for dep in call.get("depends_on", []):
+            if not isinstance(dep, int) or not 0 <= dep < index:
+                return f"第 {index} 个调用的 depends_on 只能引用排在前面的调用下标"
+    return None
+
+
+def run_tool_batch(calls: List[Dict[str, Any]], resolve_tool: Callable[[str], Any],
+                   user_id: str, timeout: float = TOOL_BATCH_TIMEOUT) -> List[Dict[str, Any]]:
+    """
+    并发执行一批工具调用（调用前需先通过 validate_calls 校验）
+
+    参数：
+    - calls: 调用列表
+    - resolve_tool: 工具名 -> 工具对象，不存在时返回 None
+    - user_id: 请求用户，工具参数中没有 user_id 时自动补充（与单个调用接口一致）
+    - timeout: 整体超时秒数
+
+    返回：与 calls 顺序一致的结果列表，每项包含 status、data 或错误信息、elapsed_ms
+    """
+    futures: List[Future] = []
+    started_at: Dict[int, float] = {}
+    elapsed: Dict[int, float] = {}
+    deadline = time.monotonic() + timeout
+
+    def _execute(index: int, tool: Any, params: Dict[str, Any], deps: List[Future]) -> Any:
+        # 等待依赖最多到截止时间，超时后不再执行，避免在批量请求结束后继续占用线程
+        for dep in deps:
+            try:
+                error = dep.exception(timeout=max(0.0, deadline - time.monotonic()))
+            except (FutureTimeoutError, CancelledError):
+                raise _DeadlineExceeded()
+            if isinstance(error, _DeadlineExceeded):
+                raise _DeadlineExceeded()
+            if error is not None:
+                raise _DependencyFailed()
+        if time.monotonic() >= deadline:
+            raise _DeadlineExceeded()
+        started_at[index] = time.perf_counter()
+        try:
+            return tool.invoke(params)
+        finally:
+            elapsed[index] = (time.perf_counter() - started_at[index]) * 1000
+
+    results: List[Optional[Dict[str, Any]]] = [None] * len(calls)
+    for index, call in enumerate(calls):
+        tool_name = call["tool_name"]
+        tool = resolve_tool(tool_name)
+        if tool is None:
+            failed: Future = Future()
+            failed.set_exception(LookupError(tool_name))
+            futures.append(failed)
+            results[index] = {
+                "index": index,
+                "tool_name": tool_name,
+                "status": "failed",
+                "error_code": "TOOL_NOT_FOUND",
+                "error_message": f"工具不存在: {tool_name}",
+                "elapsed_ms": 0.0,
+            }
+            continue
+
+        params = dict(call.get("tool_params") or {})
+        if "user_id" not in params:
+            params["user_id"] = user_id
+        deps = [futures[dep] for dep in call.get("depends_on", [])]
+        futures.append(_executor.submit(_execute, index, tool, params, deps))
+
+    wait(futures, timeout=max(0.0, deadline - time.monotonic()))
+
+    for index, future in enumerate(futures):
+        if results[index] is not None:
+            continue
+        tool_name = calls[index]["tool_name"]
+        result = {"index": index, "tool_name": tool_name}
+
+        if not future.done() or isinstance(future.exception(), _DeadlineExceeded):
+            # cancel 只对尚未出队的调用生效，正在执行的调用会在后台继续运行到结束
+            if not future.cancel() and not future.done():
+                logger.warning(f"⚠️ 批量调用超时后仍在执行: {tool_name}")
+            started = started_at.get(index)
+            result.update(
+                status="failed",
+                error_code="TIMEOUT",
+                error_message=f"工具调用超时（{timeout:.0f}秒）",
+                elapsed_ms=round((time.perf_counter() - started) * 1000, 1) if started else 0.0,
+            )
+        elif isinstance(future.exception(), _DependencyFailed):
+            result.update(
+                status="failed",
+                error_code="DEPENDENCY_FAILED",
+                error_message="依赖的调用未成功，已跳过",
+                elapsed_ms=0.0,
+            )
+        elif future.exception() is not None:
+            logger.error(f"❌ 批量调用工具失败: {tool_name} | 错误: {future.exception()}")
+            result.update(
+                status="failed",
+                error_code="TOOL_EXECUTION_ERROR",
+                error_message=str(future.exception()),
+                elapsed_ms=round(elapsed.get(index, 0.0), 1),
+            )
+        else:
+            result.update(
+                status="success",
+                data=future.result(),
+                elapsed_ms=round(elapsed.get(index, 0.0), 1),
+            )
+        results[index] = result
+
+    return results
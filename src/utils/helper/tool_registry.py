@@ -0,0 +1,81 @@
+"""
+工具注册表
+启动时根据 Agent 的工具列表一次性构建 工具名 -> 工具对象 / 参数 JSON Schema 映射，
+并预先序列化 /api/tools 的响应体和 ETag：
+- 单个/批量调用工具时按名字直接查表，不再每次遍历 agent.nodes['tools'].bound.tools_by_name
+- 工具列表接口直接返回缓存的字节，客户端带 If-None-Match 时返回 304
+Flask 后端（backend_api.py / backend_api_render.py）与 FastAPI（main.py）共用同一份注册表。
+"""
+import hashlib
+import json
+import logging
+from typing import Any, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def _tool_schema(tool: Any) -> Dict[str, Any]:
+    """工具参数 JSON Schema（args_schema 可能是 pydantic 模型或已经是 dict）"""
+    schema = getattr(tool, "args_schema", None)
+    if not schema:
+        return {}
+    if isinstance(schema, dict):
+        return schema
+    if hasattr(schema, "model_json_schema"):
+        return schema.model_json_schema()
+    return schema.schema()
+
+
+class ToolRegistry:
+    """只读的工具注册表，构建后不再修改，可在多线程间共享"""
+
+    def __init__(self, tools: Iterable[Any]):
+        self._tools: Dict[str, Any] = {}
+        self._schemas: Dict[str, Dict[str, Any]] = {}
+        listing: List[Dict[str, Any]] = []
+
+        for tool in tools:
+            if tool.name in self._tools:
+                logger.warning(f"工具名重复，后注册的将覆盖前者: {tool.name}")
+            schema = _tool_schema(tool)
+            self._tools[tool.name] = tool
+            self._schemas[tool.name] = schema
+            listing.append({
+                "name": tool.name,
+                "description": tool.description,
+                "parameters": schema,
+            })
+
+        self.listing_body: bytes = json.dumps({
+            "status": "success",
+            "total": len(listing),
+            "tools": listing,
+        }, ensure_ascii=False).encode("utf-8")
+        self.etag: str = '"' + hashlib.sha256(self.listing_body).hexdigest()[:32] + '"'
+
+    def get(self, name: str) -> Optional[Any]:
+        """按名字获取工具，不存在时返回 None"""
+        return self._tools.get(name)
+
+    def schema(self, name: str) -> Optional[Dict[str, Any]]:
+        return self._schemas.get(name)
+
+    def names(self) -> List[str]:
+        return list(self._tools)
+
+    def __len__(self) -> int:
+        return len(self._tools)
+
+    def etag_matches(self, if_none_match: Optional[str]) -> bool:
+        """判断请求头 If-None-Match 是否命中当前 ETag（支持多个值、弱校验 W/ 前缀和 *）"""
+        if not if_none_match:
+            return False
+        for candidate in if_none_match.split(","):
+            candidate = candidate.strip()
+            if candidate == "*":
+                return True
+            if candidate.startswith("W/"):
+                candidate = candidate[2:]
+            if candidate == self.etag:
+                return True
+        return False
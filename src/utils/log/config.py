@@ -8,3 +8,37 @@ from pathlib import Path
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
 
 LOG_DIR = Path(os.getenv("COZE_LOG_DIR", "/tmp/app/work/logs/bypass"))
+
+# 节点日志后台写入（见 utils/log/log_sink.py）
+# 关闭后 write_log 退回逐条 open + fsync 的同步写入
+LOG_SINK_ENABLED = os.getenv("LOG_SINK_ENABLED", "true").lower() == "true"
+# 组提交：累计到 N 条或距上次落盘超过 N 毫秒时 fsync 一次
+LOG_SINK_FLUSH_ENTRIES = int(os.getenv("LOG_SINK_FLUSH_ENTRIES", "256"))
+LOG_SINK_FLUSH_INTERVAL_MS = int(os.getenv("LOG_SINK_FLUSH_INTERVAL_MS", "200"))
+# 队列容量（条），写满后按溢出策略处理：drop（丢弃新日志并计数）/ block（最多阻塞 LOG_SINK_BLOCK_TIMEOUT_MS 后丢弃）
+LOG_SINK_MAX_QUEUE = int(os.getenv("LOG_SINK_MAX_QUEUE", "10000"))
+LOG_SINK_OVERFLOW = os.getenv("LOG_SINK_OVERFLOW", "drop")
+LOG_SINK_BLOCK_TIMEOUT_MS = int(os.getenv("LOG_SINK_BLOCK_TIMEOUT_MS", "50"))
+# 节点日志 input/output 单个字段的序列化预算（字节），超出部分在序列化过程中截断
+NODE_LOG_FIELD_MAX_BYTES = int(os.getenv("NODE_LOG_FIELD_MAX_BYTES", str(256 * 1024)))
+
+# 应用日志队列模式（见 utils/log/write_log.py）：业务线程只入队，格式化、写文件和轮转在后台线程完成
+LOG_QUEUE_ENABLED = os.getenv("LOG_QUEUE_ENABLED", "true").lower() == "true"
+# 队列容量（条），写满后丢弃新日志并计数
+LOG_QUEUE_MAX_SIZE = int(os.getenv("LOG_QUEUE_MAX_SIZE", "10000"))
+# DEBUG 日志采样率（0~1），高频调试日志只保留一部分
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "1.0"))
+
+# 慢请求采样分析（见 utils/log/profiler.py），默认关闭
+PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "false").lower() == "true"
+# 单次 /run、/stream_run 超过该耗时（毫秒）时保存采样结果
+PROFILER_SLOW_THRESHOLD_MS = int(os.getenv("PROFILER_SLOW_THRESHOLD_MS", "10000"))
+# 调用栈采样间隔（毫秒）
+PROFILER_INTERVAL_MS = int(os.getenv("PROFILER_INTERVAL_MS", "10"))
+# 单个请求最多保留的不同调用栈数，超出后新调用栈计入 "(other)"
+PROFILER_MAX_STACKS = int(os.getenv("PROFILER_MAX_STACKS", "5000"))
+# 保存的慢请求分析结果数量，超出后删除最早的文件
+PROFILER_KEEP = int(os.getenv("PROFILER_KEEP", "50"))
+PROFILER_DIR = Path(os.getenv("PROFILER_DIR", str(LOG_DIR / "profiles")))
+# 管理接口 /admin/profiles 的访问令牌（请求头 X-Admin-Token），未配置时接口不可用
+PROFILER_ADMIN_TOKEN = os.getenv("PROFILER_ADMIN_TOKEN", "")
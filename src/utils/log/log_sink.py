@@ -0,0 +1,243 @@
+"""
+节点日志后台写入
+write_log 原先每条日志都 open + write + fsync + close，一轮对话会在请求线程上触发多次同步 fsync。
+这里改为：请求线程只把序列化好的日志行放入有界队列，后台线程持有一个打开的文件句柄批量写入，
+并按组提交落盘（累计 LOG_SINK_FLUSH_ENTRIES 条或距第一条未落盘日志超过 LOG_SINK_FLUSH_INTERVAL_MS 时 fsync 一次）。
+队列写满时按 LOG_SINK_OVERFLOW 策略丢弃并计数，进程退出时自动 flush。
+"""
+import atexit
+import os
+import queue
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional, TextIO
+
+from utils.log.config import (
+    LOG_SINK_FLUSH_ENTRIES,
+    LOG_SINK_FLUSH_INTERVAL_MS,
+    LOG_SINK_MAX_QUEUE,
+    LOG_SINK_OVERFLOW,
+    LOG_SINK_BLOCK_TIMEOUT_MS,
+)
+
+OVERFLOW_DROP = "drop"
+OVERFLOW_BLOCK = "block"
+
+# 停止标记：后台线程收到后落盘并退出
+_STOP = object()
+
+
+class BatchedLogWriter:
+    """队列 + 单写线程的日志文件写入器，线程安全"""
+
+    def __init__(self, path: str,
+                 flush_entries: int = LOG_SINK_FLUSH_ENTRIES,
+                 flush_interval_ms: int = LOG_SINK_FLUSH_INTERVAL_MS,
+                 max_queue: int = LOG_SINK_MAX_QUEUE,
+                 overflow: str = LOG_SINK_OVERFLOW,
+                 block_timeout_ms: int = LOG_SINK_BLOCK_TIMEOUT_MS):
+        if overflow not in (OVERFLOW_DROP, OVERFLOW_BLOCK):
+            raise ValueError(f"不支持的日志溢出策略: {overflow}（支持 drop/block）")
+        self.path = path
+        self.flush_entries = max(1, flush_entries)
+        self.flush_interval = max(0, flush_interval_ms) / 1000
+        self.max_queue = max_queue
+        self.overflow = overflow
+        self.block_timeout = max(0, block_timeout_ms) / 1000
+
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._closed = False
+
+        self.written = 0
+        self.dropped = 0
+        self.fsyncs = 0
+        self.errors = 0
+
+    def _ensure_started(self):
+        """首次写入时启动后台线程；fork 出的子进程没有父进程的线程，需要重新启动"""
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            if self._pid is not None:
+                # 子进程继承的队列里可能残留父进程未写完的日志，丢弃后重建
+                self._queue = queue.Queue(maxsize=self.max_queue)
+            self._thread = threading.Thread(target=self._run, name="log-sink", daemon=True)
+            self._thread.start()
+            self._pid = pid
+
+    def submit(self, line: str) -> bool:
+        """
+        提交一行日志（不含换行符），不等待落盘
+
+        返回：是否已入队；队列已满或写入器已关闭时返回 False
+        """
+        if self._closed:
+            return False
+        self._ensure_started()
+        try:
+            if self.overflow == OVERFLOW_BLOCK:
+                self._queue.put(line, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(line)
+            return True
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+                dropped = self.dropped
+            # 只在第 1 条及之后每 1000 条时提示，避免丢日志时再刷屏
+            if dropped == 1 or dropped % 1000 == 0:
+                print(f"Log sink queue full, dropped {dropped} entries so far", file=sys.stderr, flush=True)
+            return False
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """阻塞直到此前提交的日志全部写入并 fsync，超时返回 False"""
+        if self._pid != os.getpid() or self._thread is None or not self._thread.is_alive():
+            return True
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def close(self, timeout: float = 5.0):
+        """落盘剩余日志并停止后台线程（进程退出时自动调用）"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._pid != os.getpid() or self._thread is None or not self._thread.is_alive():
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            print("Log sink queue full on shutdown, pending entries may be lost", file=sys.stderr, flush=True)
+            return
+        self._thread.join(timeout)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queue_depth": self._queue.qsize(),
+            "queue_capacity": self.max_queue,
+            "written": self.written,
+            "dropped": self.dropped,
+            "fsyncs": self.fsyncs,
+            "errors": self.errors,
+        }
+
+    def _write(self, f: Optional[TextIO], lines: List[str]) -> Optional[TextIO]:
+        """写入一批日志行，失败时关闭句柄（下一批重新打开）并丢弃该批"""
+        try:
+            if f is None:
+                f = open(self.path, "a", encoding="utf-8")
+            f.write("\n".join(lines) + "\n")
+            f.flush()
+            self.written += len(lines)
+            return f
+        except Exception as e:
+            self.errors += 1
+            with self._lock:
+                self.dropped += len(lines)
+            print(f"Failed to write log batch ({len(lines)} entries): {e}", file=sys.stderr, flush=True)
+            self._close_file(f)
+            return None
+
+    def _sync(self, f: Optional[TextIO]):
+        if f is None:
+            return
+        try:
+            os.fsync(f.fileno())
+            self.fsyncs += 1
+        except Exception as e:
+            self.errors += 1
+            print(f"Failed to fsync log file: {e}", file=sys.stderr, flush=True)
+
+    @staticmethod
+    def _close_file(f: Optional[TextIO]):
+        if f is None:
+            return
+        try:
+            f.close()
+        except Exception:
+            pass
+
+    def _run(self):
+        f: Optional[TextIO] = None
+        unsynced = 0
+        sync_deadline = 0.0
+
+        while True:
+            # 没有未落盘日志时一直等待；否则最多等到组提交的截止时间
+            timeout = None if unsynced == 0 else max(0.0, sync_deadline - time.monotonic())
+            try:
+                items = [self._queue.get(timeout=timeout)]
+            except queue.Empty:
+                items = []
+            # 把已排队的日志一次取完（每批最多 flush_entries 条）
+            while len(items) < self.flush_entries:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            lines: List[str] = []
+            waiters: List[threading.Event] = []
+            stop = False
+            for item in items:
+                if item is _STOP:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    lines.append(item)
+
+            if lines:
+                f = self._write(f, lines)
+                if f is not None:
+                    if unsynced == 0:
+                        sync_deadline = time.monotonic() + self.flush_interval
+                    unsynced += len(lines)
+
+            if unsynced and (unsynced >= self.flush_entries or waiters or stop
+                             or time.monotonic() >= sync_deadline):
+                self._sync(f)
+                unsynced = 0
+
+            for waiter in waiters:
+                waiter.set()
+            if stop:
+                self._close_file(f)
+                return
+
+
+_writers: Dict[str, BatchedLogWriter] = {}
+_writers_lock = threading.Lock()
+
+
+def get_log_writer(path: str) -> BatchedLogWriter:
+    """获取指定日志文件的共享写入器（每个文件一个后台线程）"""
+    writer = _writers.get(path)
+    if writer is None:
+        with _writers_lock:
+            writer = _writers.get(path)
+            if writer is None:
+                writer = BatchedLogWriter(path)
+                _writers[path] = writer
+    return writer
+
+
+def close_all_writers(timeout: float = 5.0):
+    """落盘并关闭所有写入器"""
+    with _writers_lock:
+        writers = list(_writers.values())
+    for writer in writers:
+        writer.close(timeout)
+
+
+atexit.register(close_all_writers)
@@ -3,7 +3,7 @@ import cozeloop
 from cozeloop.integration.langchain.trace_callback import LoopTracer
 from langchain_core.runnables import RunnableConfig
 from utils.log.common import get_execute_mode
-from utils.log.node_log import Logger
+from utils.log.node_log import Logger, latency_tracer
 
 space_id = os.getenv("COZE_PROJECT_SPACE_ID", "YOUR_SPACE_ID")
 api_token = os.getenv("COZE_LOOP_API_TOKEN", "YOUR_LOOP_API_TOKEN")
@@ -36,6 +36,7 @@ def init_run_config(graph, ctx):
     config = RunnableConfig(
         callbacks=[
             tracer,
+            latency_tracer,
             trace_callback_handler
         ],
     )
@@ -45,6 +46,7 @@ def init_run_config(graph, ctx):
 def init_agent_config(graph, ctx):
     config = RunnableConfig(
         callbacks=[
+            latency_tracer,
             LoopTracer.get_callback_handler(
                 cozeloopTracer,
                 tags={
@@ -0,0 +1,161 @@
+"""
+进程内延迟指标
+按阶段聚合耗时直方图（工具调用、LLM 首 token / 总耗时、checkpoint 读写、数据库语句、图节点、整轮对话、SSE 写出），
+只在内存中累加桶计数，由 main.py 的 /metrics 以 Prometheus 文本格式输出。
+
+用法：
+    with TOOL_DURATION.time(tool="login", status="success"): ...
+    LLM_TTFT.observe(0.82, model="doubao-seed")
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# 默认桶（秒）：覆盖毫秒级数据库语句到分钟级的整轮对话
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+# (指标名, 类型, 说明, [(标签字典, 值)])
+MetricFamily = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Histogram:
+    """带标签的累积直方图，observe 只做一次二分查找和几次加法"""
+
+    def __init__(self, name: str, documentation: str, label_names: Iterable[str] = (),
+                 buckets: Iterable[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # 标签值 -> [各桶计数（非累积，最后一格为 +Inf）, 总和, 总数]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                self._series[key] = series
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            snapshot = [(key, list(series[0]), series[1], series[2]) for key, series in self._series.items()]
+
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for key, counts, total, count in sorted(snapshot):
+            labels = dict(zip(self.label_names, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                bucket_labels = dict(labels, le=_format_value(bound))
+                lines.append(f"{self.name}_bucket{_format_labels(bucket_labels)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """直方图 + 外部采集函数（把已有模块的统计转换为 gauge/counter）"""
+
+    def __init__(self):
+        self._histograms: Dict[str, Histogram] = {}
+        self._collectors: List[Callable[[], Iterable[MetricFamily]]] = []
+        self._lock = threading.Lock()
+
+    def histogram(self, name: str, documentation: str, label_names: Iterable[str] = (),
+                  buckets: Iterable[float] = LATENCY_BUCKETS) -> Histogram:
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = Histogram(name, documentation, label_names, buckets)
+                self._histograms[name] = histogram
+            return histogram
+
+    def register_collector(self, collector: Callable[[], Iterable[MetricFamily]]):
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        """Prometheus 文本格式（text/plain; version=0.0.4）"""
+        with self._lock:
+            histograms = list(self._histograms.values())
+            collectors = list(self._collectors)
+
+        lines: List[str] = []
+        for histogram in histograms:
+            lines.extend(histogram.collect())
+        for collector in collectors:
+            try:
+                families = list(collector())
+            except Exception as e:
+                lines.append(f"# collector {getattr(collector, '__name__', 'unknown')} failed: {_escape(e)}")
+                continue
+            for name, metric_type, documentation, samples in families:
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+metrics_registry = MetricsRegistry()
+
+TURN_DURATION = metrics_registry.histogram(
+    "agent_turn_duration_seconds", "整轮对话耗时", ("method", "status"))
+NODE_DURATION = metrics_registry.histogram(
+    "agent_node_duration_seconds", "图节点耗时", ("node",))
+TOOL_DURATION = metrics_registry.histogram(
+    "agent_tool_duration_seconds", "工具调用耗时", ("tool", "status"))
+LLM_TTFT = metrics_registry.histogram(
+    "agent_llm_ttft_seconds", "LLM 首 token 耗时", ("model",))
+LLM_DURATION = metrics_registry.histogram(
+    "agent_llm_duration_seconds", "LLM 调用总耗时", ("model", "status"))
+CHECKPOINT_DURATION = metrics_registry.histogram(
+    "agent_checkpoint_duration_seconds", "checkpoint 读写耗时", ("operation",))
+DB_DURATION = metrics_registry.histogram(
+    "db_statement_duration_seconds", "数据库语句耗时", ("statement",))
+SSE_WRITE_DURATION = metrics_registry.histogram(
+    "agent_sse_write_duration_seconds", "SSE 事件写出耗时（含客户端背压）", ("method",))
+
+
+def statement_kind(statement: Optional[str]) -> str:
+    """SQL 语句类型（SELECT/INSERT/UPDATE/DELETE/OTHER），用作低基数标签"""
+    if not statement:
+        return "OTHER"
+    head = statement.lstrip()[:6].upper()
+    for kind in ("SELECT", "INSERT", "UPDATE", "DELETE"):
+        if head.startswith(kind):
+            return kind
+    return "OTHER"
@@ -2,7 +2,9 @@ import time
 import logging
 from uuid import UUID
 from openai import BaseModel
-from utils.log.config import LOG_DIR
+from utils.log.config import LOG_DIR, LOG_SINK_ENABLED, NODE_LOG_FIELD_MAX_BYTES
+from utils.log.log_sink import get_log_writer
+from utils.log.metrics import LLM_TTFT, LLM_DURATION, NODE_DURATION
 from utils.log.common import get_execute_mode, is_prod
 import uuid
 from langchain_core.callbacks import BaseCallbackHandler
@@ -14,6 +16,12 @@ from typing import Dict, Optional, Any
 from pydantic import BaseModel
 from utils.log.parser import LangGraphParser
 import asyncio
+from enum import Enum
+
+try:
+    import orjson
+except ImportError:  # 可选依赖，未安装时使用标准库 json
+    orjson = None
 
 
 class ParamInfo:
@@ -53,10 +61,25 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+_TRUNCATED = "...(已截断)"
+
+
+def node_log_enabled() -> bool:
+    """节点日志是否会被写出；线上不写（见 write_log），此时节点回调直接返回，跳过数据序列化"""
+    return not is_prod()
+
+
+def _write_log_sync(log_json: str):
+    """同步写入单条日志并 fsync（后台写入关闭或提交失败时使用）"""
+    with open(LOG_FILE, 'a', encoding='utf-8', buffering=1) as f:
+        f.write(log_json + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+
 
 def write_log(log_entry):
     """
-    直接使用文件操作写入JSON格式日志，确保立即刷新到磁盘
+    写入JSON格式日志：默认交给后台线程批量写入并按组提交落盘，不在请求线程上 fsync
     :param log_entry: 符合要求格式的日志字典
     """
     try:
@@ -65,12 +88,11 @@ def write_log(log_entry):
             return None
         log_json = json.dumps(log_entry, ensure_ascii=False)
 
-        # 修改为行缓冲模式（buffering=1）而不是无缓冲模式
-        with open(LOG_FILE, 'a', encoding='utf-8', buffering=1) as f:  # 行缓冲模式
-            f.write(log_json + '\n')
-            # 显式调用flush和fsync确保数据写入磁盘
-            f.flush()
-            os.fsync(f.fileno())
+        # 队列已满时由写入器按溢出策略丢弃并计数，不回退到同步写，避免阻塞请求线程
+        if LOG_SINK_ENABLED:
+            get_log_writer(LOG_FILE).submit(log_json)
+        else:
+            _write_log_sync(log_json)
 
         # 同时输出到控制台以便调试
         level = log_entry.get('level', 'info').lower()
@@ -84,14 +106,7 @@ def write_log(log_entry):
         try:
             log_json = json.dumps(log_entry, ensure_ascii=False)
             print(f"Attempting fallback write: {log_json}", flush=True)
-            # 修改备选方案为行缓冲模式
-            f = open(LOG_FILE, 'a', encoding='utf-8', buffering=1)
-            try:
-                f.write(log_json + '\n')
-                f.flush()
-                os.fsync(f.fileno())
-            finally:
-                f.close()
+            _write_log_sync(log_json)
         except Exception as fallback_e:
             print(f"Fallback log write failed: {fallback_e}", flush=True)
 
@@ -249,6 +264,8 @@ class Logger(BaseCallbackHandler):
             metadata: dict[str, Any] | None = None,
             **kwargs: Any,
     ) -> Any:
+        if not node_log_enabled():
+            return
         if metadata is None:
             metadata = {}
         node_name_value = kwargs.get("name")
@@ -302,6 +319,8 @@ class Logger(BaseCallbackHandler):
             parent_run_id: uuid.UUID | None = None,
             **kwargs: Any,
     ) -> Any:
+        if not node_log_enabled():
+            return
         node_name = self.run_id_map.pop(run_id, None)
         if parent_run_id is None:  # 根节点
             self._on_graph_end(outputs)
@@ -440,42 +459,186 @@ class Logger(BaseCallbackHandler):
         return node_title
 
 
-def _serialize_data(data: Any) -> str:
-    """
-    增强版数据序列化函数，支持：
-    - Pydantic BaseModel
-    - 字典/列表等基础类型
-    - 自定义对象（通过 __dict__ 序列化）
-    - 特殊字符（保证 ASCII 编码）
-    """
+class LatencyTracer(BaseCallbackHandler):
+    """按阶段记录耗时直方图：LLM 首 token / 总耗时、图节点耗时（见 utils/log/metrics.py）"""
 
-    def _recursive_serialize(item: Any):
-        """递归序列化单个元素"""
-        # 处理 Pydantic 模型
-        if isinstance(item, BaseModel):
-            return item.model_dump()  # 先转字典再序列化
+    # 在触发回调的线程中直接执行，不投递到线程池，保证计时准确且开销最小
+    run_inline = True
 
-        # 处理列表/元组
-        elif isinstance(item, (list, tuple)):
-            return [_recursive_serialize(sub_item) for sub_item in item]
+    def __init__(self):
+        self._llm_runs: Dict[UUID, list] = {}  # run_id -> [开始时间, 模型名, 是否已收到首 token]
+        self._node_runs: Dict[UUID, tuple] = {}  # run_id -> (开始时间, 节点名)
 
-        # 处理字典
-        elif isinstance(item, dict):
-            return {key: _recursive_serialize(value) for key, value in item.items()}
+    def _start_llm(self, run_id: UUID, metadata: Optional[dict], kwargs: dict):
+        model = ((metadata or {}).get("ls_model_name")
+                 or (kwargs.get("invocation_params") or {}).get("model")
+                 or "unknown")
+        self._llm_runs[run_id] = [time.perf_counter(), model, False]
 
-        # 处理自定义对象（有 __dict__ 属性的）
-        elif hasattr(item, '__dict__') and not isinstance(item, (str, int, float, bool, type(None))):
-            return _recursive_serialize(item.__dict__)
+    def _end_llm(self, run_id: UUID, status: str):
+        run = self._llm_runs.pop(run_id, None)
+        if run is None:
+            return
+        elapsed = time.perf_counter() - run[0]
+        if not run[2] and status == "success":
+            # 非流式调用：首 token 即整体返回
+            LLM_TTFT.observe(elapsed, model=run[1])
+        LLM_DURATION.observe(elapsed, model=run[1], status=status)
+
+    def _end_node(self, run_id: UUID):
+        run = self._node_runs.pop(run_id, None)
+        if run is not None:
+            NODE_DURATION.observe(time.perf_counter() - run[0], node=run[1])
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, metadata: Optional[dict] = None,
+                            **kwargs: Any) -> Any:
+        self._start_llm(run_id, metadata, kwargs)
+
+    def on_llm_start(self, serialized, prompts, *, run_id: UUID, metadata: Optional[dict] = None,
+                     **kwargs: Any) -> Any:
+        self._start_llm(run_id, metadata, kwargs)
+
+    def on_llm_new_token(self, token: str, *, chunk=None, run_id: UUID, **kwargs: Any) -> Any:
+        run = self._llm_runs.get(run_id)
+        if run is None or run[2]:
+            return
+        # 只有角色信息的空 chunk 不算首 token；工具调用参数片段算
+        if not token and not getattr(getattr(chunk, "message", None), "tool_call_chunks", None):
+            return
+        run[2] = True
+        LLM_TTFT.observe(time.perf_counter() - run[0], model=run[1])
 
-        # 基础类型直接返回
-        else:
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs: Any) -> Any:
+        self._end_llm(run_id, "success")
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> Any:
+        self._end_llm(run_id, "error")
+
+    def on_chain_start(self, serialized, inputs, *, run_id: UUID, metadata: Optional[dict] = None,
+                       **kwargs: Any) -> Any:
+        node = (metadata or {}).get("langgraph_node")
+        if node and kwargs.get("name") == node:
+            self._node_runs[run_id] = (time.perf_counter(), node)
+
+    def on_chain_end(self, outputs, *, run_id: UUID, **kwargs: Any) -> Any:
+        self._end_node(run_id)
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> Any:
+        self._end_node(run_id)
+
+
+# 所有请求共用（按 run_id 区分），挂载在 loop_trace 生成的 RunnableConfig 上
+latency_tracer = LatencyTracer()
+
+
+class _BoundedSerializer:
+    """
+    在字节预算内把任意对象转换为可 JSON 序列化的结构：
+    - 边转换边计量，预算用尽后剩余字段/元素以占位文本代替，不再继续遍历
+    - 检测循环引用，同一对象在一次序列化中重复出现时只输出一次
+    """
+
+    def __init__(self, max_bytes: int):
+        self.remaining = max_bytes
+        self.active = set()  # 当前递归路径上的对象 id（循环引用检测）
+        self.seen = set()    # 已输出过的对象 id
+
+    def convert(self, item: Any) -> Any:
+        if item is None or isinstance(item, (bool, int, float)):
+            self.remaining -= 8
             return item
+        if isinstance(item, str):
+            return self._string(item)
+        if isinstance(item, Enum):
+            return self.convert(item.value)
+        if isinstance(item, (bytes, bytearray)):
+            return self._string(f"<bytes: {len(item)}>")
+        if isinstance(item, (list, tuple, dict, set, frozenset)) and not item:
+            self.remaining -= 2
+            return {} if isinstance(item, dict) else []
+        if self.remaining <= 0:
+            return _TRUNCATED
+
+        obj_id = id(item)
+        if obj_id in self.active:
+            return f"<循环引用: {type(item).__name__}>"
+        if obj_id in self.seen:
+            return f"<重复引用: {type(item).__name__}>"
+        self.active.add(obj_id)
+        try:
+            # 处理 Pydantic 模型（按字段展开，与 model_dump 的结构一致）
+            if isinstance(item, BaseModel):
+                result = self._mapping({name: getattr(item, name, None) for name in type(item).model_fields})
+            elif isinstance(item, dict):
+                result = self._mapping(item)
+            elif isinstance(item, (list, tuple, set, frozenset)):
+                result = self._sequence(item)
+            # 处理自定义对象（有 __dict__ 属性的）
+            elif hasattr(item, '__dict__'):
+                result = self._mapping(vars(item))
+            else:
+                result = self._string(str(item))
+        finally:
+            self.active.discard(obj_id)
+        self.seen.add(obj_id)
+        return result
+
+    def _mapping(self, mapping: Dict[Any, Any]) -> Dict[str, Any]:
+        result = {}
+        for index, (key, value) in enumerate(mapping.items()):
+            if self.remaining <= 0:
+                result["..."] = f"省略 {len(mapping) - index} 个字段"
+                break
+            key = key if isinstance(key, str) else str(key)
+            self.remaining -= len(key) + 4
+            result[key] = self.convert(value)
+        return result
+
+    def _sequence(self, items) -> list:
+        result = []
+        for index, value in enumerate(items):
+            if self.remaining <= 0:
+                result.append(f"...(省略 {len(items) - index} 项)")
+                break
+            result.append(self.convert(value))
+        return result
+
+    def _string(self, text: str) -> str:
+        if self.remaining <= 0:
+            return _TRUNCATED
+        # 先按字符截取再编码计量，超长字符串不会被整体编码
+        head = text[:self.remaining]
+        size = len(head.encode('utf-8'))
+        if size > self.remaining:
+            head = head.encode('utf-8')[:self.remaining].decode('utf-8', 'ignore')
+            size = self.remaining
+        self.remaining -= size + 2
+        if len(head) < len(text):
+            return f"{head}...(已截断，原长 {len(text)} 字符)"
+        return head
+
+
+def _dumps(data: Any) -> str:
+    if orjson is not None:
+        try:
+            return orjson.dumps(data).decode('utf-8')
+        except TypeError:
+            # 超过 64 位的整数等 orjson 不支持的值，交给标准库处理
+            pass
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
 
+
+def _serialize_data(data: Any, max_bytes: int = NODE_LOG_FIELD_MAX_BYTES) -> str:
+    """
+    节点日志数据序列化函数，支持：
+    - Pydantic BaseModel
+    - 字典/列表等基础类型
+    - 自定义对象（通过 __dict__ 序列化）
+    - 按 max_bytes 预算边序列化边截断，循环/重复引用只输出占位
+    - 安装了 orjson 时使用 orjson 编码
+    """
     try:
-        # 先递归处理数据为可序列化的基础类型
-        serialized_data = _recursive_serialize(data)
-        # 最终序列化为 JSON 字符串
-        return json.dumps(serialized_data, ensure_ascii=False, indent=None)
+        return _dumps(_BoundedSerializer(max_bytes).convert(data))
 
     except Exception as e:
         logger.error(f"Error serializing data: {e}", exc_info=True)
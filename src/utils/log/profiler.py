@@ -0,0 +1,236 @@
+"""
+慢请求采样分析
+每个 /run、/stream_run 请求开始时登记要采样的线程（事件循环线程，thread 模式下还有生产线程），
+共享的采样线程按 PROFILER_INTERVAL_MS 间隔通过 sys._current_frames() 读取这些线程的调用栈并聚合计数；
+请求结束时若耗时超过 PROFILER_SLOW_THRESHOLD_MS，写出 collapsed-stack（flamegraph.pl / speedscope 均可打开）
+和 speedscope JSON 两种文件，否则直接丢弃。
+
+注意：native 模式下事件循环线程由所有并发请求共享，采到的栈可能包含同时段其他请求的工作。
+"""
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from utils.log.config import (
+    PROFILER_ENABLED,
+    PROFILER_SLOW_THRESHOLD_MS,
+    PROFILER_INTERVAL_MS,
+    PROFILER_MAX_STACKS,
+    PROFILER_KEEP,
+    PROFILER_DIR,
+)
+
+logger = logging.getLogger(__name__)
+
+OTHER_STACK = ("(other)",)
+# 调用栈最大深度，超出部分（最外层）截掉
+MAX_STACK_DEPTH = 128
+
+
+@dataclass
+class _ProfileSession:
+    run_id: str
+    log_id: str
+    method: str
+    started_at: float
+    thread_ids: Set[int]
+    counts: Counter = field(default_factory=Counter)
+    samples: int = 0
+
+
+class SlowRunProfiler:
+    """按 run_id 采样调用栈，只保存慢请求的结果"""
+
+    def __init__(self, enabled: bool = PROFILER_ENABLED,
+                 threshold_ms: int = PROFILER_SLOW_THRESHOLD_MS,
+                 interval_ms: int = PROFILER_INTERVAL_MS,
+                 max_stacks: int = PROFILER_MAX_STACKS,
+                 keep: int = PROFILER_KEEP,
+                 output_dir: Path = PROFILER_DIR):
+        self.enabled = enabled
+        self.threshold = threshold_ms / 1000
+        self.interval = max(1, interval_ms) / 1000
+        self.max_stacks = max_stacks
+        self.keep = keep
+        self.output_dir = Path(output_dir)
+
+        self._sessions: Dict[str, _ProfileSession] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        # 已保存的分析结果：run_id -> 元信息（按保存顺序）
+        self._profiles: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # 代码对象 -> 栈帧名称（代码对象随函数常驻内存，缓存避免每次采样都格式化字符串）
+        self._frame_names: Dict[Any, str] = {}
+
+    def start(self, run_id: str, log_id: str = "", method: str = "", thread_id: Optional[int] = None):
+        """开始采样一个请求；thread_id 默认为当前线程"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._sessions[run_id] = _ProfileSession(
+                run_id=run_id,
+                log_id=log_id or "",
+                method=method or "",
+                started_at=time.monotonic(),
+                thread_ids={thread_id or threading.get_ident()},
+            )
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._sample_loop, name="slow-run-profiler", daemon=True)
+                self._thread.start()
+
+    def add_thread(self, run_id: str, thread_id: Optional[int] = None):
+        """把另一个线程（如 thread 模式的生产线程）加入请求的采样范围"""
+        if not self.enabled:
+            return
+        with self._lock:
+            session = self._sessions.get(run_id)
+            if session is not None:
+                session.thread_ids.add(thread_id or threading.get_ident())
+
+    def finish(self, run_id: str) -> Optional[Dict[str, Any]]:
+        """结束采样；耗时超过阈值时在后台写出分析文件并返回其元信息"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            session = self._sessions.pop(run_id, None)
+        if session is None:
+            return None
+
+        elapsed = time.monotonic() - session.started_at
+        if elapsed < self.threshold or not session.counts:
+            return None
+
+        base = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}_{re.sub(r'[^A-Za-z0-9_.-]', '_', run_id)}"
+        meta = {
+            "run_id": run_id,
+            "log_id": session.log_id,
+            "method": session.method,
+            "elapsed_ms": int(elapsed * 1000),
+            "samples": session.samples,
+            "interval_ms": int(self.interval * 1000),
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "collapsed": f"{base}.collapsed.txt",
+            "speedscope": f"{base}.speedscope.json",
+        }
+        # 写文件放到后台线程，不占用事件循环
+        threading.Thread(target=self._save, args=(session, meta), daemon=True).start()
+        logger.warning(f"Slow run profiled: run_id={run_id}, log_id={session.log_id}, "
+                       f"elapsed={meta['elapsed_ms']}ms, samples={session.samples}")
+        return meta
+
+    def list_profiles(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(reversed(self._profiles.values()))
+
+    def get_profile_path(self, run_id: str, fmt: str) -> Optional[Path]:
+        """获取已保存分析文件的路径，fmt 为 collapsed 或 speedscope"""
+        with self._lock:
+            meta = self._profiles.get(run_id)
+        if meta is None or fmt not in ("collapsed", "speedscope"):
+            return None
+        path = self.output_dir / meta[fmt]
+        return path if path.exists() else None
+
+    def _frame_name(self, code) -> str:
+        name = self._frame_names.get(code)
+        if name is None:
+            name = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            self._frame_names[code] = name
+        return name
+
+    def _stack(self, frame) -> Tuple[str, ...]:
+        names = []
+        while frame is not None and len(names) < MAX_STACK_DEPTH:
+            names.append(self._frame_name(frame.f_code))
+            frame = frame.f_back
+        names.reverse()
+        return tuple(names)
+
+    def _sample_loop(self):
+        own_id = threading.get_ident()
+        while True:
+            # 整个采样步骤持锁：finish 取走会话后不会再被累加，写文件时无需拷贝计数
+            with self._lock:
+                if not self._sessions:
+                    self._thread = None
+                    return
+                frames = sys._current_frames()
+                stacks: Dict[int, Tuple[str, ...]] = {}
+                for session in self._sessions.values():
+                    for thread_id in session.thread_ids:
+                        if thread_id == own_id:
+                            continue
+                        frame = frames.get(thread_id)
+                        if frame is None:
+                            continue
+                        stack = stacks.get(thread_id)
+                        if stack is None:
+                            stack = self._stack(frame)
+                            stacks[thread_id] = stack
+                        if stack not in session.counts and len(session.counts) >= self.max_stacks:
+                            stack = OTHER_STACK
+                        session.counts[stack] += 1
+                        session.samples += 1
+                del frames
+
+            time.sleep(self.interval)
+
+    def _save(self, session: _ProfileSession, meta: Dict[str, Any]):
+        try:
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+            interval_ms = self.interval * 1000
+
+            with open(self.output_dir / meta["collapsed"], "w", encoding="utf-8") as f:
+                for stack, count in session.counts.most_common():
+                    f.write(f"{';'.join(stack)} {count}\n")
+
+            frame_index: Dict[str, int] = {}
+            samples, weights = [], []
+            for stack, count in session.counts.items():
+                samples.append([frame_index.setdefault(name, len(frame_index)) for name in stack])
+                weights.append(count * interval_ms)
+            speedscope = {
+                "$schema": "https://www.speedscope.app/file-format-schema.json",
+                "shared": {"frames": [{"name": name} for name in frame_index]},
+                "profiles": [{
+                    "type": "sampled",
+                    "name": f"{session.method} run_id={session.run_id} log_id={session.log_id}",
+                    "unit": "milliseconds",
+                    "startValue": 0,
+                    "endValue": sum(weights),
+                    "samples": samples,
+                    "weights": weights,
+                }],
+                "name": f"run_id={session.run_id}",
+                "exporter": "slow-run-profiler",
+            }
+            with open(self.output_dir / meta["speedscope"], "w", encoding="utf-8") as f:
+                json.dump(speedscope, f, ensure_ascii=False)
+        except Exception as e:
+            logger.error(f"Failed to save profile for run_id={session.run_id}: {e}")
+            return
+
+        with self._lock:
+            self._profiles[session.run_id] = meta
+            expired = []
+            while len(self._profiles) > self.keep:
+                expired.append(self._profiles.popitem(last=False)[1])
+        for old in expired:
+            for key in ("collapsed", "speedscope"):
+                try:
+                    (self.output_dir / old[key]).unlink()
+                except OSError:
+                    pass
+
+
+# 全局单例
+slow_run_profiler = SlowRunProfiler()
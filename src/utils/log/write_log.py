@@ -1,13 +1,17 @@
+import atexit
+import copy
 import logging
 import logging.handlers
 import json
 import os
+import queue
+import random
 from contextvars import ContextVar
-from typing import Optional
+from typing import Iterable, Optional
 from pathlib import Path
 
 from coze_coding_utils.runtime_ctx.context import Context
-from utils.log.config import LOG_DIR
+from utils.log.config import LOG_DIR, LOG_QUEUE_ENABLED, LOG_QUEUE_MAX_SIZE, LOG_DEBUG_SAMPLE_RATE
 
 request_context: ContextVar[Optional[Context]] = ContextVar('request_context', default=None)
 
@@ -45,74 +49,143 @@ class APSchedulerFilter(logging.Filter):
         return True
 
 
+# LogRecord 自带属性及已单独输出的上下文字段，不作为额外字段输出（预编译为 frozenset，避免每条日志线性查找）
+_RESERVED_ATTRS = frozenset([
+    'name', 'msg', 'args', 'created', 'filename', 'funcName',
+    'levelname', 'levelno', 'lineno', 'module', 'msecs',
+    'message', 'pathname', 'process', 'processName', 'relativeCreated',
+    'thread', 'threadName', 'exc_info', 'exc_text', 'stack_info',
+    'log_id', 'run_id', 'space_id', 'project_id', 'method',
+    'x_tt_env', 'rpc_persist_rec_rec_biz_scene',
+    'rpc_persist_coze_record_root_id', 'rpc_persist_rec_root_entity_type',
+    'rpc_persist_rec_root_entity_id',
+])
+_CONTEXT_FIELDS = ('log_id', 'run_id', 'space_id', 'project_id', 'method', 'x_tt_env')
+
+
 class JsonFormatter(logging.Formatter):
-    
-    def format(self, record: logging.LogRecord) -> str:
+    """
+    JSON 日志格式
+    extra_fields 为额外字段白名单：传入时只输出白名单内的 extra 字段，
+    否则输出除 _RESERVED_ATTRS 外的全部字段
+    """
+
+    def __init__(self, *args, extra_fields: Optional[Iterable[str]] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._extra_fields = frozenset(extra_fields) - _RESERVED_ATTRS if extra_fields is not None else None
+
+    def _build(self, record: logging.LogRecord) -> dict:
         log_data = {
             'message': record.getMessage(),
             'timestamp': self.formatTime(record, self.datefmt),
             'level': record.levelname,
             'logger': record.name,
-            'log_id': getattr(record, 'log_id', ''),
-            'run_id': getattr(record, 'run_id', ''),
-            'space_id': getattr(record, 'space_id', ''),
-            'project_id': getattr(record, 'project_id', ''),
-            'method': getattr(record, 'method', ''),
-            'x_tt_env': getattr(record, 'x_tt_env', ''),
-            'lineno': record.lineno,
-            'funcName': record.funcName,
         }
+        for field in _CONTEXT_FIELDS:
+            log_data[field] = getattr(record, field, '')
+        log_data['lineno'] = record.lineno
+        log_data['funcName'] = record.funcName
 
         if record.exc_info:
             log_data['exc_info'] = self.formatException(record.exc_info)
-        
-        for key, value in record.__dict__.items():
-            if key not in ['name', 'msg', 'args', 'created', 'filename', 'funcName', 
-                          'levelname', 'levelno', 'lineno', 'module', 'msecs', 
-                          'message', 'pathname', 'process', 'processName', 'relativeCreated',
-                          'thread', 'threadName', 'exc_info', 'exc_text', 'stack_info',
-                          'log_id', 'run_id', 'space_id', 'project_id', 'method',
-                          'x_tt_env', 'rpc_persist_rec_rec_biz_scene', 
-                          'rpc_persist_coze_record_root_id', 'rpc_persist_rec_root_entity_type',
-                          'rpc_persist_rec_root_entity_id']:
-                log_data[key] = value
-        
-        return json.dumps(log_data, ensure_ascii=False)
+        elif record.exc_text:
+            # 队列模式下异常堆栈已在入队时格式化
+            log_data['exc_info'] = record.exc_text
 
+        if self._extra_fields is None:
+            for key, value in record.__dict__.items():
+                if key not in _RESERVED_ATTRS:
+                    log_data[key] = value
+        else:
+            for key in self._extra_fields:
+                if key in record.__dict__:
+                    log_data[key] = record.__dict__[key]
+
+        return log_data
 
-class PlainTextFormatter(logging.Formatter):
-    
     def format(self, record: logging.LogRecord) -> str:
-        log_data = {
-            'message': record.getMessage(),
-            'timestamp': self.formatTime(record, self.datefmt),
-            'level': record.levelname,
-            'logger': record.name,
-            'log_id': getattr(record, 'log_id', ''),
-            'run_id': getattr(record, 'run_id', ''),
-            'space_id': getattr(record, 'space_id', ''),
-            'project_id': getattr(record, 'project_id', ''),
-            'method': getattr(record, 'method', ''),
-            'x_tt_env': getattr(record, 'x_tt_env', ''),
-            'lineno': record.lineno,
-            'funcName': record.funcName,
-        }
-        
+        return json.dumps(self._build(record), ensure_ascii=False, default=str)
+
+
+class PlainTextFormatter(JsonFormatter):
+    """与 JsonFormatter 输出一致，保留类名兼容已有配置"""
+
+
+class DebugSamplingFilter(logging.Filter):
+    """按比例采样 DEBUG 及以下级别的日志，INFO 及以上全部保留"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = max(0.0, min(1.0, rate))
+        self.sampled_out = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.rate >= 1.0:
+            return True
+        if random.random() < self.rate:
+            return True
+        self.sampled_out += 1
+        return False
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    非阻塞的队列 Handler：业务线程只做上下文注入和入队，队列满时丢弃并计数。
+    上下文过滤器需挂在本 Handler 上（request_context 只在业务线程中可见）。
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 在业务线程中渲染消息和异常堆栈，避免参数对象/traceback 在后台线程中被访问或长期持有
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
         if record.exc_info:
-            log_data['exc_info'] = self.formatException(record.exc_info)
-        
-        for key, value in record.__dict__.items():
-            if key not in ['name', 'msg', 'args', 'created', 'filename', 'funcName', 
-                          'levelname', 'levelno', 'lineno', 'module', 'msecs', 
-                          'message', 'pathname', 'process', 'processName', 'relativeCreated',
-                          'thread', 'threadName', 'exc_info', 'exc_text', 'stack_info',
-                          'log_id', 'run_id', 'space_id', 'project_id', 'method',
-                          'x_tt_env', 'rpc_persist_rec_rec_biz_scene', 
-                          'rpc_persist_coze_record_root_id', 'rpc_persist_rec_root_entity_type',
-                          'rpc_persist_rec_root_entity_id']:
-                log_data[key] = value
-        
-        return json.dumps(log_data, ensure_ascii=False)
+            if not record.exc_text:
+                record.exc_text = _exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_exception_formatter = logging.Formatter()
+_queue_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[DroppingQueueHandler] = None
+_sampling_filter: Optional[DebugSamplingFilter] = None
+
+
+def _stop_queue_listener():
+    global _queue_listener
+    if _queue_listener is not None:
+        _queue_listener.stop()
+        _queue_listener = None
+
+
+def get_logging_stats() -> dict:
+    """日志管道指标：队列深度/容量、因队列满丢弃的条数、被采样丢弃的 DEBUG 条数"""
+    stats = {
+        'queue_enabled': _queue_handler is not None,
+        'queue_depth': 0,
+        'queue_capacity': 0,
+        'dropped': 0,
+        'debug_sampled_out': _sampling_filter.sampled_out if _sampling_filter else 0,
+    }
+    if _queue_handler is not None:
+        stats.update(
+            queue_depth=_queue_handler.queue.qsize(),
+            queue_capacity=_queue_handler.queue.maxsize,
+            dropped=_queue_handler.dropped,
+        )
+    return stats
 
 
 def setup_logging(
@@ -121,9 +194,18 @@ def setup_logging(
     backup_count: int = 5,
     log_level: str = "INFO",
     use_json_format: bool = True,
-    console_output: bool = True
+    console_output: bool = True,
+    use_queue: bool = LOG_QUEUE_ENABLED,
+    queue_size: int = LOG_QUEUE_MAX_SIZE,
+    debug_sample_rate: float = LOG_DEBUG_SAMPLE_RATE,
 ):
-    
+    """
+    配置根日志
+    use_queue 为 True 时根 logger 只挂一个 DroppingQueueHandler，格式化、写文件、轮转和控制台输出
+    都由后台 QueueListener 线程完成，请求线程（包括事件循环）不再做文件 I/O。
+    """
+    global _queue_listener, _queue_handler, _sampling_filter
+
     if log_file is None:
         try:
             log_dir = Path(LOG_DIR)
@@ -135,21 +217,26 @@ def setup_logging(
             log_file = str(fallback_log_dir / 'app.log')
             print(f"Warning: Using fallback log directory: {fallback_log_dir}, due to error: {e}", flush=True)
     
+    level = getattr(logging, log_level.upper(), logging.INFO)
     root_logger = logging.getLogger()
-    root_logger.setLevel(getattr(logging, log_level.upper(), logging.INFO))
+    root_logger.setLevel(level)
     
+    # 重复调用时先停掉旧的后台线程，避免两个 listener 写同一个文件
+    _stop_queue_listener()
     root_logger.handlers.clear()
     
     context_filter = ContextFilter()
     apscheduler_filter = APSchedulerFilter()
+    _sampling_filter = DebugSamplingFilter(debug_sample_rate) if debug_sample_rate < 1.0 else None
     
+    handlers = []
     file_handler = logging.handlers.RotatingFileHandler(
         filename=log_file,
         maxBytes=max_bytes,
         backupCount=backup_count,
         encoding='utf-8'
     )
-    file_handler.setLevel(getattr(logging, log_level.upper(), logging.INFO))
+    file_handler.setLevel(level)
     
     if use_json_format:
         file_formatter = JsonFormatter()
@@ -160,26 +247,50 @@ def setup_logging(
         )
     
     file_handler.setFormatter(file_formatter)
-    file_handler.addFilter(context_filter)
-    file_handler.addFilter(apscheduler_filter)
-    root_logger.addHandler(file_handler)
+    handlers.append(file_handler)
     
     if console_output:
         console_handler = logging.StreamHandler()
-        console_handler.setLevel(getattr(logging, log_level.upper(), logging.INFO))
+        console_handler.setLevel(level)
         
         console_formatter = PlainTextFormatter(
             fmt='%(asctime)s %(levelname)s [log_id=%(log_id)s] [run_id=%(run_id)s] %(name)s:%(lineno)d %(message)s',
             datefmt='%Y-%m-%d %H:%M:%S'
         )
         console_handler.setFormatter(console_formatter)
-        console_handler.addFilter(context_filter)
-        console_handler.addFilter(apscheduler_filter)
-        root_logger.addHandler(console_handler)
+        handlers.append(console_handler)
     
-    logging.info(f"Logging configured: file={log_file}, max_bytes={max_bytes}, backup_count={backup_count}")
+    # 过滤器挂在业务线程执行的 Handler 上：队列模式挂在 QueueHandler，否则挂在各输出 Handler
+    if use_queue:
+        _queue_handler = DroppingQueueHandler(queue.Queue(maxsize=queue_size))
+        _queue_handler.setLevel(level)
+        filter_targets = [_queue_handler]
+        root_logger.addHandler(_queue_handler)
+        _queue_listener = logging.handlers.QueueListener(
+            _queue_handler.queue, *handlers, respect_handler_level=True
+        )
+        _queue_listener.start()
+    else:
+        _queue_handler = None
+        filter_targets = handlers
+        for handler in handlers:
+            root_logger.addHandler(handler)
+    
+    for target in filter_targets:
+        if _sampling_filter is not None:
+            target.addFilter(_sampling_filter)
+        target.addFilter(context_filter)
+        target.addFilter(apscheduler_filter)
+    
+    logging.info(f"Logging configured: file={log_file}, max_bytes={max_bytes}, backup_count={backup_count}, "
+                 f"queue={'on' if use_queue else 'off'}")
     
     return log_file
 
 
-__all__ = ['setup_logging', 'request_context', 'ContextFilter', 'APSchedulerFilter', 'JsonFormatter', 'PlainTextFormatter']
+# 进程退出时把队列中剩余的日志写完
+atexit.register(_stop_queue_listener)
+
+
+__all__ = ['setup_logging', 'get_logging_stats', 'request_context', 'ContextFilter', 'APSchedulerFilter',
+           'JsonFormatter', 'PlainTextFormatter', 'DebugSamplingFilter', 'DroppingQueueHandler']
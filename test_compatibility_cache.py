@@ -0,0 +1,134 @@
+"""
+配合度矩阵缓存测试脚本：增量更新与其他进程改动交错时，读取能发现变化并重建（使用内存中的假数据库）
+
+用法：
+    python test_compatibility_cache.py
+    python -m pytest -q test_compatibility_cache.py
+"""
+import os
+import sys
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+import tools.compatibility_tool as compatibility_tool
+from storage.database.shared.model import RelationshipType
+from tools.compatibility_tool import CompatibilityCache, _epoch_ms, _roster_fingerprint
+
+USER_ID = "test-user-compat"
+T0 = datetime(2025, 1, 1, 9, 0, 0, 123456)
+
+
+class FakeQuery:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def options(self, *args):
+        return self
+
+    def filter(self, *args):
+        return self
+
+    def order_by(self, *args):
+        return self
+
+    def all(self):
+        return sorted(self.rows.values(), key=lambda row: row.id)
+
+
+class FakeSession:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def query(self, *args):
+        return FakeQuery(self.rows)
+
+
+class FakeDbCache(CompatibilityCache):
+    """指纹按假数据库中的行计算（对应 _fingerprint 的 SQL），记录全量构建次数"""
+
+    def __init__(self, rows):
+        super().__init__()
+        self.rows = rows
+        self.builds = 0
+
+    def _fingerprint(self, session, user_id):
+        return _roster_fingerprint([row.updated_at for row in self.rows.values()])
+
+    def _build(self, session, user_id):
+        self.builds += 1
+        return super()._build(session, user_id)
+
+
+def _row(entry_id, name, bazi, mbti, updated_at, rel_type=RelationshipType.COLLEAGUE):
+    return SimpleNamespace(
+        id=entry_id, user_id=USER_ID, name=name, relationship_type=rel_type, relationship_level=None,
+        bazi=bazi, birth_date=None, mbti=mbti, updated_at=updated_at,
+    )
+
+
+def _setup():
+    rows = {
+        1: _row(1, "我", "甲子 乙丑 丙寅 丁卯", "INTJ", T0, RelationshipType.SELF),
+        2: _row(2, "张三", "戊辰 己巳 庚午 辛未", "ENFP", T0),
+        3: _row(3, "李四", "壬申 癸酉 甲戌 乙亥", "ISTP", T0),
+    }
+    cache = FakeDbCache(rows)
+    compatibility_tool.get_session = lambda: nullcontext(FakeSession(rows))
+    return rows, cache
+
+
+def test_local_upsert_keeps_cache_fresh():
+    rows, cache = _setup()
+    cache.get(USER_ID)
+
+    # 本进程修改条目并增量更新，指纹与数据库一致，无需重建
+    rows[2].mbti = "ISTJ"
+    rows[2].updated_at = T0 + timedelta(minutes=5)
+    cache.upsert_entry(rows[2])
+    matrix = cache.get(USER_ID)
+    assert cache.builds == 1
+    assert matrix.fingerprint == cache._fingerprint(None, USER_ID)
+
+    # 新增条目同理
+    rows[4] = _row(4, "王五", "丙子 丁丑 戊寅 己卯", "ESFJ", T0 + timedelta(minutes=6))
+    cache.upsert_entry(rows[4])
+    matrix = cache.get(USER_ID)
+    assert cache.builds == 1 and matrix.ids == [1, 2, 3, 4]
+
+
+def test_other_process_update_not_hidden_by_later_local_upsert():
+    rows, cache = _setup()
+    before = cache.get(USER_ID)
+    old_score = float(before.scores[0, 2])
+
+    # 其他进程在 T_B 修改了李四（本进程不知情）
+    rows[3].bazi = "甲子 丙寅 甲子 丙寅"
+    rows[3].mbti = "INTJ"
+    rows[3].updated_at = T0 + timedelta(minutes=1)
+    # 本进程随后在 T_A > T_B 修改了张三并增量更新
+    rows[2].notes = "改了备注"
+    rows[2].updated_at = T0 + timedelta(minutes=2)
+    cache.upsert_entry(rows[2])
+
+    # 条目数和最大更新时间都与数据库一致，但指纹中的更新时间之和不一致，读取时必须重建
+    matrix = cache.get(USER_ID)
+    assert cache.builds == 2
+    assert float(matrix.scores[0, 2]) != old_score
+
+
+def test_epoch_ms_rounding():
+    assert _epoch_ms(None) == 0
+    assert _epoch_ms(datetime(1970, 1, 1, 0, 0, 1)) == 1000
+    assert _epoch_ms(datetime(1970, 1, 1, 0, 0, 0, 1499)) == 1
+    assert _epoch_ms(datetime(1970, 1, 1, 0, 0, 0, 1500)) == 2
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith("test_") and callable(func):
+            func()
+            print(f"✅ {name}")
+    print("🎉 配合度矩阵缓存测试全部通过")
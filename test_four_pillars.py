@@ -0,0 +1,91 @@
+"""
+四柱排盘测试脚本（离线计算，不依赖数据库和外部接口）
+
+用法：
+    python test_four_pillars.py
+    python -m pytest -q test_four_pillars.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from utils.calendar.four_pillars import compute_four_pillars
+
+# (年, 月, 日, 时, 分) -> (年柱, 月柱, 日柱, 时柱)
+KNOWN_DATES = [
+    # 2000-01-01 为戊午日，小寒前仍属己卯年子月
+    ((2000, 1, 1, 12, 0), ("己卯", "丙子", "戊午", "戊午")),
+    # 1900-01-01 为甲戌日，在 1900 年小寒之前（属 1899 年大雪后的子月）
+    ((1900, 1, 1, 0, 0), ("己亥", "丙子", "甲戌", "甲子")),
+    ((1900, 1, 5, 12, 0), ("己亥", "丙子", "戊寅", "戊午")),
+    # 1949-10-01 为甲子日（白露后、寒露前为酉月）
+    ((1949, 10, 1, 12, 0), ("己丑", "癸酉", "甲子", "庚午")),
+]
+
+# 交节前后：2024 年立春约在 2 月 4 日 16:27（北京时间），表的精度约 15 分钟，前后各留一小时以上余量
+JIE_BOUNDARIES = [
+    ((2024, 2, 4, 15, 0), ("癸卯", "乙丑")),
+    ((2024, 2, 4, 18, 0), ("甲辰", "丙寅")),
+    # 2023 年大雪约在 12 月 7 日 23:33，之后进入子月（年柱不变）
+    ((2023, 12, 7, 12, 0), ("癸卯", "癸亥")),
+    ((2023, 12, 8, 12, 0), ("癸卯", "甲子")),
+]
+
+# 23 点后按次日子时：日柱进一，时柱按次日日干起子时
+HOUR_ROLLOVER = [
+    ((2000, 1, 1, 22, 59), ("戊午", "癸亥")),
+    ((2000, 1, 1, 23, 0), ("己未", "甲子")),
+    ((2000, 1, 1, 23, 59), ("己未", "甲子")),
+    ((2000, 1, 2, 0, 30), ("己未", "甲子")),
+]
+
+OUT_OF_RANGE = [
+    (1899, 12, 31, 12, 0),
+    (2101, 1, 1, 12, 0),
+]
+
+
+def test_known_dates():
+    for args, expected in KNOWN_DATES:
+        assert compute_four_pillars(*args).pillars == expected, args
+
+
+def test_jie_boundaries():
+    for args, expected in JIE_BOUNDARIES:
+        pillars = compute_four_pillars(*args)
+        assert (pillars.year, pillars.month) == expected, args
+
+
+def test_hour_rollover():
+    for args, expected in HOUR_ROLLOVER:
+        pillars = compute_four_pillars(*args)
+        assert (pillars.day, pillars.hour) == expected, args
+
+
+def test_supported_range():
+    # 整个 1900-2100 年都能排盘（含 1900 年小寒之前和 2100 年最后一天的子时）
+    compute_four_pillars(1900, 1, 1, 0, 0)
+    compute_four_pillars(2100, 12, 31, 23, 30)
+    for args in OUT_OF_RANGE:
+        try:
+            compute_four_pillars(*args)
+        except ValueError:
+            continue
+        raise AssertionError(f"超出范围的日期未报错: {args}")
+
+
+def test_five_elements():
+    pillars = compute_four_pillars(2000, 1, 1, 12, 0)
+    assert sum(pillars.five_elements.values()) == 8
+    # 己卯 丙子 戊午 戊午：天干土火土土，地支木水火火
+    assert pillars.five_elements == {"金": 0, "木": 1, "水": 1, "火": 3, "土": 3}
+    assert pillars.missing_elements() == ("金",)
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith("test_") and callable(func):
+            func()
+            print(f"✅ {name}")
+    print("🎉 四柱排盘测试全部通过")
@@ -0,0 +1,143 @@
+"""
+节点日志后台写入测试脚本（写入临时目录）
+
+用法：
+    python test_log_sink.py
+    python -m pytest -q test_log_sink.py
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from utils.log.log_sink import BatchedLogWriter, OVERFLOW_BLOCK, OVERFLOW_DROP
+
+
+class GatedWriter(BatchedLogWriter):
+    """写入前等待 gate，用于让队列稳定地处于写满状态"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.gate = threading.Event()
+        self.writing = threading.Event()
+
+    def _write(self, f, lines):
+        self.writing.set()
+        self.gate.wait(5)
+        return super()._write(f, lines)
+
+
+def _read_lines(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read().splitlines()
+
+
+def test_flush_writes_in_order():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "app.log")
+        writer = BatchedLogWriter(path, flush_entries=1000, flush_interval_ms=60000)
+        for i in range(50):
+            assert writer.submit(f"line-{i}")
+        assert writer.flush(timeout=5)
+        assert _read_lines(path) == [f"line-{i}" for i in range(50)]
+        stats = writer.stats()
+        assert stats["written"] == 50 and stats["dropped"] == 0 and stats["errors"] == 0
+        # 组提交：50 条只在 flush 时 fsync 一次
+        assert stats["fsyncs"] == 1
+        writer.close()
+
+
+def test_interval_triggers_fsync():
+    with tempfile.TemporaryDirectory() as tmp:
+        writer = BatchedLogWriter(os.path.join(tmp, "app.log"), flush_entries=1000, flush_interval_ms=50)
+        writer.submit("a")
+        deadline = time.monotonic() + 2
+        while writer.stats()["fsyncs"] == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert writer.stats()["fsyncs"] == 1
+        writer.close()
+
+
+def test_drop_when_queue_full():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "app.log")
+        writer = GatedWriter(path, max_queue=3, overflow=OVERFLOW_DROP)
+        try:
+            assert writer.submit("first")
+            assert writer.writing.wait(2)  # 后台线程已取走第一条并卡在写入
+            assert all(writer.submit(f"queued-{i}") for i in range(3))
+            assert not writer.submit("dropped-1")
+            assert not writer.submit("dropped-2")
+            assert writer.stats()["dropped"] == 2
+        finally:
+            writer.gate.set()
+        assert writer.flush(timeout=5)
+        assert _read_lines(path) == ["first", "queued-0", "queued-1", "queued-2"]
+        writer.close()
+
+
+def test_block_waits_then_gives_up():
+    with tempfile.TemporaryDirectory() as tmp:
+        writer = GatedWriter(os.path.join(tmp, "app.log"), max_queue=1,
+                             overflow=OVERFLOW_BLOCK, block_timeout_ms=100)
+        try:
+            writer.submit("first")
+            assert writer.writing.wait(2)
+            assert writer.submit("queued")
+            start = time.monotonic()
+            assert not writer.submit("timed-out")
+            assert time.monotonic() - start >= 0.09
+            assert writer.stats()["dropped"] == 1
+        finally:
+            writer.gate.set()
+        writer.close()
+
+
+def test_close_flushes_and_rejects_new_entries():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "app.log")
+        writer = BatchedLogWriter(path, flush_entries=1000, flush_interval_ms=60000)
+        for i in range(10):
+            writer.submit(f"line-{i}")
+        writer.close()
+        assert len(_read_lines(path)) == 10
+        assert writer.stats()["fsyncs"] == 1
+        assert not writer.submit("after-close")
+        writer.close()  # 重复关闭无副作用
+        assert len(_read_lines(path)) == 10
+
+
+def test_write_error_counts_and_recovers():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "missing", "app.log")
+        writer = BatchedLogWriter(path)
+        writer.submit("lost")
+        assert writer.flush(timeout=5)
+        stats = writer.stats()
+        assert stats["errors"] == 1 and stats["dropped"] == 1 and stats["written"] == 0
+
+        # 目录创建后下一批重新打开文件
+        os.makedirs(os.path.dirname(path))
+        writer.submit("kept")
+        assert writer.flush(timeout=5)
+        assert _read_lines(path) == ["kept"]
+        writer.close()
+
+
+def test_invalid_overflow():
+    try:
+        BatchedLogWriter("unused.log", overflow="spill")
+    except ValueError:
+        return
+    raise AssertionError("不支持的溢出策略未报错")
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith("test_") and callable(func):
+            func()
+            print(f"✅ {name}")
+    print("🎉 节点日志后台写入测试全部通过")
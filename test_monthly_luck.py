@@ -0,0 +1,86 @@
+"""
+月度运势批量打分测试脚本：score_monthly_luck_batch 与原逐月循环算法逐项对比
+
+用法：
+    python test_monthly_luck.py
+    python -m pytest -q test_monthly_luck.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from tools.chart_tool import score_monthly_luck_batch
+
+
+def _legacy_monthly_scores(birth_month) -> list:
+    """向量化之前 predict_monthly_luck 的逐月循环算法（原样保留作为对照）"""
+    base_score = 70
+    monthly_scores = []
+    for month in range(1, 13):
+        score = base_score
+
+        birth_month_int = int(birth_month)
+        if month == birth_month_int:
+            score += 10
+        elif abs(month - birth_month_int) == 6:
+            score -= 5
+
+        if month % 2 == 0:
+            score += 3
+        else:
+            score -= 2
+
+        if 3 <= month <= 5:
+            score += 2
+        elif 6 <= month <= 8:
+            score -= 1
+        elif 9 <= month <= 11:
+            score += 3
+        else:
+            score -= 2
+
+        score = max(40, min(100, score))
+        monthly_scores.append(int(score))
+    return monthly_scores
+
+
+def test_batch_matches_legacy_loop():
+    birth_months = list(range(1, 13))
+    years = [2024, 2025, 2026]
+    scores = score_monthly_luck_batch(birth_months, years)
+    assert scores.shape == (12, 3, 12)
+    for i, birth_month in enumerate(birth_months):
+        expected = _legacy_monthly_scores(birth_month)
+        for j in range(len(years)):
+            assert scores[i, j].tolist() == expected, (birth_month, years[j])
+
+
+def test_string_months_and_duplicates():
+    # 出生月可以是字符串（如 "03"），重复的出生月各自占一行
+    scores = score_monthly_luck_batch(["03", "3", 12], ["2025"])
+    assert scores.shape == (3, 1, 12)
+    assert scores[0, 0].tolist() == scores[1, 0].tolist() == _legacy_monthly_scores(3)
+    assert scores[2, 0].tolist() == _legacy_monthly_scores(12)
+
+
+def test_empty_inputs():
+    assert score_monthly_luck_batch([], [2025]).shape == (0, 1, 12)
+    assert score_monthly_luck_batch([5], []).shape == (1, 0, 12)
+
+
+def test_invalid_month():
+    for bad in ([0], [13], [1, 14]):
+        try:
+            score_monthly_luck_batch(bad, [2025])
+        except ValueError:
+            continue
+        raise AssertionError(f"非法出生月份未报错: {bad}")
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith("test_") and callable(func):
+            func()
+            print(f"✅ {name}")
+    print("🎉 月度运势批量打分测试全部通过")
@@ -0,0 +1,112 @@
+"""
+节点日志序列化测试脚本：_BoundedSerializer 的字节预算、循环/重复引用处理
+
+用法：
+    python test_node_log_serializer.py
+    python -m pytest -q test_node_log_serializer.py
+"""
+import json
+import os
+import sys
+from enum import Enum
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from utils.log.node_log import _BoundedSerializer, _serialize_data, _TRUNCATED
+
+
+class Color(Enum):
+    RED = "red"
+
+
+class Point:
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+
+def test_small_values_unchanged():
+    data = {"a": 1, "b": [True, None, 2.5], "c": "文本", "d": {}, "e": (), "color": Color.RED,
+            "p": Point(1, 2), "raw": b"\x00\x01", 3: "int key"}
+    assert _BoundedSerializer(10000).convert(data) == {
+        "a": 1, "b": [True, None, 2.5], "c": "文本", "d": {}, "e": [], "color": "red",
+        "p": {"x": 1, "y": 2}, "raw": "<bytes: 2>", "3": "int key",
+    }
+
+
+def test_long_string_truncated_within_budget():
+    serializer = _BoundedSerializer(100)
+    result = serializer.convert("x" * 10000)
+    assert result.startswith("x" * 100)
+    assert result.endswith("...(已截断，原长 10000 字符)")
+    assert serializer.remaining <= 0
+
+
+def test_multibyte_string_cut_on_char_boundary():
+    # 每个汉字 3 字节，10 字节预算只能放下 3 个字符，且不会截出半个字符
+    result = _BoundedSerializer(10).convert("运势" * 10)
+    assert result.startswith("运势运") and not result.startswith("运势运势")
+    assert "�" not in result
+
+
+def test_budget_stops_traversal():
+    data = {f"key{i}": "v" * 50 for i in range(1000)}
+    result = _BoundedSerializer(500).convert(data)
+    # 预算用尽后剩余字段以一个占位代替
+    assert len(result) < 20
+    assert result["..."].startswith("省略 ") and result["..."].endswith(" 个字段")
+
+    items = _BoundedSerializer(200).convert(["x" * 50] * 100)
+    assert len(items) < 10
+    assert items[-1].startswith("...(省略 ")
+
+    # 预算已用尽时的嵌套容器直接替换为占位
+    nested = _BoundedSerializer(20).convert(["y" * 30, {"k": "v"}, ["z"]])
+    assert nested[0].startswith("y" * 20)
+    assert nested[1].startswith("...(省略 ")
+
+
+def test_cycles_and_shared_references():
+    cyclic = {"name": "root"}
+    cyclic["self"] = cyclic
+    assert _BoundedSerializer(1000).convert(cyclic) == {"name": "root", "self": "<循环引用: dict>"}
+
+    items = [1]
+    items.append(items)
+    assert _BoundedSerializer(1000).convert(items) == [1, "<循环引用: list>"]
+
+    node = Point(1, 2)
+    node.y = node
+    assert _BoundedSerializer(1000).convert(node) == {"x": 1, "y": "<循环引用: Point>"}
+
+    # 同一对象出现多次只展开第一次
+    shared = {"v": 1}
+    assert _BoundedSerializer(1000).convert([shared, shared]) == [{"v": 1}, "<重复引用: dict>"]
+
+
+def test_serialize_data_is_valid_json():
+    cyclic = {}
+    cyclic["parent"] = cyclic
+    cyclic["messages"] = ["你好" * 5000]
+    cyclic["extra"] = {"k": "v"}
+    text = _serialize_data(cyclic, max_bytes=1024)
+    parsed = json.loads(text)
+    assert parsed["parent"] == "<循环引用: dict>"
+    assert parsed["messages"][0].endswith("...(已截断，原长 10000 字符)")
+    assert parsed["..."] == "省略 1 个字段"
+    assert len(text.encode("utf-8")) < 1024 + 200
+
+
+def test_exhausted_budget_placeholder():
+    serializer = _BoundedSerializer(5)
+    serializer.convert("abcdefgh")
+    assert serializer.convert("more") == _TRUNCATED
+    assert serializer.convert({"k": "v"}) == _TRUNCATED
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith("test_") and callable(func):
+            func()
+            print(f"✅ {name}")
+    print("🎉 节点日志序列化测试全部通过")
@@ -0,0 +1,114 @@
+"""
+花名册批量导入解析/校验测试脚本（不访问数据库）
+
+用法：
+    python test_roster_bulk.py
+    python -m pytest -q test_roster_bulk.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from storage.database.shared.model import RelationshipType, RelationshipLevel
+from tools.roster_bulk_tool import parse_roster_rows, _validate_row
+
+USER_ID = "test-user-bulk"
+
+
+def test_parse_csv_with_chinese_headers():
+    content = "\ufeff姓名,性别,关系,关系级别,现居地,出生年月日时间,MBTI\n" \
+              "张三,男,同事,上级,北京,,INTJ\n" \
+              "李四,女,朋友,,上海,1992年05月01日,\n"
+    rows = parse_roster_rows(content)
+    assert len(rows) == 2
+    assert rows[0] == {
+        "name": "张三", "gender": "男", "relationship_type": "同事", "relationship_level": "上级",
+        "current_location": "北京", "birth_date": "", "mbti": "INTJ",
+    }
+    assert rows[1]["birth_date"] == "1992年05月01日"
+
+
+def test_parse_csv_short_row_and_unknown_header():
+    # 缺列的值为空字符串；未识别的表头原样（小写）保留，校验时忽略
+    rows = parse_roster_rows("name,gender,Extra\n王五\n", "csv")
+    assert rows == [{"name": "王五", "gender": "", "extra": ""}]
+
+
+def test_parse_jsonl():
+    content = '{"姓名": "赵六", "性别": "男", "关系类型": "同事", "现居地": "深圳", "职级": null}\n' \
+              '\n' \
+              '{"name": "钱七", "gender": "女", "relationship_type": "friend", "current_location": "杭州", "age": 30}\n'
+    rows = parse_roster_rows(content)
+    assert len(rows) == 2
+    assert rows[0]["name"] == "赵六" and rows[0]["job_level"] == ""
+    assert rows[1]["age"] == "30"
+
+
+def test_parse_errors():
+    cases = [
+        ('{"name": "a"}\n{bad json}', "jsonl", "第 2 行不是合法的 JSON"),
+        ('["a", "b"]', "jsonl", "第 1 行必须是 JSON 对象"),
+        ("name\na", "xlsx", "不支持的导入格式"),
+    ]
+    for content, file_format, message in cases:
+        try:
+            parse_roster_rows(content, file_format)
+        except ValueError as e:
+            assert message in str(e), (content, str(e))
+            continue
+        raise AssertionError(f"未报错: {content!r}")
+
+
+# (行, 期望错误片段；None 表示校验通过)
+VALIDATE_CASES = [
+    ({"name": "张三", "gender": "男", "relationship_type": "同事", "current_location": "北京"}, None),
+    ({"name": "张三", "gender": "男", "relationship_type": "同事"}, "缺少必填字段：现居地"),
+    ({"name": " ", "gender": "", "relationship_type": "同事", "current_location": "北京"}, "缺少必填字段：姓名、性别"),
+    ({"name": "我", "gender": "男", "relationship_type": "本人", "current_location": "北京"}, "本人的出生年月日时间为必填字段"),
+    ({"name": "我", "gender": "男", "relationship_type": "本人", "current_location": "北京",
+      "birth_date": "1990年03月15日08时"}, None),
+    ({"name": "张三", "gender": "男", "relationship_type": "同事", "current_location": "北京",
+      "relationship_level": "大领导"}, "无法识别的关系级别：大领导"),
+    # 非同事的关系级别直接忽略
+    ({"name": "李四", "gender": "女", "relationship_type": "朋友", "current_location": "上海",
+      "relationship_level": "大领导"}, None),
+]
+
+
+def test_validate_row_cases():
+    for row, expected_error in VALIDATE_CASES:
+        params, error = _validate_row(USER_ID, row)
+        if expected_error is None:
+            assert error is None and params is not None, (row, error)
+        else:
+            assert params is None and expected_error in error, (row, error)
+
+
+def test_validate_row_params():
+    params, error = _validate_row(USER_ID, {
+        "name": " 张三 ", "gender": "男", "relationship_type": "同事", "relationship_level": "+1",
+        "current_location": "北京", "mbti": "", "notes": " 产品经理 ",
+    })
+    assert error is None
+    assert params["user_id"] == USER_ID
+    assert params["name"] == "张三" and params["notes"] == "产品经理"
+    assert params["relationship_type"] == RelationshipType.COLLEAGUE
+    assert params["relationship_level"] == RelationshipLevel.LEVEL_1_SUPERIOR
+    # 空字段写入 NULL
+    assert params["mbti"] is None and params["birth_date"] is None
+
+    params, _ = _validate_row(USER_ID, {
+        "name": "李四", "gender": "女", "relationship_type": "朋友", "relationship_level": "上级",
+        "current_location": "上海",
+    })
+    assert params["relationship_type"] == RelationshipType.FRIEND
+    assert params["relationship_level"] is None
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith("test_") and callable(func):
+            func()
+            print(f"✅ {name}")
+    print("🎉 花名册批量导入解析/校验测试全部通过")
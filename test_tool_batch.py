@@ -0,0 +1,129 @@
+"""
+工具批量调度测试脚本（使用本地假工具，不访问数据库和外部接口）
+
+用法：
+    python test_tool_batch.py
+    python -m pytest -q test_tool_batch.py
+"""
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from utils.helper.tool_batch import TOOL_BATCH_MAX_CALLS, validate_calls, run_tool_batch
+
+USER_ID = "test-user-batch"
+
+
+class FakeTool:
+    """与 StructuredTool 一样通过 invoke(params) 调用"""
+
+    def __init__(self, func):
+        self.func = func
+        self.calls = []
+
+    def invoke(self, params):
+        self.calls.append(params)
+        return self.func(params)
+
+
+def _fail(params):
+    raise RuntimeError("boom")
+
+
+# (calls, 期望错误片段；None 表示合法)
+VALIDATE_CASES = [
+    ([{"tool_name": "a"}], None),
+    ([{"tool_name": "a"}, {"tool_name": "b", "tool_params": {"x": 1}, "depends_on": [0]}], None),
+    ([], "calls 必须是非空数组"),
+    ({"tool_name": "a"}, "calls 必须是非空数组"),
+    ([{"tool_name": "a"}] * (TOOL_BATCH_MAX_CALLS + 1), f"单次最多 {TOOL_BATCH_MAX_CALLS} 个调用"),
+    ([{"tool_params": {}}], "第 0 个调用缺少 tool_name"),
+    (["a"], "第 0 个调用缺少 tool_name"),
+    ([{"tool_name": "a", "tool_params": []}], "第 0 个调用的 tool_params 必须是对象"),
+    ([{"tool_name": "a", "depends_on": [0]}], "第 0 个调用的 depends_on"),
+    ([{"tool_name": "a"}, {"tool_name": "b", "depends_on": [1]}], "第 1 个调用的 depends_on"),
+    ([{"tool_name": "a"}, {"tool_name": "b", "depends_on": ["0"]}], "第 1 个调用的 depends_on"),
+]
+
+
+def test_validate_calls():
+    for calls, expected in VALIDATE_CASES:
+        error = validate_calls(calls)
+        if expected is None:
+            assert error is None, (calls, error)
+        else:
+            assert error is not None and expected in error, (calls, error)
+
+
+def test_results_in_order_with_user_id():
+    echo = FakeTool(lambda params: dict(params))
+    tools = {"echo": echo}
+    results = run_tool_batch([
+        {"tool_name": "echo", "tool_params": {"n": 1}},
+        {"tool_name": "echo", "tool_params": {"n": 2, "user_id": "other"}},
+        {"tool_name": "missing"},
+    ], tools.get, USER_ID)
+
+    assert [r["index"] for r in results] == [0, 1, 2]
+    assert results[0]["status"] == "success"
+    assert results[0]["data"] == {"n": 1, "user_id": USER_ID}
+    # 显式传入的 user_id 不会被覆盖
+    assert results[1]["data"] == {"n": 2, "user_id": "other"}
+    assert results[2]["status"] == "failed" and results[2]["error_code"] == "TOOL_NOT_FOUND"
+
+
+def test_dependency_failure():
+    ok = FakeTool(lambda params: "ok")
+    tools = {"ok": ok, "fail": FakeTool(_fail)}
+    results = run_tool_batch([
+        {"tool_name": "fail"},
+        {"tool_name": "ok", "depends_on": [0]},
+        {"tool_name": "missing"},
+        {"tool_name": "ok", "depends_on": [2]},
+        {"tool_name": "ok"},
+        {"tool_name": "ok", "depends_on": [4]},
+    ], tools.get, USER_ID)
+
+    assert results[0]["error_code"] == "TOOL_EXECUTION_ERROR" and "boom" in results[0]["error_message"]
+    assert results[1]["error_code"] == "DEPENDENCY_FAILED"
+    assert results[3]["error_code"] == "DEPENDENCY_FAILED"
+    assert results[4]["status"] == results[5]["status"] == "success"
+    # 依赖失败的调用不会执行
+    assert len(ok.calls) == 2
+
+
+def test_timeout():
+    release = threading.Event()
+    slow = FakeTool(lambda params: release.wait(5) and "late")
+    fast = FakeTool(lambda params: "fast")
+    tools = {"slow": slow, "fast": fast}
+    try:
+        start = time.monotonic()
+        results = run_tool_batch([
+            {"tool_name": "slow"},
+            {"tool_name": "fast"},
+            {"tool_name": "fast", "depends_on": [0]},
+        ], tools.get, USER_ID, timeout=0.2)
+        assert time.monotonic() - start < 2
+
+        assert results[0]["error_code"] == "TIMEOUT" and results[0]["elapsed_ms"] >= 150
+        assert results[1]["status"] == "success"
+        assert results[2]["error_code"] == "TIMEOUT"
+
+        # 依赖超时的调用到截止时间后不再执行
+        release.set()
+        time.sleep(0.1)
+        assert len(fast.calls) == 1
+    finally:
+        release.set()
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith("test_") and callable(func):
+            func()
+            print(f"✅ {name}")
+    print("🎉 工具批量调度测试全部通过")